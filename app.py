@@ -1,52 +1,34 @@
-from flask import Flask, request, jsonify, render_template, send_file, session, redirect, url_for
-import os, shutil
-import pandas as pd
-import numpy as np
+from flask import Flask, request, jsonify, render_template, send_file, session, redirect, url_for, Response, stream_with_context, g
+import os
 import functools 
-import hashlib # Para hashear contraseñas
 import time # Para timestamp de registro
 import json # Para cargar/guardar usuarios y parsear la respuesta de la IA
 import re # Para parsear el bloque JSON de la IA
-from config import OUTPUT_DIR, SECRET_KEY 
-from utils.data_processing import (
-    read_csv_smart, summary_table, detect_group_anomalies, 
-    detect_row_anomalies, valid_numeric_cols, group_candidates,
-    infer_rate
-)
-from utils.narrative import (
-    get_ai_insights,
-    generate_native_sequence_6steps,
-    generate_templates_from_csv
-)
-from utils.charts import _agg_topn, chart_bar, chart_pie, chart_line, chart_heatmap, chart_violin, chart_montana, make_infographic_from_chart # Importa todas las funciones de gráfico
+from config import SECRET_KEY 
+from utils.lazy import lazy_import
+from utils.dataset_store import DATASET_STORE, dataset_id_for
+from utils.render_cache import RENDER_CACHE
+from utils.zip_stream import iter_zip
+from utils.jobs import JOB_QUEUE
+from utils.output_store import OUTPUT_STORE
+from utils.user_store import USER_STORE
+from utils.passwords import hash_password, verify_password, needs_rehash
+
+# Dependencias pesadas (pandas, sklearn, matplotlib, Gemini): se importan en el
+# primer uso, así /login y /logout responden sin esperar al stack científico.
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+data_processing = lazy_import("utils.data_processing")
+columnar_cache = lazy_import("utils.columnar_cache")
+narrative = lazy_import("utils.narrative")
+charts = lazy_import("utils.charts")
+render_engine = lazy_import("utils.render_engine")
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 app.config['SECRET_KEY'] = SECRET_KEY 
 
-# --- FIREBASE / FIRESTORE SETUP ---
-
-USER_DB_PATH = os.path.join(OUTPUT_DIR, "users.json")
-
-def load_users():
-    """Loads users from the local JSON file (simulating Firestore/DB)."""
-    if not os.path.exists(USER_DB_PATH):
-        # Default user for easy access
-        return {"admin": {"password_hash": hashlib.sha256("password123".encode()).hexdigest(), "created_at": time.time()}}
-    try:
-        with open(USER_DB_PATH, 'r') as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def save_users(users):
-    """Saves users to the local JSON file."""
-    try:
-        with open(USER_DB_PATH, 'w') as f:
-            json.dump(users, f, indent=4)
-    except Exception as e:
-        print(f"Error saving user data: {e}")
-
-save_users(load_users()) # Initialize DB file
+# --- USUARIOS ---
+# Registro en SQLite (utils/user_store.py); users.json solo se migra una vez.
 
 # --- Helper de Autenticación (Decorator) ---
 def requires_auth(f):
@@ -78,6 +60,79 @@ def validate_file_extension(file):
         return "Tipo de archivo inválido. Por favor, sube solo archivos CSV (.csv)."
     return None
 
+AI_CHARTS_MISSING_INPUTS = 'Error: No se encontró el archivo CSV ni los parámetros de análisis. Ejecuta el análisis y la historia primero.'
+
+# Últimos renders de la sesión (los que se incluyen en el ZIP de descarga)
+MAX_SESSION_RENDERS = 36
+
+def remember_renders(paths):
+    names = [os.path.basename(p) for p in paths]
+    renders = [n for n in session.get('renders', []) if n not in names] + names
+    session['renders'] = renders[-MAX_SESSION_RENDERS:]
+
+def publish_render(owner, path):
+    """Publica el PNG en la carpeta del usuario y devuelve su URL."""
+    return f'/output_images/{OUTPUT_STORE.publish(owner, path)}'
+
+DATASET_GONE_MSG = "El dataset ya no está disponible en el servidor. Vuelve a subir el archivo."
+
+def stored_dataset(dataset_id):
+    """
+    DataFrame ya parseado por id: primero el registro en memoria (mismo objeto,
+    así se reutilizan tipos de columna y cubos memoizados), luego la copia
+    columnar en disco (sobrevive a reinicios del worker). None si no existe.
+    """
+    if not dataset_id:
+        return None
+    df = DATASET_STORE.get(dataset_id)
+    if df is None:
+        df = columnar_cache.load_dataset(dataset_id)
+        if df is not None:
+            DATASET_STORE.put(dataset_id, df)
+    return df
+
+def load_request_dataset():
+    """
+    Resuelve el DataFrame de la petición sin re-parsear si ya fue subido:
+    - 'dataset_id' (devuelto por /upload) -> DataFrame ya parseado del registro.
+    - 'file' (CSV) -> se parsea una sola vez y se registra por hash de contenido.
+    Devuelve (df, dataset_id, error_msg). El df es compartido: NO mutarlo.
+    El id resuelto viaja en la cabecera X-Dataset-Id (ver dataset_id_header).
+    """
+    dataset_id = request.form.get('dataset_id')
+    df = stored_dataset(dataset_id)
+    if df is not None:
+        g.dataset_id = dataset_id
+        return df, dataset_id, None
+
+    file = request.files.get('file')
+    error_msg = validate_file_extension(file)
+    if error_msg:
+        if dataset_id:
+            error_msg = DATASET_GONE_MSG
+        return None, None, error_msg
+
+    dataset_id, df = DATASET_STORE.get_or_parse(file.read(), data_processing.read_csv_smart)
+    columnar_cache.save_dataset(dataset_id, df)
+    g.dataset_id = dataset_id
+    return df, dataset_id, None
+
+def dataset_error(error_msg):
+    """
+    Respuesta de error de load_request_dataset: 410 si el id ya no está en el
+    servidor (expulsado del caché u otro worker), así el cliente reintenta una
+    vez con el archivo; 400 para el resto.
+    """
+    return jsonify({'error': error_msg}), 410 if error_msg == DATASET_GONE_MSG else 400
+
+@app.after_request
+def dataset_id_header(response):
+    """El cliente renueva su dataset_id con el de la respuesta (p. ej. tras reenviar el archivo)."""
+    dataset_id = g.get('dataset_id')
+    if dataset_id:
+        response.headers['X-Dataset-Id'] = dataset_id
+    return response
+
 @app.route('/')
 @requires_auth 
 def index():
@@ -91,12 +146,13 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        users = load_users()
-        
-        # Validación de credenciales
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
+        user = USER_STORE.get(username)
         
-        if username in users and users[username]['password_hash'] == hashed_password:
+        # Validación de credenciales (tiempo constante; también si el usuario no existe)
+        if verify_password(password, user and user['password_hash']):
+            if needs_rehash(user['password_hash']):
+                # Hash antiguo (SHA-256) o coste desactualizado: se rehashea con el actual
+                USER_STORE.set_password_hash(username, hash_password(password))
             session['logged_in'] = True
             session['username'] = username
             return redirect(url_for('index'))
@@ -119,17 +175,14 @@ def register():
     if not username or not password:
         error = "Usuario y contraseña son requeridos."
     else:
-        users = load_users()
-        if username in users:
+        if USER_STORE.get(username) is not None:
             error = f"El usuario '{username}' ya existe."
         elif len(password) < 6:
             error = "La contraseña debe tener al menos 6 caracteres."
+        elif not USER_STORE.create(username, hash_password(password)):
+            # Otro registro con el mismo nombre ganó la carrera (alta atómica)
+            error = f"El usuario '{username}' ya existe."
         else:
-            # Hash y registro de nuevo usuario
-            hashed_password = hashlib.sha256(password.encode()).hexdigest()
-            users[username] = {"password_hash": hashed_password, "created_at": time.time()}
-            save_users(users)
-            
             # Inicia sesión inmediatamente después del registro
             session['logged_in'] = True
             session['username'] = username
@@ -150,22 +203,41 @@ def logout():
 
 # --- RUTAS DE APLICACIÓN (PROTEGIDAS) ---
 
-@app.route('/analyze', methods=['POST'])
+@app.route('/upload', methods=['POST'])
 @requires_auth
-def analyze():
+def upload():
+    """Sube el CSV una sola vez y devuelve su dataset_id (hash del contenido)."""
     try:
         file = request.files.get('file')
         error_msg = validate_file_extension(file)
         if error_msg:
             return jsonify({'error': error_msg}), 400
+
+        raw = file.read()
+        cached = DATASET_STORE.get(dataset_id_for(raw)) is not None
+        dataset_id, df = DATASET_STORE.get_or_parse(raw, data_processing.read_csv_smart)
+        columnar_cache.save_dataset(dataset_id, df)
+        return jsonify({
+            'dataset_id': dataset_id,
+            'rows': int(len(df)),
+            'cols': int(len(df.columns)),
+            'cached': cached
+        })
+    except Exception as e:
+        return jsonify({'error': f'Error subiendo archivo: {str(e)}'}), 500
+
+@app.route('/analyze', methods=['POST'])
+@requires_auth
+def analyze():
+    try:
+        df, dataset_id, error_msg = load_request_dataset()
+        if error_msg:
+            return dataset_error(error_msg)
             
-        df = read_csv_smart(file, nrows=None)
-        file.seek(0) 
-        head_df = read_csv_smart(file, nrows=8)
-        head_df = head_df.replace([np.nan], [None])
+        head_df = df.head(8).replace([np.nan], [None])
         head = head_df.to_dict(orient='records')
         
-        schema_df = summary_table(df)
+        schema_df = data_processing.summary_table(df)
         schema_df = schema_df.replace([np.nan], [None])
         schema = schema_df.to_dict(orient='records')
         
@@ -178,31 +250,31 @@ def analyze():
         min_n = int(request.form.get('min_n', 30))
         iso_frac = float(request.form.get('iso_frac', 0.02))
         
-        df_analyzed = df.copy()
+        df_analyzed = df  # compartido: solo .assign (columnas nuevas, sin mutar el registro)
         
         # Handle metric calculation and fallback
         if metric_choice == "__tasa__":
-            tasa = infer_rate(df_analyzed)
+            tasa = data_processing.infer_rate(df_analyzed)
             if tasa is not None:
                 df_analyzed = df_analyzed.assign(__tasa__=tasa)
             else:
-                numeric_cols = valid_numeric_cols(df)
+                numeric_cols = data_processing.valid_numeric_cols(df)
                 if numeric_cols:
                      metric_choice = numeric_cols[0]
                 else:
                      raise ValueError("No hay columnas numéricas válidas para la métrica.")
         
-        anom_tab_raw = detect_group_anomalies(df_analyzed, group_col, metric_choice, method, k_iqr, z_thr, mad_thr, min_n)
+        anom_tab_raw = data_processing.detect_group_anomalies(df_analyzed, group_col, metric_choice, method, k_iqr, z_thr, mad_thr, min_n)
         anom_tab_display = table_when_empty(anom_tab_raw, method, k_iqr, z_thr, mad_thr, min_n)
         anom_tab_display = anom_tab_display.replace([np.nan], [None])
         anom_tab = anom_tab_display.to_dict(orient='records')
         
-        iso_tab_raw = detect_row_anomalies(df, frac=iso_frac) if iso_frac > 0 else pd.DataFrame()
+        iso_tab_raw = data_processing.detect_row_anomalies(df, frac=iso_frac) if iso_frac > 0 else pd.DataFrame()
         iso_tab_raw = iso_tab_raw.replace([np.nan], [None])
         iso_tab = iso_tab_raw.to_dict(orient='records') if not iso_tab_raw.empty else []
         
-        metrics = ["__tasa__"] + valid_numeric_cols(df)
-        groups = group_candidates(df)
+        metrics = ["__tasa__"] + data_processing.valid_numeric_cols(df)
+        groups = data_processing.group_candidates(df)
         
         return jsonify({
             'head': head,
@@ -211,303 +283,507 @@ def analyze():
             'iso': iso_tab,
             'metrics': metrics,
             'groups': groups,
-            'current_metric': metric_choice
+            'current_metric': metric_choice,
+            'dataset_id': dataset_id
         })
     except Exception as e:
         return jsonify({'error': f'Error en análisis: {str(e)}'}), 500
 
+def sequence_params(form):
+    """Parámetros de la secuencia de 6 pasos a partir del formulario."""
+    group_col = form.get('group_col', 'estructuraalumno')
+    metric_col = form.get('metric_choice', '__tasa__')
+    # --- FIX GENERIC TITLES (Issue 1) ---
+    default_title = f"Análisis de {metric_col} por {group_col}"
+    default_subtitle = f'Secuencia de visualización para {metric_col}'
+    return {
+        'theme': form.get('seq_theme', 'light'),
+        'group_col': group_col,
+        'metric_col': metric_col,
+        'heatmap_row': form.get('seq_hm_row', 'estructuraalumno'),
+        'heatmap_col': form.get('seq_hm_col', 'semestre'),
+        'line_x': form.get('seq_line_x', 'semestre'),
+        'line_y': form.get('seq_line_y', '__tasa__'),
+        'top_n': int(form.get('seq_topn', 8)),
+        'normalize': form.get('seq_norm') == 'on',
+        'title': form.get('seq_title', default_title),
+        'subtitle': form.get('seq_subt', default_subtitle),
+        'simple_mode': form.get('seq_simple') == 'on',
+    }
+
+def run_sequence(df, dataset_id, p, owner, on_image=None):
+    """
+    Genera la secuencia de 6 pasos (sin depender del contexto de la petición)
+    y publica las imágenes en la carpeta de `owner`.
+    on_image(i, url, caption) se llama a medida que termina cada paso.
+    """
+    urls = {}
+    on_step = None
+    if on_image:
+        def on_step(i, path, caption):
+            urls[path] = publish_render(owner, path)
+            on_image(i, urls[path], caption)
+
+    gallery_items, log, saved_paths, captions = narrative.generate_native_sequence_6steps(
+        df, p['theme'], p['group_col'], p['metric_col'], p['heatmap_row'], p['heatmap_col'],
+        p['line_x'], p['line_y'], p['top_n'], p['normalize'], p['title'], p['subtitle'],
+        p['simple_mode'], dataset_id=dataset_id, on_step=on_step
+    )
+    return {
+        'images': [urls.get(path) or publish_render(owner, path) for path in saved_paths],
+        'captions': captions,
+        'log': log,
+        'renders': [os.path.basename(path) for path in saved_paths],
+    }
+
 @app.route('/generate_sequence', methods=['POST'])
 @requires_auth
 def generate_sequence():
     try:
-        file = request.files.get('file')
-        error_msg = validate_file_extension(file)
+        df, dataset_id, error_msg = load_request_dataset()
         if error_msg:
-            return jsonify({'error': error_msg}), 400
-        
-        theme = request.form.get('seq_theme', 'light') 
-        group_col = request.form.get('group_col', 'estructuraalumno')
-        metric_col = request.form.get('metric_choice', '__tasa__')
-        heatmap_row = request.form.get('seq_hm_row', 'estructuraalumno')
-        heatmap_col = request.form.get('seq_hm_col', 'semestre')
-        line_x = request.form.get('seq_line_x', 'semestre')
-        line_y = request.form.get('seq_line_y', '__tasa__')
-        top_n = int(request.form.get('seq_topn', 8))
-        normalize = request.form.get('seq_norm') == 'on'
-        
-        # --- FIX GENERIC TITLES (Issue 1) ---
-        default_title = f"Análisis de {metric_col} por {group_col}"
-        title = request.form.get('seq_title', default_title)
-        default_subtitle = f'Secuencia de visualización para {metric_col}'
-        subtitle = request.form.get('seq_subt', default_subtitle)
-        
-        simple_mode = request.form.get('seq_simple') == 'on'
-        
-        gallery_items, log, saved_paths, captions = generate_native_sequence_6steps(
-            file, theme, group_col, metric_col, heatmap_row, heatmap_col, 
-            line_x, line_y, top_n, normalize, title, subtitle, simple_mode
-        )
-        
-        image_urls = [f'/output_images/{os.path.basename(path)}' for path in saved_paths]
-        
-        return jsonify({
-            'images': image_urls,
-            'captions': captions,
-            'log': log
-        })
+            return dataset_error(error_msg)
+
+        result = run_sequence(df, dataset_id, sequence_params(request.form), job_owner())
+        remember_renders(result.pop('renders'))
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': f'Error en secuencia: {str(e)}'}), 500
 
+def story_params(form):
+    """Parámetros de la historia IA a partir del formulario."""
+    return {
+        'group_col': form.get('group_col', 'estructuraalumno'),
+        'metric_choice': form.get('metric_choice', '__tasa__'),
+        'method': form.get('method', 'iqr'),
+        'k_iqr': float(form.get('k_iqr', 1.5)),
+        'z_thr': float(form.get('z_thr', 2.5)),
+        'mad_thr': float(form.get('mad_thr', 3.5)),
+        'min_n': int(form.get('min_n', 30)),
+        'top_n': int(form.get('seq_topn', 8)),
+        'theme': form.get('seq_theme', 'light'),
+        'simple_mode': form.get('seq_simple') == 'on',
+        'line_x': form.get('seq_line_x', 'semestre'),
+        'line_y': form.get('seq_line_y'),
+    }
+
+def prepare_story(df, p):
+    """
+    Insumos del agente de IA (esquema, anomalías, top N) y parámetros del análisis.
+    Devuelve ((schema_df, anom_tab, bar_data), analysis) con analysis['ai_chart_recos'] vacío.
+    """
+    group_col = p['group_col']
+    metric_choice = p['metric_choice']
+
+    # --- COLLECT DATA FOR AI ---
+    schema_df = data_processing.summary_table(df)
+
+    df_analyzed = df  # compartido: solo .assign (columnas nuevas, sin mutar el registro)
+
+    # *** CLAVE: Asegurar la métrica correcta y manejar fallbacks antes de IA/Guardar ***
+    valid_metric = metric_choice # Usamos el valor del formulario como base
+    if metric_choice == "__tasa__":
+        tasa = data_processing.infer_rate(df_analyzed)
+        if tasa is not None:
+            df_analyzed = df_analyzed.assign(__tasa__=tasa)
+        else:
+             # Fallback to first numeric if tasa fails
+            numeric_cols = data_processing.valid_numeric_cols(df)
+            valid_metric = numeric_cols[0] if numeric_cols else 'N/A' # Actualizamos la métrica válida
+
+    anom_tab = data_processing.detect_group_anomalies(df_analyzed, group_col, valid_metric, p['method'],
+                                      p['k_iqr'], p['z_thr'], p['mad_thr'], p['min_n'])
+    bar_data = charts._agg_topn(df_analyzed, group_col, valid_metric, top_n=p['top_n'])
+
+    analysis = {
+        'group_col': group_col,
+        'metric_choice': valid_metric, # <-- Guardamos la métrica YA VALIDADA/CORREGIDA
+        'top_n': p['top_n'],
+        'theme': p['theme'],
+        'simple_mode': p['simple_mode'],
+        'line_x': p['line_x'],
+        'line_y': p['line_y'] if p['line_y'] is not None else valid_metric,
+        'ai_chart_recos': [] # <-- Lista de gráficos generados por insight
+    }
+    return (schema_df, anom_tab, bar_data), analysis
+
+def _prerender_job(job, df, dataset_id, analysis):
+    # Solo llena el caché de render: sin dueño ni imágenes publicadas
+    specs, _, _ = ai_chart_specs(df, dataset_id, analysis)
+    render_engine.render_all(specs)
+
+def prerender_default_charts(df, dataset_id, analysis):
+    """
+    Pre-render especulativo mientras la IA piensa: los gráficos por defecto
+    (barras por group_col y líneas por line_x con la métrica validada). Si las
+    recomendaciones coinciden, el endpoint de gráficos reutiliza el gráfico ya
+    dibujado (caché por plot_key) o espera a que termine; si la IA no devuelve
+    recomendaciones, las infografías por defecto quedan listas tal cual.
+    """
+    if not dataset_id:
+        return None
+    return JOB_QUEUE.submit('prerender', None, _prerender_job, df, dataset_id,
+                            dict(analysis, ai_chart_recos=[]))
+
+def run_story(df, dataset_id, p):
+    """
+    Genera la historia IA y las recomendaciones de gráficos.
+    Devuelve {'story', 'analysis'}; 'analysis' es lo que se guarda en session['last_analysis'].
+    """
+    ai_inputs, analysis = prepare_story(df, p)
+    prerender_default_charts(df, dataset_id, analysis)
+
+    # --- CALL AI AGENT (Receives story and chart recommendations) ---
+    story_full_response = narrative.get_ai_insights(*ai_inputs)
+
+    # --- NEW: Parse the full response to separate story from chart recommendations ---
+    story_markdown = story_full_response
+    chart_reco_json = []
+
+    # Regex para encontrar el bloque JSON con la etiqueta charts_reco
+    match = re.search(r"```charts_reco\s*(\[.*?\])\s*```", story_full_response, re.DOTALL)
+
+    if match:
+        json_str = match.group(1)
+        # Quitar el bloque JSON de la historia para el frontend
+        story_markdown = story_full_response.replace(match.group(0), "").strip()
+        try:
+            chart_reco_json = json.loads(json_str)
+        except json.JSONDecodeError:
+            print(f"Error parsing AI chart recommendation JSON: {json_str}")
+            chart_reco_json = []
+
+    # The dataset is already persisted (columnar, by content hash): keep only its ID
+    columnar_cache.save_dataset(dataset_id, df)
+
+    analysis['ai_chart_recos'] = chart_reco_json
+    return {'story': story_markdown, 'analysis': analysis, 'dataset_id': dataset_id}
+
 @app.route('/generate_story', methods=['POST'])
 @requires_auth
 def generate_story():
     try:
-        file = request.files.get('file')
-        error_msg = validate_file_extension(file)
+        df, dataset_id, error_msg = load_request_dataset()
         if error_msg:
-            return jsonify({'error': error_msg}), 400
-        
-        df = read_csv_smart(file)
-        
-        group_col = request.form.get('group_col', 'estructuraalumno')
-        metric_choice = request.form.get('metric_choice', '__tasa__')
-        method = request.form.get('method', 'iqr')
-        k_iqr = float(request.form.get('k_iqr', 1.5))
-        z_thr = float(request.form.get('z_thr', 2.5))
-        mad_thr = float(request.form.get('mad_thr', 3.5))
-        min_n = int(request.form.get('min_n', 30))
-        top_n = int(request.form.get('seq_topn', 8))
-        
-        # --- COLLECT DATA FOR AI ---
-        schema_df = summary_table(df)
-        
-        df_analyzed = df.copy()
-        
-        # *** CLAVE: Asegurar la métrica correcta y manejar fallbacks antes de IA/Guardar ***
-        valid_metric = metric_choice # Usamos el valor del formulario como base
-        if metric_choice == "__tasa__":
-            tasa = infer_rate(df_analyzed)
-            if tasa is not None:
-                df_analyzed = df_analyzed.assign(__tasa__=tasa)
-            else:
-                 # Fallback to first numeric if tasa fails
-                numeric_cols = valid_numeric_cols(df)
-                valid_metric = numeric_cols[0] if numeric_cols else 'N/A' # Actualizamos la métrica válida
-        
-        anom_tab = detect_group_anomalies(df_analyzed, group_col, valid_metric, method, k_iqr, z_thr, mad_thr, min_n)
-        bar_data = _agg_topn(df_analyzed, group_col, valid_metric, top_n=top_n)
-        
-        # --- CALL AI AGENT (Receives story and chart recommendations) ---
-        story_full_response = get_ai_insights(schema_df, anom_tab, bar_data)
-        
-        # --- NEW: Parse the full response to separate story from chart recommendations ---
-        story_markdown = story_full_response
-        chart_reco_json = []
+            return dataset_error(error_msg)
 
-        # Regex para encontrar el bloque JSON con la etiqueta charts_reco
-        match = re.search(r"```charts_reco\s*(\[.*?\])\s*```", story_full_response, re.DOTALL)
-        
-        if match:
-            json_str = match.group(1)
-            # Quitar el bloque JSON de la historia para el frontend
-            story_markdown = story_full_response.replace(match.group(0), "").strip()
-            try:
-                chart_reco_json = json.loads(json_str)
-            except json.JSONDecodeError:
-                print(f"Error parsing AI chart recommendation JSON: {json_str}")
-                chart_reco_json = []
-
-        # 1. Save analysis parameters and the new dynamic chart list
-        session['last_analysis'] = {
-            'group_col': group_col,
-            'metric_choice': valid_metric, # <-- Guardamos la métrica YA VALIDADA/CORREGIDA
-            'top_n': top_n,
-            'theme': request.form.get('seq_theme', 'light'), 
-            'simple_mode': request.form.get('seq_simple') == 'on',
-            'line_x': request.form.get('seq_line_x', 'semestre'), 
-            'line_y': request.form.get('seq_line_y', valid_metric),
-            'ai_chart_recos': chart_reco_json # <-- Lista de gráficos generados por insight
-        }
-        
-        # 2. Save the CSV file to disk for easy retrieval by the next endpoint
-        file.seek(0)
-        temp_filename = f"temp_user_{session.get('username') or 'anon'}.csv"
-        temp_filepath = os.path.join(OUTPUT_DIR, temp_filename)
-        file.save(temp_filepath)
-        session['temp_csv_path'] = temp_filepath
-
-        return jsonify({'story': story_markdown})
+        result = run_story(df, dataset_id, story_params(request.form))
+
+        # Save analysis parameters and the dynamic chart list (dataset only by ID)
+        session['last_analysis'] = result['analysis']
+        session['dataset_id'] = dataset_id
+
+        return jsonify({'story': result['story']})
     
     except Exception as e:
         return jsonify({'error': f'Error en historia: {str(e)}'}), 500
 
+def sse(event, data):
+    """Un evento Server-Sent Events con datos JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/generate_story/stream', methods=['POST'])
+@requires_auth
+def generate_story_stream():
+    """
+    Historia IA por Server-Sent Events:
+    - 'story': trozos de Markdown a medida que llegan del modelo.
+    - 'charts': en cuanto se cierra el bloque charts_reco se encola el render de
+      esos gráficos (job_id + status_url) mientras la historia sigue llegando.
+    - 'done': historia completa (sin el bloque JSON) | 'error'.
+    """
+    try:
+        df, dataset_id, error_msg = load_request_dataset()
+        if error_msg:
+            return dataset_error(error_msg)
+        ai_inputs, analysis = prepare_story(df, story_params(request.form))
+        prerender_default_charts(df, dataset_id, analysis)
+        columnar_cache.save_dataset(dataset_id, df)
+    except Exception as e:
+        return jsonify({'error': f'Error en historia: {str(e)}'}), 500
+
+    # La sesión se guarda antes de empezar a emitir; las recomendaciones llegan por el stream
+    session['last_analysis'] = analysis
+    session['dataset_id'] = dataset_id
+    owner = job_owner()
+
+    def start_charts(recos):
+        job_id = JOB_QUEUE.submit('ai_charts', owner, _ai_charts_job, df, dataset_id,
+                                  dict(analysis, ai_chart_recos=recos))
+        return sse('charts', {'recos': recos, 'job_id': job_id,
+                              'status_url': url_for('job_status', job_id=job_id)})
+
+    def events():
+        parser = narrative.ChartsRecoStreamParser()
+        try:
+            for chunk in narrative.stream_ai_insights(*ai_inputs):
+                for kind, payload in parser.feed(chunk):
+                    yield sse('story', payload) if kind == 'story' else start_charts(payload)
+            for kind, payload in parser.close():
+                yield sse('story', payload) if kind == 'story' else start_charts(payload)
+            if parser.charts is None:
+                # Sin bloque charts_reco: gráficos de soporte por defecto
+                yield start_charts([])
+            yield sse('done', {'story': "".join(parser.story).strip()})
+        except Exception as e:
+            yield sse('error', {'error': f'Error en historia: {str(e)}'})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ----------------------------------------------------------------------
 # ENDPOINT TO GENERATE AI RECOMMENDED CHARTS (Dynamic based on AI output)
 # ----------------------------------------------------------------------
+def ai_charts_params():
+    """
+    Parámetros de la última historia (sesión). Si el cliente envía 'ai_chart_recos'
+    (p. ej. recibidas por el stream de la historia) reemplazan a las de la sesión.
+    """
+    analysis_params = session.get('last_analysis')
+    recos = request.form.get('ai_chart_recos')
+    if analysis_params and recos:
+        try:
+            analysis_params = dict(analysis_params, ai_chart_recos=json.loads(recos))
+        except json.JSONDecodeError:
+            pass
+    return analysis_params
+
+def load_ai_charts_inputs(dataset_id, analysis_params):
+    """DataFrame de la última historia (None si no hay análisis previo)."""
+    if not analysis_params:
+        return None
+    return stored_dataset(dataset_id)
+
+def ai_chart_specs(df, dataset_id, analysis_params):
+    """Specs de render de los gráficos recomendados por la IA -> (specs, captions, log_msgs)."""
+    # Set metric default from session
+    metric_col_session = analysis_params['metric_choice']
+
+    # Procesar métrica __tasa__ si aplica (si el CSV no la trae ya)
+    if metric_col_session == "__tasa__" and "__tasa__" not in df.columns:
+        tasa = data_processing.infer_rate(df)
+        if tasa is not None:
+            df = df.assign(__tasa__=tasa)
+        else:
+            # Fallback metric
+            numeric_cols = data_processing.valid_numeric_cols(df)
+            metric_col_session = numeric_cols[0] if numeric_cols else 'N/A' 
+
+    # Determinar y generar gráficos por recomendación de la IA
+    ai_chart_recos = analysis_params.get('ai_chart_recos')
+
+    captions = []
+    log_msgs = []
+    timestamp = int(time.time() * 1000)
+
+    # Fallback si no hay recomendaciones dinámicas (usa el comportamiento anterior)
+    if not ai_chart_recos:
+         ai_chart_recos = [
+            {"chart_type": "Barras", "group_col": analysis_params['group_col'], "metric_col": metric_col_session, "caption": f"Rendimiento por {analysis_params['group_col']} (Default)"},
+            {"chart_type": "Líneas", "x_col": analysis_params['line_x'], "y_col": analysis_params['line_y'], "caption": "Tendencia histórica (Default)"}
+         ]
+         log_msgs.append("Advertencia: Se usaron gráficos de soporte por defecto (AI no devolvió recomendaciones dinámicas).")
+    else:
+         log_msgs.append(f"Generando {len(ai_chart_recos)} gráficos basados en insights de IA.")
+
+    theme = analysis_params['theme']
+    simple_mode = analysis_params['simple_mode']
+    top_n = analysis_params['top_n']
+
+    base_title = analysis_params.get('custom_title', f"Visualización de Soporte IA")
+    specs = []
+
+    for i, reco in enumerate(ai_chart_recos):
+        chart_type = reco.get('chart_type')
+
+        # Parámetros dinámicos con fallback
+        group_col = reco.get('group_col') or analysis_params['group_col']
+        metric_col = reco.get('metric_col') or metric_col_session # Use session metric as fallback
+        line_x = reco.get('x_col') or analysis_params['line_x']
+        line_y = reco.get('y_col') or metric_col
+        heatmap_row = reco.get('row_col') or analysis_params['group_col']
+        heatmap_col = reco.get('col_col') or analysis_params['line_x']
+        caption_text = reco.get('caption') or f"{chart_type} de {metric_col}"
+
+        # Lógica de generación de gráfico (None si faltan columnas o datos)
+        spec = narrative.build_ai_chart_spec(
+            df, chart_type,
+            group_col=group_col, metric_col=metric_col, line_x=line_x, line_y=line_y,
+            heatmap_row=heatmap_row, heatmap_col=heatmap_col,
+            theme=theme, simple_mode=simple_mode, top_n=top_n,
+            title=base_title,
+            subtitle=f"Gráfico de {chart_type}: {caption_text}", # Use the AI's caption here
+            name=f"{str(chart_type).lower()}_{i}", timestamp=timestamp,
+            dataset_id=dataset_id
+        )
+
+        if spec:
+            specs.append(spec)
+            captions.append(caption_text)
+            log_msgs.append(f"Gráfico de {chart_type} generado: {caption_text}")
+        else:
+            log_msgs.append(f"Advertencia: No se pudo generar el gráfico de {chart_type} (columnas faltantes o datos insuficientes).")
+
+    return specs, captions, log_msgs
+
+def run_ai_charts(df, dataset_id, analysis_params, owner, on_image=None, on_total=None):
+    """
+    Genera los gráficos recomendados por la IA (sin depender del contexto de la petición)
+    y publica las imágenes en la carpeta de `owner`.
+    on_total(n) recibe el número de gráficos válidos (las recomendaciones
+    inválidas se descartan); on_image(i, url, caption) se llama a medida que
+    termina cada gráfico.
+    """
+    specs, captions, log_msgs = ai_chart_specs(df, dataset_id, analysis_params)
+    if on_total:
+        on_total(len(specs))
+
+    # Render en paralelo; los gráficos ya generados antes (o pre-renderizados
+    # mientras la IA escribía la historia) salen del caché de render
+    urls = {}
+    on_done = None
+    if on_image:
+        def on_done(i, path):
+            urls[path] = publish_render(owner, path)
+            on_image(i, urls[path], captions[i])
+    saved_paths = render_engine.render_all(specs, on_done=on_done)
+
+    log = " | ".join(log_msgs) if log_msgs else "Gráficos de soporte generados correctamente."
+    return {
+        'images': [urls.get(p) or publish_render(owner, p) for p in saved_paths],
+        'captions': captions,
+        'log': log,
+        'renders': [os.path.basename(p) for p in saved_paths],
+    }
+
 @app.route('/generate_ai_charts', methods=['POST'])
 @requires_auth
 def generate_ai_charts():
     try:
-        # 1. Retrieve saved file and parameters
-        temp_filepath = session.get('temp_csv_path')
-        analysis_params = session.get('last_analysis')
+        # 1. Retrieve saved dataset and parameters
+        dataset_id = session.get('dataset_id')
+        analysis_params = ai_charts_params()
+        df = load_ai_charts_inputs(dataset_id, analysis_params)
+        if df is None:
+             return jsonify({'error': AI_CHARTS_MISSING_INPUTS}), 400
 
-        if not temp_filepath or not analysis_params or not os.path.exists(temp_filepath):
-             return jsonify({'error': 'Error: No se encontró el archivo CSV ni los parámetros de análisis. Ejecuta el análisis y la historia primero.'}), 400
+        result = run_ai_charts(df, dataset_id, analysis_params, job_owner())
+        remember_renders(result.pop('renders'))
+        return jsonify(result)
 
-        # Set metric default from session
-        metric_col_session = analysis_params['metric_choice']
+    except Exception as e:
+        # Check if the error is related to key not being defined in reco (e.g. keyerror)
+        import traceback
+        return jsonify({'error': f'Error generando gráficos de IA: {str(e)}\n{traceback.format_exc()}'}), 500
+# ----------------------------------------------------------------------
 
-        # 2. Open the temporary file and read dataframe
-        with open(temp_filepath, 'rb') as f:
-            
-            f.seek(0) 
-            df = read_csv_smart(f)
-            
-            # Procesar métrica __tasa__ si aplica (para asegurar que esté calculada)
-            if metric_col_session == "__tasa__":
-                tasa = infer_rate(df)
-                if tasa is not None:
-                    df = df.assign(__tasa__=tasa)
-                else:
-                    # Fallback metric
-                    numeric_cols = valid_numeric_cols(df)
-                    metric_col_session = numeric_cols[0] if numeric_cols else 'N/A' 
-            
-            # Use sampled data for heavy charts like Violin/Montaña
-            df_sampled = df.sample(min(30000, len(df)), random_state=42) 
 
-            # 3. Determinar y generar gráficos por recomendación de la IA
-            ai_chart_recos = analysis_params.get('ai_chart_recos')
-            
-            saved_paths, captions = [], []
-            log_msgs = []
-            timestamp = int(time.time() * 1000)
-            
-            # Fallback si no hay recomendaciones dinámicas (usa el comportamiento anterior)
-            if not ai_chart_recos:
-                 ai_chart_recos = [
-                    {"chart_type": "Barras", "group_col": analysis_params['group_col'], "metric_col": metric_col_session, "caption": f"Rendimiento por {analysis_params['group_col']} (Default)"},
-                    {"chart_type": "Líneas", "x_col": analysis_params['line_x'], "y_col": analysis_params['line_y'], "caption": "Tendencia histórica (Default)"}
-                 ]
-                 log_msgs.append("Advertencia: Se usaron gráficos de soporte por defecto (AI no devolvió recomendaciones dinámicas).")
-            else:
-                 log_msgs.append(f"Generando {len(ai_chart_recos)} gráficos basados en insights de IA.")
+# ----------------------------------------------------------------------
+# TRABAJOS ASÍNCRONOS: POST encola y devuelve job_id; GET /jobs/<id> informa el progreso
+# ----------------------------------------------------------------------
+def job_owner():
+    return session.get('username')
 
-            theme = analysis_params['theme']
-            simple_mode = analysis_params['simple_mode']
-            top_n = analysis_params['top_n']
-            
-            for i, reco in enumerate(ai_chart_recos):
-                chart_type = reco.get('chart_type')
-                
-                # Parámetros dinámicos con fallback
-                group_col = reco.get('group_col') or analysis_params['group_col']
-                metric_col = reco.get('metric_col') or metric_col_session # Use session metric as fallback
-                line_x = reco.get('x_col') or analysis_params['line_x']
-                line_y = reco.get('y_col') or metric_col
-                heatmap_row = reco.get('row_col') or analysis_params['group_col']
-                heatmap_col = reco.get('col_col') or analysis_params['line_x']
-                caption_text = reco.get('caption') or f"{chart_type} de {metric_col}"
-
-                fig = None
-                
-                # Lógica de generación de gráfico
-                if chart_type == "Barras":
-                    if group_col in df.columns and metric_col in df.columns:
-                        agg = _agg_topn(df, group_col, metric_col, top_n=top_n)
-                        if not agg.empty:
-                            fig = chart_bar(agg, theme=theme, ylabel=metric_col, simple=simple_mode)
-                elif chart_type == "Pastel":
-                    if group_col in df.columns and metric_col in df.columns:
-                        agg = _agg_topn(df, group_col, metric_col, top_n=top_n, normalize=True)
-                        if not agg.empty:
-                            fig = chart_pie(agg, theme=theme, simple=simple_mode)
-                elif chart_type == "Líneas":
-                    # For lines, ensure line_y (metric) is available
-                    final_line_y = line_y if line_y in df.columns else metric_col
-                    if line_x in df.columns and final_line_y in df.columns:
-                        fig = chart_line(df, x_col=line_x, y_col=final_line_y, theme=theme, simple=simple_mode)
-                elif chart_type == "Heatmap":
-                     if heatmap_row in df.columns and heatmap_col in df.columns and metric_col in df.columns:
-                         fig = chart_heatmap(
-                            df, row_col=heatmap_row, col_col=heatmap_col, metric_col=metric_col, 
-                            theme=theme, simple=simple_mode
-                         )
-                elif chart_type == "Violín":
-                     if group_col in df.columns and metric_col in df.columns:
-                         fig = chart_violin(
-                            df_sampled, group_col=group_col, metric_col=metric_col, 
-                            theme=theme, simple=simple_mode, top_n=top_n
-                         )
-                elif chart_type == "Montaña":
-                     if metric_col in df.columns:
-                         fig = chart_montana(df_sampled, metric_col=metric_col, theme=theme, simple=simple_mode)
-                
-                # Save and collect results if figure was created
-                if fig:
-                    chart_name = f"{chart_type.lower()}_{i}_{timestamp}.png"
-                    pth = os.path.join(OUTPUT_DIR, chart_name)
-                    
-                    base_title = analysis_params.get('custom_title', f"Visualización de Soporte IA")
-                    
-                    make_infographic_from_chart(
-                        fig, 
-                        base_title, 
-                        f"Gráfico de {chart_type}: {caption_text}", # Use the AI's caption here
-                        "Fuente: dataset cargado · © Tu Proyecto", 
-                        theme, 
-                        pth
-                    )
-                    
-                    saved_paths.append(os.path.abspath(pth))
-                    captions.append(caption_text)
-                    log_msgs.append(f"Gráfico de {chart_type} generado: {caption_text}")
-                else:
-                    log_msgs.append(f"Advertencia: No se pudo generar el gráfico de {chart_type} (columnas faltantes o datos insuficientes).")
+def enqueue(kind, fn, *args):
+    job_id = JOB_QUEUE.submit(kind, job_owner(), fn, *args)
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
 
-        image_urls = [f'/output_images/{os.path.basename(p)}' for p in saved_paths]
-        log = " | ".join(log_msgs) if log_msgs else "Gráficos de soporte generados correctamente."
-        
-        return jsonify({
-            'images': image_urls,
-            'captions': captions,
-            'log': log
-        })
+def _sequence_job(job, df, dataset_id, params):
+    job.set_total(6)
+    return run_sequence(df, dataset_id, params, job.owner,
+                        on_image=lambda i, url, caption: job.add_image(url, caption, index=i))
 
+def _ai_charts_job(job, df, dataset_id, analysis_params):
+    job.set_total(len(analysis_params.get('ai_chart_recos') or []) or 2)
+    return run_ai_charts(df, dataset_id, analysis_params, job.owner,
+                         on_image=lambda i, url, caption: job.add_image(url, caption, index=i),
+                         on_total=job.set_total)
+
+def _story_job(job, df, dataset_id, params):
+    job.set_total(1)
+    return run_story(df, dataset_id, params)
+
+@app.route('/jobs/generate_sequence', methods=['POST'])
+@requires_auth
+def job_generate_sequence():
+    try:
+        df, dataset_id, error_msg = load_request_dataset()
+        if error_msg:
+            return dataset_error(error_msg)
+        return enqueue('sequence', _sequence_job, df, dataset_id, sequence_params(request.form))
     except Exception as e:
-        # Check if the error is related to key not being defined in reco (e.g. keyerror)
-        import traceback
-        return jsonify({'error': f'Error generando gráficos de IA: {str(e)}\n{traceback.format_exc()}'}), 500
-# ----------------------------------------------------------------------
+        return jsonify({'error': f'Error en secuencia: {str(e)}'}), 500
+
+@app.route('/jobs/generate_ai_charts', methods=['POST'])
+@requires_auth
+def job_generate_ai_charts():
+    try:
+        dataset_id = session.get('dataset_id')
+        analysis_params = ai_charts_params()
+        df = load_ai_charts_inputs(dataset_id, analysis_params)
+        if df is None:
+            return jsonify({'error': AI_CHARTS_MISSING_INPUTS}), 400
+        return enqueue('ai_charts', _ai_charts_job, df, dataset_id, dict(analysis_params))
+    except Exception as e:
+        return jsonify({'error': f'Error generando gráficos de IA: {str(e)}'}), 500
+
+@app.route('/jobs/generate_story', methods=['POST'])
+@requires_auth
+def job_generate_story():
+    try:
+        df, dataset_id, error_msg = load_request_dataset()
+        if error_msg:
+            return dataset_error(error_msg)
+        return enqueue('story', _story_job, df, dataset_id, story_params(request.form))
+    except Exception as e:
+        return jsonify({'error': f'Error en historia: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@requires_auth
+def job_status(job_id):
+    """
+    Estado y progreso de un trabajo. Las imágenes aparecen en 'images' a medida
+    que terminan; al acabar, 'result' trae la misma respuesta que el endpoint síncrono.
+    """
+    job = JOB_QUEUE.get(job_id)
+    if job is None or job['owner'] != job_owner():
+        return jsonify({'error': 'Trabajo no encontrado.'}), 404
+
+    result = job.pop('result')
+    job.pop('owner')
+    if job['status'] == 'done' and result:
+        # Lo que el endpoint síncrono guarda en sesión se aplica al recoger el resultado
+        if 'renders' in result:
+            remember_renders(result.pop('renders'))
+        if 'analysis' in result:
+            session['last_analysis'] = result.pop('analysis')
+            session['dataset_id'] = result.pop('dataset_id')
+        job['result'] = result
+    return jsonify(job)
+
+
+@app.route('/render_cache/stats', methods=['GET'])
+@requires_auth
+def render_cache_stats():
+    """Contadores del caché de infografías (aciertos, fallos, expulsiones, bytes)."""
+    return jsonify(RENDER_CACHE.stats())
 
 
 @app.route('/download_zip', methods=['GET'])
 @requires_auth # Quita esta línea si la descarga sigue fallando en Cloud Run.
 def download_zip():
     try:
-        # 1. Asegurar que OUTPUT_DIR exista antes de zipear
-        if not os.path.exists(OUTPUT_DIR):
-             return jsonify({'error': 'Error: No hay infografías generadas para descargar.'}), 404
+        # Solo las infografías de esta sesión, y solo desde la carpeta del usuario
+        paths = OUTPUT_STORE.paths(job_owner(), session.get('renders', []))
 
-        # --- Usamos /tmp para escritura segura ---
-        temp_dir = '/tmp'
-        zip_file_name = 'infografias.zip'
-        
-        # Definir la ruta COMPLETA del ZIP en /tmp
-        zip_path_base = os.path.join(temp_dir, 'infografias')
-        zip_path_full = os.path.join(temp_dir, zip_file_name)
+        if not paths:
+             return jsonify({'error': 'Error: No hay infografías generadas para descargar.'}), 404
 
-        # Limpiar archivos previos
-        if os.path.exists(zip_path_full):
-            os.remove(zip_path_full)
-        
-        # Crear el ZIP: zipea el contenido de OUTPUT_DIR, el resultado queda en /tmp
-        # 'zip' es el formato de archivo (zip)
-        shutil.make_archive(zip_path_base, 'zip', OUTPUT_DIR)
-        
-        # Enviar el archivo
-        return send_file(zip_path_full, as_attachment=True, download_name=zip_file_name)
+        # ZIP en streaming: cada descarga genera el suyo, en memoria constante
+        response = Response(stream_with_context(iter_zip(paths)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = 'attachment; filename=infografias.zip'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
     
     except Exception as e:
         # Este print es crucial para debuggear en los logs de Cloud Run
@@ -517,15 +793,14 @@ def download_zip():
 @app.route('/output_images/<filename>')
 @requires_auth
 def output_images(filename):
-    """Sirve los archivos de imagen generados (PNG/JPG) desde OUTPUT_DIR, con seguridad y cacheo deshabilitado."""
+    """Sirve las imágenes generadas desde la carpeta del usuario de la sesión, con cacheo deshabilitado."""
     try:
-        full_path = os.path.join(OUTPUT_DIR, filename)
-        
-        # Validación de seguridad: Previene que el usuario acceda a archivos fuera de OUTPUT_DIR.
-        # Usa el path absoluto normalizado para una comparación segura.
-        if not os.path.abspath(full_path).startswith(os.path.abspath(OUTPUT_DIR)):
-            return "Acceso no permitido", 403
-            
+        # Validación de seguridad: solo nombres simples dentro de la carpeta del
+        # usuario (ni rutas relativas ni imágenes de otros usuarios).
+        full_path = OUTPUT_STORE.resolve(job_owner(), filename)
+        if full_path is None:
+            return jsonify({'error': f'Archivo no encontrado: {filename}'}), 404
+
         # Envía el archivo con el mimetype correcto
         response = send_file(full_path, mimetype='image/png')
         
@@ -548,4 +823,5 @@ if __name__ == '__main__':
     # Si estás ejecutando localmente en Windows, usa debug=True.
     # En la nube, usa el puerto de ambiente.
     port = int(os.environ.get("PORT", 8080))
+    OUTPUT_STORE.start_sweeper()
     app.run(host='0.0.0.0', port=port)
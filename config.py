@@ -15,6 +15,63 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'una_clave_secreta_muy_larga_y_dificil
 OUTPUT_DIR = "./output_images"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Memoria máxima (MB) para DataFrames ya parseados que se reutilizan entre peticiones
+DATASET_STORE_MAX_BYTES = int(os.environ.get("DATASET_STORE_MAX_MB", 512)) * 1024 * 1024
+
+# Copia columnar (Feather) de cada dataset subido, por hash de contenido, con tope en disco (LRU)
+DATASET_CACHE_DIR = os.path.join(OUTPUT_DIR, ".datasets")
+DATASET_CACHE_MAX_BYTES = int(os.environ.get("DATASET_CACHE_MAX_MB", 2048)) * 1024 * 1024
+
+# Procesos para renderizar gráficos en paralelo (1 = en serie)
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", min(6, os.cpu_count() or 1)))
+
+# Caché de infografías ya renderizadas (compartido entre usuarios, no se sirve directamente)
+RENDER_DIR = os.path.join(OUTPUT_DIR, ".renders")
+os.makedirs(RENDER_DIR, exist_ok=True)
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_MB", 256)) * 1024 * 1024
+# El tope es del directorio (compartido por los workers): cada proceso relee el
+# directorio al llegar al tope o si su índice tiene más de estos segundos
+RENDER_CACHE_RESCAN_SECONDS = int(os.environ.get("RENDER_CACHE_RESCAN_SECONDS", 30))
+
+# Cola de trabajos asíncronos (render / historia IA): estado en SQLite, ejecución local
+JOBS_DB_PATH = os.path.join(OUTPUT_DIR, ".state", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 3600))
+
+# Modelo de Gemini y caché persistente de respuestas (clave: hash de modelo + prompt)
+AI_MODEL_NAME = os.environ.get("AI_MODEL_NAME", "gemini-2.5-pro")
+AI_CACHE_PATH = os.path.join(OUTPUT_DIR, ".state", "ai_cache.sqlite3")
+AI_CACHE_TTL_SECONDS = int(os.environ.get("AI_CACHE_TTL_SECONDS", 24 * 3600))
+
+# Usuarios: SQLite (users.json solo se lee una vez para migrar cuentas antiguas)
+USERS_DB_PATH = os.path.join(OUTPUT_DIR, ".state", "users.sqlite3")
+LEGACY_USERS_JSON = os.path.join(OUTPUT_DIR, "users.json")
+
+# Hash de contraseñas: "scrypt" o "pbkdf2_sha256"; calibrar con `python -m utils.passwords`
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "scrypt")
+SCRYPT_N = int(os.environ.get("SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.environ.get("SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("SCRYPT_P", 1))
+PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS", 600_000))
+
+# Servidor de producción (gunicorn.conf.py): procesos, hilos y reciclaje de workers
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 2))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", 8))
+WEB_TIMEOUT = int(os.environ.get("WEB_TIMEOUT", 180))
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 60))
+WEB_MAX_REQUESTS = int(os.environ.get("WEB_MAX_REQUESTS", 500))
+WEB_MAX_REQUESTS_JITTER = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", 50))
+
+# Imágenes publicadas por usuario (OUTPUT_DIR/users/<id>/ + manifest.json) y su retención
+USER_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "users")
+OUTPUT_MAX_AGE_SECONDS = int(os.environ.get("OUTPUT_MAX_AGE_SECONDS", 7 * 24 * 3600))
+OUTPUT_USER_MAX_BYTES = int(os.environ.get("OUTPUT_USER_MAX_MB", 100)) * 1024 * 1024
+OUTPUT_TOTAL_MAX_BYTES = int(os.environ.get("OUTPUT_TOTAL_MAX_MB", 2048)) * 1024 * 1024
+OUTPUT_SWEEP_INTERVAL_SECONDS = int(os.environ.get("OUTPUT_SWEEP_INTERVAL_SECONDS", 600))
+
+# Presupuesto (ms) para `import app` en frío; lo verifica utils/import_profile.py en CI
+COLD_START_BUDGET_MS = int(os.environ.get("COLD_START_BUDGET_MS", 1000))
+
 # ----------------------------------------------------------------------
 # THEMES (Movido desde el script de Gradio)
 # ----------------------------------------------------------------------
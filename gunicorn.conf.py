@@ -0,0 +1,61 @@
+# Configuración del servidor de producción:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Todos los valores salen de config.py (variables de entorno WEB_*).
+import os
+
+from config import (
+    WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT,
+    WEB_MAX_REQUESTS, WEB_MAX_REQUESTS_JITTER,
+)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+# Procesos x hilos: una llamada lenta a Gemini o un render de 6 gráficos solo
+# ocupa un hilo; el resto de usuarios sigue atendido (también el SSE de la historia).
+workers = WEB_WORKERS
+worker_class = "gthread"
+threads = WEB_THREADS
+
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+
+# Reciclaje de workers para contener el crecimiento de memoria de matplotlib;
+# el jitter evita que todos se reinicien a la vez.
+max_requests = WEB_MAX_REQUESTS
+max_requests_jitter = WEB_MAX_REQUESTS_JITTER
+
+# Sin preload: cada worker abre sus propias conexiones SQLite y pools.
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    """
+    Worker con la app ya cargada: precalienta en segundo plano. /login y /logout
+    se atienden de inmediato (la app importa el stack científico en el primer uso).
+    """
+    import threading
+    from utils.output_store import OUTPUT_STORE
+    from utils.warmup import warm_worker
+
+    def warm():
+        try:
+            timings = warm_worker()
+        except Exception:
+            worker.log.exception("Falló el precalentamiento del worker %s", worker.pid)
+            return
+        worker.log.info("Worker %s precalentado: %s", worker.pid,
+                        ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
+    threading.Thread(target=warm, name="warmup", daemon=True).start()
+    # Retención de OUTPUT_DIR (edad y cuotas); el barrido es idempotente entre workers
+    OUTPUT_STORE.start_sweeper()
+
+
+def worker_exit(server, worker):
+    """Apagado o reciclaje: deja terminar los trabajos en curso dentro del margen de gracia."""
+    from utils.warmup import drain_worker
+    drain_worker(timeout=WEB_GRACEFUL_TIMEOUT / 2)
@@ -6,9 +6,78 @@ function toggleAccordion(id) {
 // ------ ESTADO GLOBAL ------
 const appState = {
     seq_paths: [],
-    seq_captions: []
+    seq_captions: [],
+    dataset_id: null,
+    ai_chart_recos: null
 };
 
+// ------ REGISTRO DE DATASET (se sube una sola vez) ------
+
+/**
+ * Sube el CSV a /upload y guarda el dataset_id (hash del contenido).
+ * Las demás peticiones envían solo el ID en lugar de volver a subir el archivo.
+ */
+function uploadDataset(file) {
+    appState.dataset_id = null;
+    const formData = new FormData();
+    formData.append('file', file);
+
+    $.ajax({
+        url: '/upload',
+        type: 'POST',
+        data: formData,
+        processData: false,
+        contentType: false,
+        success: function(data) {
+            if (data.dataset_id) {
+                appState.dataset_id = data.dataset_id;
+                console.log(`Dataset registrado: ${data.dataset_id} (${data.rows} filas)`);
+            }
+        },
+        error: function() {
+            // Si falla, las peticiones siguientes enviarán el archivo completo
+            appState.dataset_id = null;
+        }
+    });
+}
+
+/**
+ * Agrega el dataset al FormData: el ID si ya está registrado, si no el archivo.
+ */
+function appendDataset(formData, fileInput) {
+    if (appState.dataset_id) {
+        formData.append('dataset_id', appState.dataset_id);
+    } else {
+        formData.append('file', fileInput.files[0]);
+    }
+}
+
+/**
+ * Si el servidor respondió 410 (el dataset_id ya no está: expulsado del caché o
+ * registrado en otro worker), devuelve una copia del FormData con el archivo en
+ * lugar del ID para reintentar una sola vez. null si no corresponde reintentar.
+ */
+function retryWithFile(status, formData) {
+    const fileInput = $('#file')[0];
+    if (status !== 410 || !formData.has('dataset_id') || fileInput.files.length === 0) {
+        return null;
+    }
+    appState.dataset_id = null;
+    const retry = new FormData();
+    formData.forEach(function(value, key) {
+        if (key !== 'dataset_id') retry.append(key, value);
+    });
+    retry.append('file', fileInput.files[0]);
+    return retry;
+}
+
+/**
+ * Renueva el dataset_id con el que devuelve el servidor (cabecera X-Dataset-Id).
+ */
+function rememberDatasetId(datasetId) {
+    if (datasetId) appState.dataset_id = datasetId;
+}
+
 // ------ HELPERS DE RENDERIZADO ------
 
 /**
@@ -81,6 +150,134 @@ function generateGallery(data, targetId) {
 }
 
 
+/**
+ * Encola un trabajo (POST /jobs/...) y consulta su estado hasta que termina.
+ * handlers: onProgress(job), onDone(result), onError(msg), onComplete().
+ */
+const JOB_POLL_MS = 700;
+
+function runJob(url, formData, handlers) {
+    const finish = function() { if (handlers.onComplete) handlers.onComplete(); };
+    const fail = function(jqXHR) {
+        const retry = retryWithFile(jqXHR.status, formData);
+        if (retry) {
+            runJob(url, retry, handlers);
+            return;
+        }
+        handlers.onError(jqXHR.responseJSON ? jqXHR.responseJSON.error : jqXHR.responseText);
+        finish();
+    };
+
+    $.ajax({
+        url: url,
+        type: 'POST',
+        data: formData,
+        processData: false,
+        contentType: false,
+        success: function(data, textStatus, jqXHR) {
+            rememberDatasetId(jqXHR.getResponseHeader('X-Dataset-Id'));
+            if (data.error) {
+                handlers.onError(data.error);
+                finish();
+                return;
+            }
+            pollJob(data.status_url, handlers);
+        },
+        error: fail
+    });
+}
+
+/**
+ * Consulta el estado de un trabajo ya encolado hasta que termina.
+ */
+function pollJob(statusUrl, handlers) {
+    const finish = function() { if (handlers.onComplete) handlers.onComplete(); };
+    $.getJSON(statusUrl).done(function(job) {
+        if (handlers.onProgress) handlers.onProgress(job);
+        if (job.status === 'done') {
+            handlers.onDone(job.result);
+            finish();
+        } else if (job.status === 'error') {
+            handlers.onError(job.error);
+            finish();
+        } else {
+            setTimeout(function() { pollJob(statusUrl, handlers); }, JOB_POLL_MS);
+        }
+    }).fail(function(jqXHR) {
+        handlers.onError(jqXHR.responseJSON ? jqXHR.responseJSON.error : jqXHR.responseText);
+        finish();
+    });
+}
+
+/**
+ * Lee una respuesta Server-Sent Events (POST con fetch) y llama a handlers[evento](datos).
+ */
+function streamEvents(url, formData, handlers) {
+    return fetch(url, { method: 'POST', body: formData }).then(function(response) {
+        const retry = retryWithFile(response.status, formData);
+        if (retry) {
+            return streamEvents(url, retry, handlers);
+        }
+        if (!response.ok || !response.body) {
+            return response.json().then(function(data) { throw new Error(data.error || response.statusText); });
+        }
+        rememberDatasetId(response.headers.get('X-Dataset-Id'));
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        const dispatch = function(frame) {
+            let event = 'message';
+            const data = [];
+            frame.split('\n').forEach(function(line) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+            });
+            if (data.length && handlers[event]) handlers[event](JSON.parse(data.join('\n')));
+        };
+
+        const read = function() {
+            return reader.read().then(function(result) {
+                if (result.done) {
+                    if (buffer.trim()) dispatch(buffer);
+                    return;
+                }
+                buffer += decoder.decode(result.value, { stream: true });
+                let sep;
+                while ((sep = buffer.indexOf('\n\n')) >= 0) {
+                    dispatch(buffer.slice(0, sep));
+                    buffer = buffer.slice(sep + 2);
+                }
+                return read();
+            });
+        };
+        return read();
+    });
+}
+
+// Conversión de Markdown simple a HTML para el frontend
+function storyToHtml(markdown) {
+    return markdown
+                .replace(/### (.*)/g, '<h3>$1</h3>')
+                .replace(/###\s(.*)/g, '<h3>$1</h3>')
+                .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+                .replace(/\n/g, '<br>')
+                .replace(/<br>\* (.*)/g, '<br>&nbsp;&nbsp;&nbsp;• $1')
+                .replace(/\* (.*)/g, '&nbsp;&nbsp;&nbsp;• $1');
+}
+
+/**
+ * Galería parcial con las imágenes de un trabajo que ya terminaron (en orden de paso).
+ */
+function generateJobGallery(job, targetId) {
+    const items = (job.images || []).slice().sort((a, b) => a.index - b.index);
+    if (items.length === 0) return;
+    generateGallery({
+        images: items.map(item => item.url),
+        captions: items.map(item => item.caption)
+    }, targetId);
+}
+
 function showLog(message, targetId, isError = false) {
     const container = $(targetId);
     const className = isError ? 'log-error' : 'log-success';
@@ -144,45 +341,27 @@ function updateDownloadButtonVisibility() {
 // ---------------------------------------------------------------------
 
 
-// --- FUNCIÓN SECUENCIAL PARA GENERAR GRÁFICOS DE SOPORTE DE LA IA ---
-function generateAiCharts() {
-    
-    const fileInput = $('#file')[0];
-    if (fileInput.files.length === 0) {
-        showLog('Error: Archivo CSV no cargado.', '#aiChartsLog', true);
-        return;
-    }
-    
-    const formData = new FormData();
-    formData.append('file', fileInput.files[0]);
-    
-    $('#aiChartsLog').html('<p>Generando gráficos de soporte (Barra y Líneas)...</p>');
-    $('#aiChartsGallery').empty();
-    $('#downloadZipBtn').hide(); // Ocultar mientras carga
-
-    $.ajax({
-        url: '/generate_ai_charts', 
-        type: 'POST',
-        data: formData,
-        processData: false,
-        contentType: false,
-        success: function(data) {
-            if (data.error) {
-                showLog(data.error, '#aiChartsLog', true);
-                updateDownloadButtonVisibility();
-                return;
+// Progreso y resultado del trabajo de gráficos de soporte (encolado aquí o por el stream de la historia)
+function aiChartsHandlers() {
+    return {
+        onProgress: function(job) {
+            generateJobGallery(job, '#aiChartsGallery');
+            if (job.status === 'running') {
+                $('#aiChartsLog').html(`<p>Generando gráficos de soporte (${job.progress.done}/${job.progress.total})...</p>`);
             }
+        },
+        onDone: function(data) {
             generateGallery(data, '#aiChartsGallery');
             showLog(data.log, '#aiChartsLog');
             
             // *** Muestra el botón de descarga solo si se generaron gráficos ***
             updateDownloadButtonVisibility();
         },
-        error: function(jqXHR) {
-            showLog('Error generando gráficos de soporte: ' + (jqXHR.responseJSON ? jqXHR.responseJSON.error : jqXHR.responseText), '#aiChartsLog', true);
+        onError: function(message) {
+            showLog('Error generando gráficos de soporte: ' + escapeHTML(message), '#aiChartsLog', true);
             updateDownloadButtonVisibility();
         }
-    });
+    };
 }
 // ----------------------------------------------------------------------
 
@@ -278,6 +457,11 @@ $(document).ready(function() {
         appState.seq_paths = [];
         appState.seq_captions = [];
         console.log('Estado reseteado por carga de nuevo archivo.');
+
+        // Registra el CSV en el servidor una sola vez
+        if (this.files.length > 0) {
+            uploadDataset(this.files[0]);
+        }
     });
 
 
@@ -290,7 +474,7 @@ $(document).ready(function() {
         }
 
         const formData = new FormData();
-        formData.append('file', fileInput.files[0]);
+        appendDataset(formData, fileInput);
         formData.append('method', $('#method').val());
         formData.append('group_col', $('#group_col').val()); 
         formData.append('metric_choice', $('#metric_choice').val());
@@ -302,63 +486,76 @@ $(document).ready(function() {
         
         $(this).text('Analizando...').prop('disabled', true);
 
-        $.ajax({
-            url: '/analyze',
-            type: 'POST',
-            data: formData,
-            processData: false,
-            contentType: false,
-            success: function(data) {
-                if (data.error) {
-                    alert('Error: ' + data.error);
-                    return;
-                }
-                
-                generateTable(data.head, '#headTable');
-                generateTable(data.schema, '#schemaTable');
-                generateTable(data.anom, '#anomTable', 100); 
-                generateTable(data.iso, '#isoTable', 100); 
-                
-                updateDropdown('#group_col', data.groups, $('#group_col').val());
-                updateDropdown('#metric_choice', data.metrics, data.current_metric);
-
-                // Lógica de autoselección para la secuencia
-                const best_group = data.groups.length > 0 ? data.groups[0] : 'col_grupo_1';
-                const best_group_2 = data.groups.length > 1 ? data.groups[1] : best_group;
-                const best_metric = data.current_metric;
-
-                $('#seq_line_x').val(best_group_2); 
-                $('#seq_line_y').val(best_metric); 
-                $('#seq_hm_row').val(best_group); 
-                $('#seq_hm_col').val(best_group_2);
-                
-                // Mueve la vista a la sección de resultados
-                $('html, body').animate({
-                    scrollTop: $("#headTable").offset().top - 200
-                }, 500);
-
-
-            },
-            error: function(jqXHR) {
-                let errorMsg = 'Error al analizar CSV.';
-                try {
-                    const err = JSON.parse(jqXHR.responseText);
-                    if(err.error) {
-                        errorMsg = "Error: " + err.error;
-                    } else if(err.anom && err.anom[0].mensaje) {
-                        errorMsg = "Error en JSON: " + err.anom[0].mensaje;
-                    } else {
-                        errorMsg = "Error en JSON: " + jqXHR.responseText;
+        // Si el ID ya no está en el servidor se reintenta una vez con el archivo
+        const send = function(payload) {
+            let retrying = false;
+            $.ajax({
+                url: '/analyze',
+                type: 'POST',
+                data: payload,
+                processData: false,
+                contentType: false,
+                success: function(data, textStatus, jqXHR) {
+                    rememberDatasetId(jqXHR.getResponseHeader('X-Dataset-Id'));
+                    if (data.error) {
+                        alert('Error: ' + data.error);
+                        return;
+                    }
+                    
+                    generateTable(data.head, '#headTable');
+                    generateTable(data.schema, '#schemaTable');
+                    generateTable(data.anom, '#anomTable', 100); 
+                    generateTable(data.iso, '#isoTable', 100); 
+                    
+                    updateDropdown('#group_col', data.groups, $('#group_col').val());
+                    updateDropdown('#metric_choice', data.metrics, data.current_metric);
+
+                    // Lógica de autoselección para la secuencia
+                    const best_group = data.groups.length > 0 ? data.groups[0] : 'col_grupo_1';
+                    const best_group_2 = data.groups.length > 1 ? data.groups[1] : best_group;
+                    const best_metric = data.current_metric;
+
+                    $('#seq_line_x').val(best_group_2); 
+                    $('#seq_line_y').val(best_metric); 
+                    $('#seq_hm_row').val(best_group); 
+                    $('#seq_hm_col').val(best_group_2);
+                    
+                    // Mueve la vista a la sección de resultados
+                    $('html, body').animate({
+                        scrollTop: $("#headTable").offset().top - 200
+                    }, 500);
+
+
+                },
+                error: function(jqXHR) {
+                    const retry = retryWithFile(jqXHR.status, payload);
+                    if (retry) {
+                        retrying = true;
+                        send(retry);
+                        return;
                     }
-                } catch(e) {
-                    errorMsg = (jqXHR.responseJSON ? jqXHR.responseJSON.error : jqXHR.responseText);
+                    let errorMsg = 'Error al analizar CSV.';
+                    try {
+                        const err = JSON.parse(jqXHR.responseText);
+                        if(err.error) {
+                            errorMsg = "Error: " + err.error;
+                        } else if(err.anom && err.anom[0].mensaje) {
+                            errorMsg = "Error en JSON: " + err.anom[0].mensaje;
+                        } else {
+                            errorMsg = "Error en JSON: " + jqXHR.responseText;
+                        }
+                    } catch(e) {
+                        errorMsg = (jqXHR.responseJSON ? jqXHR.responseJSON.error : jqXHR.responseText);
+                    }
+                    alert(errorMsg);
+                },
+                complete: function() {
+                    if (retrying) return;
+                    $('#analyzeBtn').text('Analizar CSV').prop('disabled', false);
                 }
-                alert(errorMsg);
-            },
-            complete: function() {
-                $('#analyzeBtn').text('Analizar CSV').prop('disabled', false);
-            }
-        });
+            });
+        };
+        send(formData);
     });
 
     // --- 2) Generar Secuencia Nativa ---
@@ -370,7 +567,7 @@ $(document).ready(function() {
         }
 
         const formData = new FormData();
-        formData.append('file', fileInput.files[0]);
+        appendDataset(formData, fileInput);
         formData.append('group_col', $('#group_col').val());
         formData.append('metric_choice', $('#metric_choice').val());
         formData.append('seq_theme', $('#seq_theme').val());
@@ -388,28 +585,24 @@ $(document).ready(function() {
         $('#seqGallery').html('<p>Generando 6 pasos (esto puede tardar)...</p>');
         showLog('', '#seqLog');
 
-        $.ajax({
-            url: '/generate_sequence',
-            type: 'POST',
-            data: formData,
-            processData: false,
-            contentType: false,
-            success: function(data) {
-                if (data.error) {
-                    showLog(data.error, '#seqLog', true);
-                    $('#seqGallery').empty();
-                    return;
+        runJob('/jobs/generate_sequence', formData, {
+            onProgress: function(job) {
+                generateJobGallery(job, '#seqGallery');
+                if (job.status === 'running') {
+                    showLog(`Renderizando pasos: ${job.progress.done}/${job.progress.total}`, '#seqLog');
                 }
+            },
+            onDone: function(data) {
                 generateGallery(data, '#seqGallery');
                 showLog(data.log, '#seqLog');
                 appState.seq_paths = data.images;
                 appState.seq_captions = data.captions;
             },
-            error: function(jqXHR) {
-                showLog('Error generando secuencia: ' + (jqXHR.responseJSON ? jqXHR.responseJSON.error : jqXHR.responseText), '#seqLog', true);
+            onError: function(message) {
+                showLog('Error generando secuencia: ' + escapeHTML(message), '#seqLog', true);
                 $('#seqGallery').empty();
             },
-            complete: function() {
+            onComplete: function() {
                 $('#generateSeqBtn').text('Generar Secuencia Nativa').prop('disabled', false);
             }
         });
@@ -425,7 +618,7 @@ $(document).ready(function() {
 
         const formData = new FormData();
         // Claves del análisis inicial
-        formData.append('file', fileInput.files[0]);
+        appendDataset(formData, fileInput);
         formData.append('group_col', $('#group_col').val());
         formData.append('metric_choice', $('#metric_choice').val());
         formData.append('method', $('#method').val());
@@ -448,41 +641,35 @@ $(document).ready(function() {
         $('#aiChartsGallery').html('<p>Esperando la respuesta de la IA...</p>');
 
 
-        $.ajax({
-            url: '/generate_story',
-            type: 'POST',
-            data: formData,
-            processData: false,
-            contentType: false,
-            success: function(data) {
-                if (data.error) {
-                    showLog(data.error, '#storyMd', true);
-                    $('#aiChartsGallery').empty();
-                    return;
-                }
-                
-                // Conversión de Markdown simple a HTML para el frontend
-                const storyHtml = data.story
-                                    .replace(/### (.*)/g, '<h3>$1</h3>')
-                                    .replace(/###\s(.*)/g, '<h3>$1</h3>')
-                                    .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-                                    .replace(/\n/g, '<br>')
-                                    .replace(/<br>\* (.*)/g, '<br>&nbsp;&nbsp;&nbsp;• $1')
-                                    .replace(/\* (.*)/g, '&nbsp;&nbsp;&nbsp;• $1'); 
-                                    
-                $('#storyMd').html(storyHtml);
-                
-                // *** ¡PASO SECUENCIAL CLAVE! ***
-                // Después de obtener la historia, genera los gráficos de soporte
-                generateAiCharts();
+        // La historia llega por trozos (SSE); los gráficos se encolan en cuanto se cierra charts_reco
+        let storyText = '';
+        appState.ai_chart_recos = null;
+        const storyFailed = function(message) {
+            showLog(`Error: ${escapeHTML(message)}`, '#storyMd', true);
+            $('#aiChartsGallery').empty();
+        };
+
+        streamEvents('/generate_story/stream', formData, {
+            story: function(chunk) {
+                storyText += chunk;
+                $('#storyMd').html(storyToHtml(storyText));
             },
-            error: function(jqXHR) {
-                showLog(`Error: ${escapeHTML(jqXHR.responseJSON ? jqXHR.responseJSON.error : jqXHR.responseText)}`, '#storyMd', true);
+            charts: function(data) {
+                appState.ai_chart_recos = data.recos;
+                $('#aiChartsLog').html('<p>Generando gráficos de soporte...</p>');
                 $('#aiChartsGallery').empty();
+                pollJob(data.status_url, aiChartsHandlers());
+            },
+            done: function(data) {
+                $('#storyMd').html(storyToHtml(data.story));
             },
-            complete: function() {
-                $('#generateStoryBtn').text('🧠 Generar Insights y Gráficos').prop('disabled', false);
+            error: function(data) {
+                storyFailed(data.error);
             }
+        }).catch(function(err) {
+            storyFailed(err.message);
+        }).finally(function() {
+            $('#generateStoryBtn').text('🧠 Generar Insights y Gráficos').prop('disabled', false);
         });
     });
 
@@ -1,8 +1,36 @@
 # conftest.py
-# Configuración común para TODOS los tests (ruta raíz en PYTHONPATH)
+# Configuración común para TODOS los tests (ruta raíz en PYTHONPATH y salida aislada)
 
 import sys
 import os
+import pytest
 
 # Agregar el directorio raíz del proyecto a PYTHONPATH
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture(autouse=True)
+def salida_aislada(tmp_path_factory, monkeypatch):
+    """
+    Renders, carpetas de usuario, datasets columnares y caché de IA en un
+    directorio temporal: los tests no dejan archivos en output_images/.
+    """
+    import app as app_module
+    import utils.columnar_cache as columnar_cache
+    import utils.narrative as narrative
+    import utils.render_engine as render_engine
+    from utils.ai_cache import AIResponseCache
+    from utils.output_store import OutputStore
+    from utils.render_cache import RenderCache
+
+    base = tmp_path_factory.mktemp("salida")
+    renders = base / "renders"
+    renders.mkdir()
+    cache = RenderCache(directory=str(renders))
+    monkeypatch.setattr(narrative, "RENDER_DIR", str(renders))
+    monkeypatch.setattr(narrative, "RENDER_CACHE", cache)
+    monkeypatch.setattr(render_engine, "RENDER_CACHE", cache)
+    monkeypatch.setattr(app_module, "OUTPUT_STORE", OutputStore(root=str(base / "users"), render_cache=cache))
+    monkeypatch.setattr(columnar_cache, "DATASET_CACHE_DIR", str(base / "datasets"))
+    monkeypatch.setattr(narrative, "AI_CACHE", AIResponseCache(db_path=str(base / "ai.sqlite3")))
+    return base
@@ -0,0 +1,75 @@
+# test_aggregation.py
+# Test del cubo de agregación compartido (gráficos + anomalías por grupo)
+
+import numpy as np
+import pandas as pd
+import pytest
+import utils.aggregation as aggregation
+from utils.aggregation import get_cube
+from utils.charts import _agg_topn, _agg_line, _agg_cells
+from utils.data_processing import detect_group_anomalies
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 2000
+    nota = rng.normal(14, 3, n).round(2).astype(object)
+    nota[::97] = "s/n"  # valores no numéricos -> NaN
+    return pd.DataFrame({
+        "grupo": rng.choice(list("ABCDEFG"), n),
+        "semestre": rng.choice(["2023", "2024", "x"], n),
+        "nota": nota,
+    })
+
+
+def test_estadisticas_coinciden_con_groupby(df):
+    """count/sum/mean/sumsq/median coinciden con el groupby de pandas."""
+    v = pd.to_numeric(df["nota"], errors="coerce")
+    ref = pd.DataFrame({"grupo": df["grupo"], "v": v}).dropna().groupby("grupo")["v"]
+
+    stats = get_cube(df, "nota").stats("grupo")
+
+    pd.testing.assert_series_equal(stats["count"], ref.count(), check_names=False)
+    pd.testing.assert_series_equal(stats["mean"], ref.mean(), check_names=False)
+    pd.testing.assert_series_equal(stats["median"], ref.median(), check_names=False)
+    pd.testing.assert_series_equal(stats["sumsq"], ref.apply(lambda s: (s * s).sum()), check_names=False)
+
+
+def test_helpers_de_graficos_reutilizan_el_cubo(df, monkeypatch):
+    """Barras, pastel, líneas y heatmap sobre el mismo df convierten la métrica una sola vez."""
+    conversiones = []
+    original = aggregation.pd.to_numeric
+
+    def espia(s, *args, **kwargs):
+        if s.name == "nota":
+            conversiones.append(1)
+        return original(s, *args, **kwargs)
+
+    monkeypatch.setattr(aggregation.pd, "to_numeric", espia)
+
+    top = _agg_topn(df, "grupo", "nota", top_n=3)
+    _agg_topn(df, "grupo", "nota", top_n=3, normalize=True)
+    _agg_cells(df, "grupo", "semestre", "nota")
+    detect_group_anomalies(df, "grupo", "nota", min_n=1)
+
+    assert len(conversiones) == 1
+    assert top.name == "nota" and top.index.name == "grupo"
+    assert len(top) == 3 and top.is_monotonic_decreasing
+
+
+def test_linea_convierte_eje_x(df):
+    """El eje X de líneas se agrupa por su valor numérico (los no numéricos se descartan)."""
+    m = _agg_line(df, "semestre", "nota")
+
+    assert list(m.columns) == ["semestre", "nota"]
+    assert m["semestre"].tolist() == [2023.0, 2024.0]
+
+
+def test_anomalias_por_grupo(df):
+    """La tabla de anomalías mantiene columnas y orden por media descendente."""
+    out = detect_group_anomalies(df, "grupo", "nota", min_n=1)
+
+    assert list(out.columns) == ["grupo", "n", "mean", "anomalia"]
+    assert out["mean"].is_monotonic_decreasing
+    assert out["n"].sum() == pd.to_numeric(df["nota"], errors="coerce").notna().sum()
@@ -0,0 +1,95 @@
+# test_ai_cache.py
+# Test del caché de respuestas de IA y de la coalescencia de peticiones (sin red)
+
+import sqlite3
+import threading
+import time
+import pandas as pd
+import pytest
+import utils.narrative as narrative
+from utils.ai_cache import AIResponseCache
+
+
+class FakeModel:
+    """Modelo local: cuenta llamadas y tarda un poco (para simular la API)."""
+
+    model_name = "fake-model"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+
+        class R:
+            text = "### 🧠 Resumen Ejecutivo\nRespuesta falsa"
+        return R()
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    model = FakeModel(delay=0.2)
+    monkeypatch.setattr(narrative, "AI_CACHE", AIResponseCache(db_path=str(tmp_path / "ai.sqlite3"), ttl=60))
+    narrative.set_ai_model(model)
+    yield model
+    narrative.set_ai_model(None)
+
+
+def _insumos(metric="nota"):
+    schema_df = pd.DataFrame({"columna": ["nota"], "tipo": ["int"]})
+    anom_df = pd.DataFrame({"grupo": ["A"], "anomalia": ["⚠"]})
+    bar = pd.Series([15.0], index=pd.Index(["A"], name="grupo"), name=metric)
+    return schema_df, anom_df, bar
+
+
+def test_mismo_prompt_se_sirve_desde_cache(fake):
+    primero = narrative.get_ai_insights(*_insumos())
+    segundo = narrative.get_ai_insights(*_insumos())
+    otro = narrative.get_ai_insights(*_insumos(metric="__tasa__"))
+
+    assert primero == segundo == otro
+    assert fake.calls == 2
+    assert narrative.AI_CACHE.hits == 1
+
+
+def test_peticiones_simultaneas_comparten_una_llamada(fake):
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(narrative.get_ai_insights(*_insumos())))
+             for _ in range(5)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert fake.calls == 1
+    assert len(resultados) == 5 and len(set(resultados)) == 1
+
+
+def test_respuesta_caducada_se_vuelve_a_pedir(fake, monkeypatch):
+    narrative.get_ai_insights(*_insumos())
+    narrative.AI_CACHE.ttl = 0
+    time.sleep(0.01)
+    narrative.get_ai_insights(*_insumos())
+    assert fake.calls == 2
+
+
+def test_errores_no_se_guardan(tmp_path, monkeypatch):
+    class Roto:
+        def generate_content(self, prompt):
+            raise RuntimeError("sin cuota")
+
+    monkeypatch.setattr(narrative, "AI_CACHE", AIResponseCache(db_path=str(tmp_path / "ai.sqlite3")))
+    narrative.set_ai_model(Roto())
+    try:
+        texto = narrative.get_ai_insights(*_insumos())
+    finally:
+        narrative.set_ai_model(None)
+
+    assert "Error contactando a Gemini" in texto
+    assert narrative.AI_CACHE.misses == 1
+    with sqlite3.connect(narrative.AI_CACHE.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
@@ -0,0 +1,60 @@
+# test_column_types.py
+# Test de la inferencia de tipos compartida por dataset
+
+import numpy as np
+import pandas as pd
+import utils.column_types as column_types
+from utils.aggregation import get_cube
+from utils.data_processing import (
+    valid_numeric_cols, group_candidates, infer_rate, detect_row_anomalies
+)
+
+
+def _df():
+    rng = np.random.default_rng(1)
+    n = 300
+    return pd.DataFrame({
+        "grupo": rng.choice(list("ABC"), n),
+        "semestre": rng.integers(1, 5, n),
+        "cursosaprobados": rng.integers(0, 6, n).astype(str),   # numérica como texto
+        "cursosmatriculados": rng.integers(6, 9, n),
+        "nota": rng.normal(14, 2, n),
+        "codigo": [f"X{i}" for i in range(n)],
+    })
+
+
+def test_tipos_iguales_a_la_inferencia_original():
+    df = _df()
+    assert valid_numeric_cols(df) == ["cursosaprobados", "cursosmatriculados", "nota", "semestre"]
+    assert group_candidates(df) == ["grupo", "cursosaprobados", "codigo", "semestre", "cursosmatriculados"]
+
+
+def test_cada_columna_se_convierte_una_sola_vez(monkeypatch):
+    """Las llamadas repetidas (análisis, historia, gráficos) reutilizan las conversiones."""
+    df = _df()
+    conversiones = []
+    original = column_types.pd.to_numeric
+
+    def espia(s, *args, **kwargs):
+        conversiones.append(s.name)
+        return original(s, *args, **kwargs)
+
+    monkeypatch.setattr(column_types.pd, "to_numeric", espia)
+
+    for _ in range(3):
+        valid_numeric_cols(df)
+        group_candidates(df)
+    infer_rate(df)
+    get_cube(df, "nota").stats("grupo")
+    detect_row_anomalies(df, frac=0.05)
+
+    assert sorted(conversiones) == sorted(set(conversiones))
+    assert "cursosaprobados" in conversiones and "codigo" in conversiones
+
+
+def test_df_nuevo_no_reutiliza_tipos_de_otro():
+    df = _df()
+    valid_numeric_cols(df)
+    otro = df.assign(codigo=range(len(df)))
+    assert "codigo" in valid_numeric_cols(otro)
+    assert "codigo" not in valid_numeric_cols(df)
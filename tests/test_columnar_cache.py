@@ -0,0 +1,82 @@
+# test_columnar_cache.py
+# Test de la copia columnar (Feather) de los datasets subidos
+
+import pandas as pd
+import pytest
+import utils.columnar_cache as cc
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cc, "DATASET_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _df():
+    return pd.DataFrame({
+        "estructuraalumno": ["A", "B", "C"],
+        "cursosaprobados": [3, 4, 0],
+        "cursosmatriculados": [4, 4, 0],
+        "promedio": [14.5, 12.0, 11.25],
+    })
+
+
+def test_guardar_y_cargar_mantiene_dtypes():
+    """Ida y vuelta sin parsear texto: mismos valores y mismos dtypes."""
+    df = _df()
+    cc.save_dataset("abc", df)
+
+    out = cc.load_dataset("abc")
+
+    pd.testing.assert_frame_equal(out, df)
+    assert "__tasa__" not in out.columns
+
+
+def test_no_guarda_columnas_derivadas():
+    """Se guarda el dataset tal como se parseó (__tasa__ se deriva al usarlo)."""
+    cc.save_dataset("abc", _df())
+
+    assert "__tasa__" not in cc.load_dataset("abc").columns
+
+
+def test_columnas_mixtas_se_guardan_con_pickle(cache_dir):
+    """Si Arrow no admite una columna, el dataset se persiste igual (otro worker lo encuentra)."""
+    df = _df().assign(codigo=[1, "B2", 3.5])
+
+    ruta = cc.save_dataset("mixto", df)
+
+    assert ruta is not None and ruta.endswith(".pkl")
+    assert cc.has_dataset("mixto")
+    pd.testing.assert_frame_equal(cc.load_dataset("mixto"), df)
+
+
+def test_dataset_inexistente():
+    assert cc.load_dataset("no-existe") is None
+    assert not cc.has_dataset(None)
+
+
+def test_expulsa_los_datasets_menos_usados(cache_dir, monkeypatch):
+    """Con el tope de bytes superado se borra el dataset usado hace más tiempo."""
+    import os
+    for i, nombre in enumerate(["viejo", "usado", "nuevo"]):
+        ruta = cc.save_dataset(nombre, _df())
+        os.utime(ruta, (1000 + i, 1000 + i))
+    cc.load_dataset("viejo")   # leerlo lo marca como reciente
+    tamano = os.path.getsize(cc._dataset_paths("nuevo")[0])
+    monkeypatch.setattr(cc, "DATASET_CACHE_MAX_BYTES", 2 * tamano)
+
+    cc.save_dataset("otro", _df())
+
+    assert sorted(os.listdir(cache_dir)) == sorted(
+        os.path.basename(cc._dataset_paths(n)[0]) for n in ["viejo", "otro"]
+    )
+
+
+def test_graficos_ia_reutilizan_el_dataset_en_memoria(cache_dir):
+    """load_ai_charts_inputs devuelve el mismo objeto del registro (memos por id(df))."""
+    import app as app_module
+    df = _df()
+    app_module.DATASET_STORE.put("ds-memoria", df)
+
+    assert app_module.load_ai_charts_inputs("ds-memoria", {"group_col": "estructuraalumno"}) is df
+    assert app_module.load_ai_charts_inputs("ds-memoria", None) is None
@@ -0,0 +1,192 @@
+# test_data_processing.py
+# Test de lectura e ingesta de CSV (unitario) para utils.data_processing
+
+from io import BytesIO
+import numpy as np
+import pytest
+import pandas as pd
+import utils.data_processing as dp
+
+
+def _contar_parseos(monkeypatch):
+    llamadas = []
+    original = pd.read_csv
+
+    def espia(*args, **kwargs):
+        llamadas.append(kwargs.get("encoding"))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(dp.pd, "read_csv", espia)
+    return llamadas
+
+
+def test_read_csv_latin1_punto_y_coma_un_solo_parseo(monkeypatch):
+    """Un export latin1 separado por ';' se detecta y se parsea una sola vez."""
+    raw = "año;región;nota\n2024;Ñuñoa;15\n2024;Peñalolén;12\n".encode("latin1")
+    llamadas = _contar_parseos(monkeypatch)
+
+    df = dp.read_csv_smart(BytesIO(raw))
+
+    assert llamadas == ["latin1"]
+    assert list(df.columns) == ["año", "región", "nota"]
+    assert df["región"].tolist() == ["Ñuñoa", "Peñalolén"]
+
+
+def test_read_csv_utf8_coma(monkeypatch):
+    """UTF-8 separado por comas: un parseo y respeta nrows."""
+    raw = "estructuraalumno,semestre,nota\nA,2024-1,15\nB,2024-1,12\nC,2024-2,11\n".encode("utf-8")
+    llamadas = _contar_parseos(monkeypatch)
+
+    df = dp.read_csv_smart(BytesIO(raw), nrows=2)
+
+    assert llamadas == ["utf-8"]
+    assert df.shape == (2, 3)
+
+
+def test_sniffer_recibe_solo_los_primeros_kb_en_lineas_completas(monkeypatch):
+    """El separador se detecta con pocos KB (coste del Sniffer acotado); la codificación con el bloque entero."""
+    textos = []
+    original = dp.csv.Sniffer.sniff
+    monkeypatch.setattr(dp.csv.Sniffer, "sniff",
+                        lambda self, text, *a, **k: textos.append(text) or original(self, text, *a, **k))
+    filas = "".join(f"grupo_{i};{i};{i * 0.5}\n" for i in range(dp.SNIFF_BYTES // 10))
+    raw = ("grupo;valor;nota\n" + filas).encode("utf-8")
+    mitad = dp.SNIFF_BYTES // 2   # latin1 más allá de lo que ve el Sniffer
+    sample = (raw[:mitad] + "Ñ".encode("latin1") + raw[mitad:])[:dp.SNIFF_BYTES]
+
+    encoding, sep = dp.sniff_csv(sample)
+
+    assert (encoding, sep) == ("latin1", ";")
+    assert len(textos) == 1 and len(textos[0]) <= dp.DELIMITER_SNIFF_CHARS
+    assert textos[0].split("\n")[-1].count(";") == 2   # termina en una línea completa
+
+
+def test_read_csv_latin1_despues_del_bloque_inspeccionado():
+    """Si el latin1 aparece después de los primeros KB se reintenta sin fallar."""
+    filas = "".join(f"A,{i}\n" for i in range(dp.SNIFF_BYTES // 4))
+    raw = ("grupo,valor\n" + filas + "Ñ,1\n").encode("latin1")
+
+    df = dp.read_csv_smart(BytesIO(raw))
+
+    assert df["grupo"].iloc[-1] == "Ñ"
+
+
+def _csv_grupos(n=6000, seed=0):
+    rng = np.random.default_rng(seed)
+    grupos = rng.choice([f"G{i:02d}" for i in range(12)], n)
+    aprobados = rng.integers(0, 8, n).astype(float)
+    aprobados[grupos == "G03"] += 6          # grupo anómalo
+    aprobados[rng.random(n) < 0.02] = np.nan
+    df = pd.DataFrame({
+        "estructuraalumno": grupos,
+        "cursosaprobados": aprobados,
+        "cursosmatriculados": rng.integers(6, 14, n),
+        "nota": rng.normal(14, 2, n).round(1),
+    })
+    return df, df.to_csv(index=False).encode("utf-8")
+
+
+@pytest.mark.parametrize("metric", ["__tasa__", "nota"])
+@pytest.mark.parametrize("method", ["iqr", "z", "mad"])
+def test_anomalias_en_streaming_igual_que_en_memoria(method, metric):
+    """La variante por trozos devuelve la misma tabla que la versión en memoria."""
+    df, raw = _csv_grupos()
+
+    esperado = dp.detect_group_anomalies(df, "estructuraalumno", metric, method)
+    obtenido = dp.detect_group_anomalies_stream(BytesIO(raw), "estructuraalumno", metric,
+                                                method, chunksize=700)
+
+    pd.testing.assert_frame_equal(obtenido, esperado)
+
+
+@pytest.mark.parametrize("con_texto", [True, False])
+def test_anomalias_en_streaming_grupo_con_tipos_mixtos_por_trozo(con_texto):
+    """Un grupo numérico en unos trozos y con texto en otros no parte la misma clave (1 vs "1")."""
+    rng = np.random.default_rng(5)
+    n = 3000
+    grupos = rng.integers(1, 9, n).astype(object)
+    if con_texto:
+        grupos[-200:] = rng.choice(["1", "2", "X9"], 200)   # solo el último trozo trae texto
+    df = pd.DataFrame({"estructuraalumno": grupos, "nota": rng.normal(14, 2, n).round(1)})
+    raw = df.to_csv(index=False).encode("utf-8")
+
+    esperado = dp.detect_group_anomalies(dp.read_csv_smart(BytesIO(raw)), "estructuraalumno", "nota",
+                                         min_n=1)
+    obtenido = dp.detect_group_anomalies_stream(BytesIO(raw), "estructuraalumno", "nota",
+                                                min_n=1, chunksize=500)
+
+    pd.testing.assert_frame_equal(obtenido, esperado)
+    assert obtenido["estructuraalumno"].is_unique
+
+
+def test_anomalias_en_streaming_lee_solo_columnas_necesarias(monkeypatch):
+    _, raw = _csv_grupos(n=500)
+    usecols = []
+    original = pd.read_csv
+
+    def espia(*args, **kwargs):
+        if kwargs.get("chunksize"):
+            usecols.append(kwargs.get("usecols"))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(dp.pd, "read_csv", espia)
+    dp.detect_group_anomalies_stream(BytesIO(raw), "estructuraalumno", "nota", chunksize=100)
+
+    assert usecols == [["estructuraalumno", "nota"]]
+
+
+def test_anomalias_por_fila_top_k_por_trozos(monkeypatch):
+    """Ajuste sobre muestra acotada, puntaje por trozos y solo las k filas más atípicas."""
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"x": rng.normal(size=5000), "y": rng.normal(size=5000),
+                       "grupo": rng.choice(list("ab"), 5000)})
+    df.loc[[17, 4242], ["x", "y"]] = [[25.0, -25.0], [-30.0, 30.0]]
+    df.loc[rng.random(5000) < 0.05, "x"] = np.nan
+
+    ajustes = []
+    original = dp._isolation_forest
+
+    def isolation_forest(**params):
+        iso = original(**params)
+        fit = iso.fit
+        iso.fit = lambda X, *a, **k: ajustes.append(len(X)) or fit(X, *a, **k)
+        return iso
+    monkeypatch.setattr(dp, "_isolation_forest", isolation_forest)
+    monkeypatch.setattr(dp, "ROW_FIT_SAMPLE", 1000)
+    monkeypatch.setattr(dp, "ROW_SCORE_CHUNK", 700)
+
+    out = dp.detect_row_anomalies(df, frac=0.01)
+
+    assert ajustes == [1000]
+    assert len(out) == 50
+    assert out["_score"].is_monotonic_increasing
+    assert set(out.loc[:1, "x"].abs()) == {25.0, 30.0}
+    assert (out["_is_outlier"] == (out["_score"] < 0).astype(int)).all()
+    assert list(out.columns) == ["x", "y", "grupo", "_score", "_is_outlier"]
+
+
+def test_summary_table_muestra_y_nulos():
+    df = pd.DataFrame({
+        "nota": [np.nan] * 100 + [15.5, 12.0, 18.25, 11.0],
+        "grupo": ["A", None, "B", "A"] * 26,
+        "fecha": pd.date_range("2024-01-01", periods=104, freq="D"),
+    })
+    out = dp.summary_table(df).set_index("columna")
+
+    assert out.loc["nota", "n_miss"] == 100
+    assert out.loc["nota", "muestra_valores"] == "15.5, 12.0, 18.25"
+    assert out.loc["grupo", "n_unique"] == 2
+    assert out.loc["grupo", "muestra_valores"] == "A, B, A"
+    assert out.loc["fecha", "muestra_valores"] == "2024-01-01, 2024-01-02, 2024-01-03"
+
+
+def test_summary_table_distintos_aproximados():
+    """Modo HyperLogLog: error pequeño respecto al conteo exacto."""
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({"id": rng.integers(0, 40_000, 120_000).astype(str),
+                       "grupo": rng.choice(list("abcde"), 120_000)})
+    exacto = dp.summary_table(df, exact=True).set_index("columna")["n_unique"]
+    aprox = dp.summary_table(df, exact=False).set_index("columna")["n_unique"]
+
+    assert aprox["grupo"] == 5
+    assert abs(aprox["id"] - exacto["id"]) / exacto["id"] < 0.03
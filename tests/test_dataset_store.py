@@ -0,0 +1,133 @@
+# test_dataset_store.py
+# Test del registro de datasets en memoria (subir una vez, reutilizar por ID)
+
+from io import BytesIO
+import pandas as pd
+import pytest
+from app import app
+from utils.dataset_store import DatasetStore, dataset_id_for
+
+
+CSV = (
+    "estructuraalumno,semestre,nota\n"
+    "A,2024-1,15\n"
+    "B,2024-1,12\n"
+).encode("utf-8")
+
+
+@pytest.fixture
+def client():
+    """Fixture: cliente de pruebas con sesión iniciada."""
+    app.testing = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["logged_in"] = True
+            sess["username"] = "tester"
+        yield client
+
+
+def test_resubida_identica_no_vuelve_a_parsear():
+    """Mismos bytes -> mismo ID y el parser no se vuelve a llamar."""
+    store = DatasetStore(max_bytes=10 * 1024 * 1024)
+    llamadas = []
+
+    def parse(stream):
+        llamadas.append(1)
+        return pd.read_csv(stream)
+
+    id1, df1 = store.get_or_parse(CSV, parse)
+    id2, df2 = store.get_or_parse(CSV, parse)
+
+    assert id1 == id2 == dataset_id_for(CSV)
+    assert df1 is df2
+    assert len(llamadas) == 1
+
+
+def test_expulsion_por_tamano():
+    """Al superar el presupuesto de bytes se expulsa el dataset menos reciente."""
+    df = pd.DataFrame({"x": range(1000)})
+    nbytes = int(df.memory_usage(deep=True).sum())
+    store = DatasetStore(max_bytes=int(nbytes * 2.5))
+
+    store.put("a", df)
+    store.put("b", df.copy())
+    store.get("a")              # 'a' pasa a ser el más reciente
+    store.put("c", df.copy())
+
+    assert "a" in store and "c" in store
+    assert "b" not in store
+    assert store.total_bytes <= store.max_bytes
+
+
+def test_upload_y_analyze_por_dataset_id(client):
+    """/upload devuelve un dataset_id reutilizable en /analyze sin reenviar el archivo."""
+    resp = client.post("/upload", data={"file": (BytesIO(CSV), "datos.csv")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 200
+    dataset_id = resp.get_json()["dataset_id"]
+    assert dataset_id == dataset_id_for(CSV)
+
+    resp = client.post("/analyze", data={"dataset_id": dataset_id, "metric_choice": "nota"},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 200
+    payload = resp.get_json()
+    assert payload["dataset_id"] == dataset_id
+    assert len(payload["head"]) == 2
+
+
+def test_dataset_id_desconocido_sin_archivo(client):
+    """Un ID que ya no está en el servidor y sin archivo devuelve 410 (el cliente reenvía el archivo)."""
+    resp = client.post("/analyze", data={"dataset_id": "no-existe"},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 410
+    assert "error" in resp.get_json()
+    assert "X-Dataset-Id" not in resp.headers
+
+
+def test_reintento_con_archivo_renueva_el_dataset_id(client):
+    """El reintento con el archivo responde con el ID vigente en la cabecera X-Dataset-Id."""
+    resp = client.post("/analyze", data={"file": (BytesIO(CSV), "datos.csv"), "metric_choice": "nota"},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 200
+    assert resp.headers["X-Dataset-Id"] == dataset_id_for(CSV)
+
+
+def test_analyze_no_copia_ni_muta_el_dataset_registrado(client, monkeypatch):
+    """/analyze trabaja sobre el DataFrame del registro sin copiarlo (solo .assign)."""
+    resp = client.post("/upload", data={"file": (BytesIO(CSV), "datos.csv")},
+                       content_type="multipart/form-data")
+    dataset_id = resp.get_json()["dataset_id"]
+    from app import DATASET_STORE
+    df = DATASET_STORE.get(dataset_id)
+    original = df.copy()
+    copias = []
+    real_copy = pd.DataFrame.copy
+    monkeypatch.setattr(pd.DataFrame, "copy",
+                        lambda self, *a, **k: copias.append(self is df) or real_copy(self, *a, **k))
+
+    resp = client.post("/analyze", data={"dataset_id": dataset_id, "metric_choice": "nota"},
+                       content_type="multipart/form-data")
+
+    assert resp.status_code == 200
+    assert not any(copias)
+    pd.testing.assert_frame_equal(df, original)
+
+
+def test_secuencia_no_copia_ni_muta_el_dataset_registrado(tmp_path, monkeypatch):
+    """El DataFrame del registro se usa tal cual (sin copia) y queda intacto."""
+    import utils.narrative as narrative
+    import utils.render_engine as render_engine
+    from utils.render_cache import RenderCache
+    cache = RenderCache(directory=str(tmp_path))
+    monkeypatch.setattr(narrative, "RENDER_CACHE", cache)
+    monkeypatch.setattr(render_engine, "RENDER_CACHE", cache)
+    df = pd.DataFrame({"grupo": ["A", "A", "B"], "semestre": [1, 2, 1],
+                       "cursosaprobados": [3, 4, 2], "cursosmatriculados": [4, 4, 4]})
+    original = df.copy()
+
+    assert narrative._load_df(df) is df
+    narrative.generate_native_sequence_6steps(
+        df, "light", "grupo", "__tasa__", "grupo", "semestre", "semestre", "__tasa__",
+        3, False, "T", "", False, dataset_id="ds-sin-copia")
+
+    pd.testing.assert_frame_equal(df, original)
@@ -0,0 +1,80 @@
+# test_density.py
+# Test de la densidad por histograma (KDE por FFT, ECDF y cuantiles) usada en Montaña y Violín
+
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import gaussian_kde
+from utils.charts import chart_montana, chart_violin, montana_density, violin_data
+from utils.density import density_estimate
+
+
+@pytest.mark.parametrize("forma", ["normal", "bimodal", "sesgada"])
+def test_kde_y_cuantiles_coinciden_con_la_referencia(forma):
+    rng = np.random.default_rng(0)
+    valores = {
+        "normal": rng.normal(14, 3, 20000),
+        "bimodal": np.r_[rng.normal(0, 1, 12000), rng.normal(6, 0.5, 8000)],
+        "sesgada": rng.beta(2, 5, 20000),
+    }[forma]
+
+    dens = density_estimate(valores)
+    ref = gaussian_kde(valores)(dens.centers)
+    rango = valores.max() - valores.min()
+
+    assert np.abs(dens.density() - ref).max() / ref.max() < 0.01
+    assert abs(dens.median() - np.median(valores)) < rango / 1000
+    assert abs(dens.quantile(0.9) - np.percentile(valores, 90)) < rango / 1000
+    assert dens.cdf[-1] == pytest.approx(1.0)
+
+
+def test_densidad_integra_uno_con_un_atipico_que_estira_el_rango():
+    """Con el ancho de banda por debajo de un bin la curva sigue integrando ~1."""
+    valores = np.r_[np.random.default_rng(3).normal(14, 2, 20000), 1e6]
+    dens = density_estimate(valores, bins=256)
+    dx = dens.edges[1] - dens.edges[0]
+
+    assert dens.bandwidth < dx
+    assert dens.density().sum() * dx == pytest.approx(1.0, abs=0.01)
+
+
+def test_nan_y_valor_unico():
+    assert density_estimate([np.nan, np.nan]) is None
+    assert density_estimate(np.full(50, 3.0)).degenerate
+
+
+def test_montana_usa_la_columna_completa_sin_muestrear():
+    df = pd.DataFrame({"nota": np.random.default_rng(1).normal(14, 2, 200_000)})
+    dens = montana_density(df, "nota")
+
+    assert dens.n == 200_000
+    fig = chart_montana(dens, metric_col="nota", simple=True)
+    assert len(fig.axes) == 2
+
+
+def test_violin_agrupa_en_una_pasada_sobre_todas_las_filas():
+    rng = np.random.default_rng(2)
+    n = 120_000
+    df = pd.DataFrame({
+        "grupo": rng.choice(list("ABCDEF"), n),
+        "nota": rng.normal(14, 2, n),
+    })
+    df.loc[::7, "nota"] = np.nan
+    df.loc[df["grupo"] == "F", "nota"] = 5.0  # grupo sin dispersión
+
+    data = violin_data(df, "grupo", "nota", top_n=4)
+    assert len(data["labels"]) == 4 and "F" not in data["labels"]
+    for g, st in zip(data["labels"], data["stats"]):
+        ref = df.loc[df["grupo"] == g, "nota"].dropna()
+        assert st["median"] == pytest.approx(ref.median())
+        assert st["min"] == ref.min() and st["max"] == ref.max()
+        assert len(st["coords"]) == len(st["vals"]) <= 256
+
+    solo_f = violin_data(df[df["grupo"] == "F"], "grupo", "nota")
+    assert solo_f["std"] == [0.0]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")   # sin "invalid value encountered in divide"
+        chart_violin(solo_f, "grupo", "nota", simple=True)
+    fig = chart_violin(data, "grupo", "nota", simple=True)
+    assert len(fig.axes[0].collections) >= 4
@@ -0,0 +1,126 @@
+# test_jobs.py
+# Test de la cola de trabajos asíncronos y del polling de progreso
+
+import io
+import pytest
+import app as app_module
+from app import app
+from utils.jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), max_workers=2)
+
+
+@pytest.fixture
+def client(queue, monkeypatch):
+    """Fixture: cliente de pruebas con sesión iniciada y cola aislada."""
+    monkeypatch.setattr(app_module, "JOB_QUEUE", queue)
+    app.testing = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["logged_in"] = True
+            sess["username"] = "tester"
+        yield client
+
+
+def test_trabajo_reporta_progreso_y_resultado(queue):
+    def tarea(job, n):
+        job.set_total(n)
+        for i in range(n):
+            job.add_image(f"/output_images/{i}.png", f"Paso {i}", index=i)
+        return {"ok": True}
+
+    job_id = queue.submit("demo", "tester", tarea, 3)
+    job = queue.wait(job_id, timeout=10)
+
+    assert job["status"] == "done"
+    assert job["progress"] == {"done": 3, "total": 3}
+    assert [img["index"] for img in job["images"]] == [0, 1, 2]
+    assert job["result"] == {"ok": True}
+
+
+def test_trabajo_con_error_queda_marcado(queue):
+    def tarea(job):
+        raise ValueError("fallo controlado")
+
+    job = queue.wait(queue.submit("demo", "tester", tarea), timeout=10)
+    assert job["status"] == "error"
+    assert "fallo controlado" in job["error"]
+
+
+def test_endpoint_secuencia_encola_y_publica_imagenes(client):
+    """POST devuelve job_id al instante; el polling trae las 6 imágenes."""
+    csv = b"estructuraalumno,semestre,nota\nA,2024-1,15\nA,2024-2,16\nB,2024-1,12\n"
+    resp = client.post(
+        "/jobs/generate_sequence",
+        data={"file": (io.BytesIO(csv), "datos.csv"), "group_col": "estructuraalumno",
+              "metric_choice": "nota", "seq_line_y": "nota", "seq_topn": "3"},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 202
+    job_id = resp.get_json()["job_id"]
+
+    app_module.JOB_QUEUE.wait(job_id, timeout=120)
+    job = client.get(f"/jobs/{job_id}").get_json()
+
+    assert job["status"] == "done", job.get("error")
+    assert job["progress"] == {"done": 6, "total": 6}
+    assert len(job["images"]) == 6
+    assert len(job["result"]["images"]) == 6
+    with client.session_transaction() as sess:
+        assert len(sess["renders"]) == 6
+
+
+def test_trabajo_de_otro_usuario_no_es_visible(client):
+    job_id = app_module.JOB_QUEUE.submit("demo", "otro", lambda job: None)
+    assert client.get(f"/jobs/{job_id}").status_code == 404
+
+
+def test_apagado_marca_trabajos_pendientes(tmp_path):
+    """Reciclaje del worker: lo que no terminó queda en error (el polling no se cuelga)."""
+    import threading
+    cola = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), max_workers=1)
+    liberar = threading.Event()
+
+    lento = cola.submit("demo", "tester", lambda job: liberar.wait(10))
+    en_cola = cola.submit("demo", "tester", lambda job: None)
+    cola.shutdown(timeout=0.2)
+    liberar.set()
+
+    assert cola.get(en_cola)["status"] == "error"
+    assert cola.get(lento)["status"] in ("error", "done")
+    assert "reinició" in cola.get(en_cola)["error"]
+
+
+def test_endpoint_con_csv_invalido_responde_json(client, monkeypatch):
+    def falla(_):
+        raise ValueError("CSV ilegible")
+    monkeypatch.setattr(app_module.data_processing, "read_csv_smart", falla)
+    for url in ("/jobs/generate_sequence", "/jobs/generate_story"):
+        resp = client.post(url, data={"file": (io.BytesIO(b"\x00roto"), "roto.csv")},
+                           content_type="multipart/form-data")
+        assert resp.status_code == 500
+        assert "CSV ilegible" in resp.get_json()["error"]
+
+
+def test_progreso_de_graficos_ia_descarta_recomendaciones_invalidas(client):
+    """El total se ajusta a los gráficos válidos: el progreso llega al 100%."""
+    import pandas as pd
+    df = pd.DataFrame({"grupo": list("AABBC"), "semestre": [1, 2, 1, 2, 1], "nota": [15, 16, 12, 11, 14]})
+    app_module.DATASET_STORE.put("ds-progreso", df)
+    recos = [{"chart_type": "Barras", "group_col": "grupo", "metric_col": "nota"},
+             {"chart_type": "Radar", "group_col": "grupo", "metric_col": "nota"},
+             {"chart_type": "Barras", "group_col": "no_existe", "metric_col": "nota"}]
+    with client.session_transaction() as sess:
+        sess["dataset_id"] = "ds-progreso"
+        sess["last_analysis"] = {"group_col": "grupo", "metric_choice": "nota", "top_n": 8, "theme": "light",
+                                 "simple_mode": False, "line_x": "semestre", "line_y": "nota",
+                                 "ai_chart_recos": recos}
+
+    job_id = client.post("/jobs/generate_ai_charts").get_json()["job_id"]
+    job = app_module.JOB_QUEUE.wait(job_id, timeout=60)
+
+    assert job["status"] == "done", job["error"]
+    assert job["progress"] == {"done": 1, "total": 1}
@@ -0,0 +1,87 @@
+# test_output_store.py
+# Test de las carpetas de imágenes por usuario y del barrido de retención
+
+import os
+import time
+import pytest
+import app as app_module
+from utils.output_store import OutputStore, MANIFEST_NAME
+from utils.render_cache import RenderCache, render_key
+
+
+def _png(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG" + b"0" * (size - 4))
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    renders = tmp_path / "renders"
+    renders.mkdir()
+    return OutputStore(root=str(tmp_path / "users"), max_age=3600, user_max_bytes=250,
+                       total_max_bytes=400, render_cache=RenderCache(directory=str(renders)))
+
+
+def test_publicar_enlaza_en_la_carpeta_del_usuario(store, tmp_path):
+    origen = _png(tmp_path / "renders" / "barras_abc.png", 100)
+
+    nombre = store.publish("ana", origen)
+
+    assert nombre == "barras_abc.png"
+    assert os.path.samefile(store.resolve("ana", nombre), origen)
+    assert store.files("ana")[nombre]["bytes"] == 100
+    assert os.path.exists(os.path.join(store.user_dir("ana"), MANIFEST_NAME))
+    # Otro usuario (o una ruta relativa) no resuelve la imagen
+    assert store.resolve("luis", nombre) is None
+    assert store.resolve("ana", f"../{os.path.basename(store.user_dir('ana'))}/{nombre}") is None
+    # La copia publicada sobrevive a la expulsión del caché de render
+    os.remove(origen)
+    assert store.paths("ana", [nombre, "no_existe.png"]) == [store.resolve("ana", nombre)]
+
+
+def test_barrido_aplica_edad_y_cuotas(store, tmp_path):
+    ahora = time.time()
+    for usuario, nombres in {"ana": ["a1", "a2", "a3"], "luis": ["l1", "l2"]}.items():
+        for nombre in nombres:
+            store.publish(usuario, _png(tmp_path / "renders" / f"{nombre}.png", 100))
+    clave = render_key(prueba="viejo")
+    viejo = _png(store.render_cache.path_for("barras", clave), 100)
+    store.render_cache.add(clave, viejo)
+    os.utime(viejo, (ahora - 7200, ahora - 7200))
+    # a1 caducó; ana (300 B) supera su cuota de 250 B
+    manifest = store._read_manifest(store.user_dir("ana"))
+    manifest["files"]["a1.png"]["created_at"] = ahora - 7200
+    store._write_manifest(store.user_dir("ana"), manifest)
+
+    stats = store.sweep(now=ahora)
+
+    assert sorted(store.files("ana")) == ["a2.png", "a3.png"]
+    assert sorted(store.files("luis")) == ["l1.png", "l2.png"]
+    assert not os.path.exists(viejo)
+    # El caché de render expulsa por su índice: bytes y entradas al día
+    assert store.render_cache.get(clave) is None
+    cache_stats = store.render_cache.stats()
+    assert cache_stats["bytes"] == 0 and cache_stats["entries"] == 0 and cache_stats["evictions"] == 1
+    assert stats["bytes"] == 400
+
+    # Cuota total: se retira lo más antiguo de todos los usuarios
+    store.total_max_bytes = 250
+    store.sweep(now=ahora + 1)
+    assert len(store.files("ana")) + len(store.files("luis")) == 2
+
+
+def test_output_images_solo_sirve_la_carpeta_propia(tmp_path, monkeypatch):
+    store = OutputStore(root=str(tmp_path / "users"), render_cache=None)
+    monkeypatch.setattr(app_module, "OUTPUT_STORE", store)
+    store.publish("otro", _png(tmp_path / "ajeno.png", 50))
+    store.publish("tester", _png(tmp_path / "propio.png", 50))
+
+    app_module.app.testing = True
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["logged_in"] = True
+            sess["username"] = "tester"
+        assert client.get("/output_images/propio.png").status_code == 200
+        assert client.get("/output_images/ajeno.png").status_code == 404
+        assert client.get("/output_images/..%2Fusers.json").status_code == 404
@@ -0,0 +1,52 @@
+# test_passwords.py
+# Test del hash de contraseñas (KDF con sal, hashes antiguos y calibración del coste)
+
+import hashlib
+import pytest
+import app as app_module
+from app import app
+from utils.passwords import (
+    Pbkdf2Hasher, ScryptHasher, calibrate, hash_password, needs_rehash, verify_password,
+)
+from utils.user_store import UserStore
+
+RAPIDO = ScryptHasher(n=2 ** 10)
+
+
+@pytest.mark.parametrize("hasher", [RAPIDO, Pbkdf2Hasher(iterations=1000)])
+def test_hash_con_sal_y_verificacion(hasher):
+    h1, h2 = hash_password("clave123", hasher), hash_password("clave123", hasher)
+
+    assert h1 != h2  # sal aleatoria
+    assert h1.startswith(hasher.algorithm + "$")
+    assert verify_password("clave123", h1) and verify_password("clave123", h2)
+    assert not verify_password("clave124", h1)
+    assert not needs_rehash(h1, hasher)
+    assert needs_rehash(h1, ScryptHasher(n=2 ** 11))
+
+
+def test_hash_antiguo_y_usuario_inexistente():
+    legacy = hashlib.sha256(b"password123").hexdigest()
+    assert verify_password("password123", legacy) and needs_rehash(legacy)
+    assert not verify_password("otra", legacy)
+    assert not verify_password("password123", None)
+    assert not verify_password("x", "scrypt$roto")
+
+
+def test_login_rehashea_hash_antiguo(tmp_path, monkeypatch):
+    store = UserStore(db_path=str(tmp_path / "users.sqlite3"), legacy_json=None)
+    store.create("eva", hashlib.sha256(b"secreto1").hexdigest())
+    monkeypatch.setattr(app_module, "USER_STORE", store)
+
+    app.testing = True
+    with app.test_client() as client:
+        assert client.post("/login", data={"username": "eva", "password": "secreto1"}).status_code == 302
+
+    nuevo = store.get("eva")["password_hash"]
+    assert nuevo.startswith("scrypt$") and not needs_rehash(nuevo)
+    assert verify_password("secreto1", nuevo)
+
+
+def test_calibracion_respeta_el_objetivo():
+    hasher, ms = calibrate("pbkdf2_sha256", target_ms=20, rounds=1)
+    assert hasher.iterations >= 10_000 and ms < 200
@@ -1,7 +1,10 @@
 # test_performance.py
-# Test de rendimiento simple (carga media) para generate_templates_from_csv
+# Test de rendimiento simple (carga media) para generate_templates_from_csv y los gráficos
 
+import numpy as np
 import pandas as pd
+import matplotlib.pyplot as plt
+from utils.charts import chart_bar, chart_heatmap, _plot_image, FIGURE_LAYOUTS
 from utils.narrative import generate_templates_from_csv
 
 
@@ -39,3 +42,37 @@ def test_performance_templates_dataset_medio(tmp_path):
 
     # No medimos tiempo exacto, pero verificamos que NO falle y genere al menos una imagen
     assert len(saved_paths) >= 1
+
+
+def test_heatmap_grande_etiqueta_celdas_en_un_solo_artist():
+    """29×29 celdas: un Artist para todas las etiquetas, no un Text por celda."""
+    rng = np.random.default_rng(0)
+    n = 50_000
+    df = pd.DataFrame({
+        "fila": rng.integers(0, 29, n).astype(str),
+        "col": rng.integers(0, 29, n).astype(str),
+        "nota": rng.normal(14, 3, n),
+    })
+
+    fig = chart_heatmap(df, "fila", "col", "nota")
+    ax = fig.axes[0]
+    etiquetas = [a for a in ax.artists if type(a).__name__ == "_CellLabels"]
+
+    assert len(etiquetas) == 1 and len(etiquetas[0]._labels) == 29 * 29
+    assert len(ax.texts) == 0
+    assert 0 < etiquetas[0]._dark.sum() < 29 * 29  # umbral = media de la matriz
+    assert _plot_image(fig).size == (1440, 640)
+
+
+def test_graficos_usan_maquetacion_fija_fuera_de_pyplot():
+    """Márgenes fijos por tipo de gráfico (sin tight_layout) y ninguna figura en el registro de pyplot."""
+    antes = plt.get_fignums()
+    serie = pd.Series([3.0, 2.0, 1.0], index=["A", "B", "C"])
+
+    fig = chart_bar(serie, theme="midnight", ylabel="nota")
+    margenes = FIGURE_LAYOUTS["bar"][1]
+
+    assert plt.get_fignums() == antes
+    assert fig.subplotpars.left == margenes["left"]
+    assert fig.subplotpars.bottom == margenes["bottom"]
+    assert _plot_image(fig).size == (1440, 640)
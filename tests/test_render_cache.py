@@ -0,0 +1,171 @@
+# test_render_cache.py
+# Test del caché de infografías direccionado por contenido
+
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+import utils.narrative as narrative
+import utils.render_engine as render_engine
+from utils.render_cache import RenderCache, render_key
+from utils.narrative import generate_native_sequence_6steps
+
+
+def _png(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return str(path)
+
+
+def test_clave_depende_de_los_parametros():
+    base = dict(dataset="abc", chart="bar", theme="light", top_n=8, title="T")
+    assert render_key(**base) == render_key(**dict(base))
+    assert render_key(**base) != render_key(**dict(base, theme="midnight"))
+    assert render_key(**base) != render_key(**dict(base, top_n=5))
+
+
+def test_acierto_fallo_y_expulsion_lru(tmp_path):
+    """Expulsa el PNG menos usado cuando se supera el tope de bytes."""
+    cache = RenderCache(directory=str(tmp_path), max_bytes=250)
+    keys = [render_key(i=i) for i in range(3)]
+
+    assert cache.get(keys[0]) is None
+    cache.add(keys[0], _png(cache.path_for("a", keys[0]), 100))
+    cache.add(keys[1], _png(cache.path_for("b", keys[1]), 100))
+    assert cache.get(keys[0])                     # 'a' pasa a ser el más reciente
+    cache.add(keys[2], _png(cache.path_for("c", keys[2]), 100))
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["evictions"] == 1
+    assert stats["bytes"] <= 250
+    assert not os.path.exists(cache.path_for("b", keys[1]))
+    assert cache.get(keys[0]) and cache.get(keys[2])
+
+
+def test_expulsion_cuenta_los_png_de_otro_proceso(tmp_path):
+    """El tope se aplica al directorio compartido, no al índice de cada worker."""
+    cache = RenderCache(directory=str(tmp_path), max_bytes=250, rescan_seconds=0)
+    propia = render_key(proceso="este")
+    cache.add(propia, _png(cache.path_for("a", propia), 100))
+    ajena = render_key(proceso="otro")
+    # Otro worker escribe un PNG (más antiguo) que este índice no conoce
+    codigo = (
+        "import os, sys\n"
+        "path = os.path.join(sys.argv[1], f'otro_{sys.argv[2]}.png')\n"
+        "open(path, 'wb').write(b'0' * 100)\n"
+        "os.utime(path, (1000, 1000))\n"
+    )
+    subprocess.run([sys.executable, "-c", codigo, str(tmp_path), ajena], check=True)
+
+    # Este índice suma 200 B, pero en el directorio habría 300 B
+    otra = render_key(proceso="este", i=2)
+    cache.add(otra, _png(cache.path_for("b", otra), 100))
+
+    en_disco = sum(e.stat().st_size for e in os.scandir(tmp_path))
+    assert en_disco == cache.stats()["bytes"] == 200
+    assert not os.path.exists(cache.path_for("otro", ajena))
+    assert cache.get(propia) and cache.get(otra)
+
+    # Otro worker expulsa un PNG que este índice aún tiene: cuenta como fallo
+    subprocess.run([sys.executable, "-c", "import os, sys; os.remove(sys.argv[1])",
+                    cache.path_for("a", propia)], check=True)
+    assert cache.get(propia) is None
+    assert cache.stats()["bytes"] == 100
+
+
+def test_indice_se_reconstruye_desde_disco(tmp_path):
+    key = render_key(x=1)
+    _png(tmp_path / f"seq_01_barras_{key}.png", 10)
+
+    assert RenderCache(directory=str(tmp_path)).get(key).endswith(f"_{key}.png")
+
+
+def test_secuencia_repetida_no_vuelve_a_renderizar(tmp_path, monkeypatch):
+    """Con dataset_id, la segunda secuencia idéntica sale entera del caché."""
+    cache = RenderCache(directory=str(tmp_path))
+    monkeypatch.setattr(render_engine, "RENDER_CACHE", cache)
+    monkeypatch.setattr(narrative, "RENDER_CACHE", cache)
+    monkeypatch.setattr(render_engine, "RENDER_WORKERS", 1)
+    renders = []
+    original = render_engine.render_spec
+    monkeypatch.setattr(render_engine, "render_spec", lambda spec: renders.append(1) or original(spec))
+
+    df = pd.DataFrame({"grupo": ["A", "A", "B"], "semestre": [1, 2, 1], "nota": [15, 16, 12]})
+    args = dict(theme="light", group_col="grupo", metric_col="nota", heatmap_row="grupo",
+                heatmap_col="semestre", line_x="semestre", line_y="nota", top_n=3,
+                normalize=False, title="Prueba caché", subtitle="", simple_mode=False,
+                dataset_id="abc123")
+
+    _, _, paths1, _ = generate_native_sequence_6steps(df, **args)
+    _, _, paths2, _ = generate_native_sequence_6steps(df, **args)
+
+    assert len(renders) == 6
+    assert paths1 == paths2
+    assert cache.stats()["hits"] == 6
+
+
+def test_prerender_especulativo_se_reutiliza(tmp_path, monkeypatch):
+    """Los gráficos por defecto pre-renderizados mientras la IA piensa se reutilizan
+    aunque la recomendación traiga otro subtítulo (solo se recompone la infografía)."""
+    import app as app_module
+    import utils.charts as charts
+    from utils.jobs import JobQueue
+
+    cache = RenderCache(directory=str(tmp_path))
+    monkeypatch.setattr(render_engine, "RENDER_CACHE", cache)
+    monkeypatch.setattr(narrative, "RENDER_CACHE", cache)
+    monkeypatch.setattr(render_engine, "RENDER_WORKERS", 1)
+    monkeypatch.setattr(app_module, "JOB_QUEUE", JobQueue(db_path=str(tmp_path / "jobs.sqlite3")))
+    dibujos = []
+    for nombre in ("chart_bar", "chart_line"):
+        original = getattr(charts, nombre)
+        monkeypatch.setattr(charts, nombre, lambda *a, _f=original, _n=nombre, **k: dibujos.append(_n) or _f(*a, **k))
+
+    df = pd.DataFrame({"grupo": list("AABBC"), "semestre": [1, 2, 1, 2, 1], "nota": [15, 16, 12, 11, 14]})
+    analysis = {"group_col": "grupo", "metric_choice": "nota", "top_n": 8, "theme": "light",
+                "simple_mode": False, "line_x": "semestre", "line_y": "nota", "ai_chart_recos": []}
+
+    job_id = app_module.prerender_default_charts(df, "ds-especulativo", analysis)
+    # La IA recomienda barras sobre las columnas por defecto con su propio texto
+    recos = [{"chart_type": "Barras", "group_col": "grupo", "metric_col": "nota", "caption": "Grupo B rezagado"}]
+    result = app_module.run_ai_charts(df, "ds-especulativo", dict(analysis, ai_chart_recos=recos), "tester")
+
+    assert app_module.JOB_QUEUE.wait(job_id, timeout=60)["status"] == "done"
+    assert sorted(dibujos) == ["chart_bar", "chart_line"]   # las barras se dibujaron una sola vez
+    assert len(result["renders"]) == 1
+    assert os.path.exists(os.path.join(str(tmp_path), result["renders"][0]))
+
+
+def test_peticiones_simultaneas_renderizan_una_sola_vez(tmp_path, monkeypatch):
+    """Dos render_all de la misma spec a la vez: uno renderiza y el otro espera y reutiliza."""
+    import threading
+    import time
+
+    cache = RenderCache(directory=str(tmp_path))
+    monkeypatch.setattr(render_engine, "RENDER_CACHE", cache)
+    monkeypatch.setattr(render_engine, "RENDER_WORKERS", 1)
+    renders = []
+
+    def render_lento(spec):
+        renders.append(spec["cache_key"])
+        time.sleep(0.2)
+        return _png(spec["out_path"], 10)
+    monkeypatch.setattr(render_engine, "render_spec", render_lento)
+
+    key = render_key(prueba="concurrente")
+    spec = {"cache_key": key, "out_path": cache.path_for("barras", key)}
+    barrera = threading.Barrier(2)
+    paths = []
+
+    def peticion():
+        barrera.wait()
+        paths.extend(render_engine.render_all([dict(spec)]))
+    hilos = [threading.Thread(target=peticion) for _ in range(2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert renders == [key]
+    assert paths == [spec["out_path"]] * 2
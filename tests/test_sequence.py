@@ -70,3 +70,26 @@ def test_generate_sequence_error_tasa(tmp_path):
 
     assert saved_paths == []
     assert "No se pudo calcular __tasa__" in log
+
+
+def test_render_all_en_paralelo_respeta_orden(tmp_path, monkeypatch):
+    """Test funcional: el pool de procesos devuelve las rutas en el orden de las specs."""
+    import pandas as pd
+    import utils.render_engine as render_engine
+
+    monkeypatch.setattr(render_engine, "RENDER_WORKERS", 2)
+    data = pd.DataFrame({"nota": [1, 2, 3]})
+    specs = [
+        {
+            "chart": "montana", "args": (data,), "kwargs": {"metric_col": "nota"},
+            "title": "T", "subtitle": f"Paso {i}", "footer": "F", "theme": "light",
+            "out_path": str(tmp_path / f"paso_{i}.png"),
+        }
+        for i in range(3)
+    ]
+
+    paths = render_engine.render_all(specs)
+
+    assert paths == [s["out_path"] for s in specs]
+    for p in paths:
+        assert os.path.exists(p)
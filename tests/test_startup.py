@@ -0,0 +1,35 @@
+# test_startup.py
+# Test del arranque en frío: importaciones perezosas y presupuesto de import
+
+import json
+import subprocess
+import sys
+from utils.import_profile import ROOT, check, import_times, main
+
+LOGIN_SCRIPT = """
+import json, sys
+from app import app
+client = app.test_client()
+status = [client.get("/login").status_code, client.get("/logout").status_code]
+print(json.dumps({"status": status, "loaded": sorted(m for m in
+      ("pandas", "matplotlib", "sklearn", "google.generativeai") if m in sys.modules)}))
+"""
+
+
+def test_login_responde_sin_cargar_el_stack_cientifico():
+    out = subprocess.run([sys.executable, "-c", LOGIN_SCRIPT], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+
+    assert result["status"] == [200, 302]
+    assert result["loaded"] == []
+
+
+def test_informe_de_import_y_presupuesto():
+    rows = import_times("app")
+    assert any(name == "app" for name, _, _ in rows)
+
+    total, problems = check(rows, "app", budget_ms=1e9)
+    assert total > 0 and problems == []
+    assert check(rows, "app", budget_ms=0)[1]  # presupuesto imposible -> falla
+    assert main(["app", "--budget-ms", "1e9", "--top", "3"]) == 0
@@ -0,0 +1,109 @@
+# test_story_stream.py
+# Test de la historia IA por Server-Sent Events (modelo falso, sin red)
+
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import app as app_module
+import utils.narrative as narrative
+from app import app
+from utils.ai_cache import AIResponseCache
+from utils.jobs import JobQueue
+from utils.narrative import ChartsRecoStreamParser
+
+RESPUESTA = [
+    "### 🧠 Resumen Ejecutivo\nEl grupo ", "B destaca.\n```charts", "_reco\n[{\"chart_type\": \"Barras\", ",
+    "\"caption\": \"Top\"}]\n``", "`\n### 💡 Próximos Pasos\nRevisar B.",
+]
+
+
+class StreamingModel:
+    model_name = "fake-stream"
+
+    def generate_content(self, prompt, stream=False):
+        class Chunk:
+            def __init__(self, text):
+                self.text = text
+        return (Chunk(t) for t in RESPUESTA)
+
+
+@pytest.mark.parametrize("paso", [1, 4, 1000])
+def test_parser_separa_historia_y_bloque_charts(paso):
+    texto = "".join(RESPUESTA)
+    parser = ChartsRecoStreamParser()
+    eventos = []
+    for i in range(0, len(texto), paso):
+        eventos += parser.feed(texto[i:i + paso])
+    eventos += parser.close()
+
+    historia = "".join(t for tipo, t in eventos if tipo == "story")
+    charts = [t for tipo, t in eventos if tipo == "charts"]
+    assert charts == [[{"chart_type": "Barras", "caption": "Top"}]]
+    assert "charts_reco" not in historia and "```" not in historia
+    assert historia.startswith("### 🧠 Resumen Ejecutivo") and historia.endswith("Revisar B.")
+    # El bloque se entrega antes que el resto de la historia
+    assert [tipo for tipo, _ in eventos].index("charts") < len(eventos) - 1
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(narrative, "AI_CACHE", AIResponseCache(db_path=str(tmp_path / "ai.sqlite3")))
+    monkeypatch.setattr(app_module, "JOB_QUEUE", JobQueue(db_path=str(tmp_path / "jobs.sqlite3")))
+    narrative.set_ai_model(StreamingModel())
+    app.testing = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["logged_in"] = True
+            sess["username"] = "tester"
+        yield client
+    narrative.set_ai_model(None)
+
+
+def _eventos(body):
+    out = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_stream_emite_historia_y_encola_graficos(client):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"estructuraalumno": rng.choice(list("ABC"), 300),
+                       "semestre": rng.choice(["2023", "2024"], 300),
+                       "cursosaprobados": rng.integers(0, 8, 300), "cursosmatriculados": 8})
+    resp = client.post("/generate_story/stream",
+                       data={"file": (io.BytesIO(df.to_csv(index=False).encode()), "d.csv")},
+                       content_type="multipart/form-data", buffered=False)
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+
+    eventos = _eventos(resp.get_data(as_text=True))
+    tipos = [tipo for tipo, _ in eventos]
+    assert tipos[0] == "story" and tipos[-1] == "done"
+    assert tipos.count("charts") == 1 and tipos.index("charts") < tipos.index("done") - 1
+
+    charts = dict(eventos)["charts"]
+    assert charts["recos"] == [{"chart_type": "Barras", "caption": "Top"}]
+    job = app_module.JOB_QUEUE.wait(charts["job_id"], timeout=60)
+    assert job["status"] == "done", job["error"]
+    assert [img["caption"] for img in job["images"]] == ["Top"]
+
+    historia = dict(eventos)["done"]["story"]
+    assert "charts_reco" not in historia and historia.endswith("Revisar B.")
+    with client.session_transaction() as sess:
+        assert sess["last_analysis"]["metric_choice"] == "__tasa__"
+
+
+def test_stream_con_csv_invalido_responde_json(client, monkeypatch):
+    """Un CSV que no se puede leer devuelve el error en JSON (el frontend hace response.json())."""
+    def falla(_):
+        raise ValueError("CSV ilegible")
+    monkeypatch.setattr(app_module.data_processing, "read_csv_smart", falla)
+    resp = client.post("/generate_story/stream",
+                       data={"file": (io.BytesIO(b"\x00\x01roto"), "roto.csv")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 500
+    assert "CSV ilegible" in resp.get_json()["error"]
@@ -0,0 +1,72 @@
+# test_user_store.py
+# Test del registro de usuarios en SQLite (migración, altas atómicas y login)
+
+import hashlib
+import json
+import threading
+import pytest
+import app as app_module
+from app import app
+from utils.passwords import verify_password
+from utils.user_store import UserStore
+
+
+def _hash(pw):
+    return hashlib.sha256(pw.encode()).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UserStore(db_path=str(tmp_path / "users.sqlite3"), legacy_json=str(tmp_path / "users.json"))
+
+
+def test_base_nueva_siembra_usuario_por_defecto(store):
+    assert verify_password("password123", store.get("admin")["password_hash"])
+    assert store.get("nadie") is None
+
+
+def test_migra_users_json_una_sola_vez(tmp_path):
+    legacy = tmp_path / "users.json"
+    legacy.write_text(json.dumps({
+        "ana": {"password_hash": _hash("secreto1"), "created_at": 1.0},
+        "admin": {"password_hash": _hash("otra"), "created_at": 2.0},
+    }))
+    store = UserStore(db_path=str(tmp_path / "users.sqlite3"), legacy_json=str(legacy))
+
+    assert store.get("ana") == {"password_hash": _hash("secreto1"), "created_at": 1.0}
+    assert store.count() == 2
+
+    # La migración no se repite ni se reescribe el JSON
+    legacy.write_text(json.dumps({"intruso": {"password_hash": "x"}}))
+    otra = UserStore(db_path=str(tmp_path / "users.sqlite3"), legacy_json=str(legacy))
+    assert otra.get("intruso") is None and otra.count() == 2
+
+
+def test_altas_concurrentes_no_pierden_escrituras(store):
+    resultados = []
+
+    def alta(i):
+        resultados.append(store.create(f"user{i % 20}", _hash(str(i))))
+
+    hilos = [threading.Thread(target=alta, args=(i,)) for i in range(60)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert sum(resultados) == 20  # un alta exitosa por nombre
+    assert store.count() == 21    # + admin
+
+
+def test_registro_y_login_usan_el_registro(store, monkeypatch):
+    monkeypatch.setattr(app_module, "USER_STORE", store)
+    app.testing = True
+    with app.test_client() as client:
+        resp = client.post("/register", data={"username": "luis", "password": "clave123"})
+        assert resp.get_json()["success"] is True
+        assert client.post("/register", data={"username": "luis", "password": "clave123"}).status_code == 400
+
+        client.get("/logout")
+        assert client.post("/login", data={"username": "luis", "password": "mala"}).status_code == 200
+        resp = client.post("/login", data={"username": "luis", "password": "clave123"})
+        assert resp.status_code == 302 and resp.headers["Location"].endswith("/")
@@ -0,0 +1,24 @@
+# test_warmup.py
+# Test del precalentamiento y la configuración del servidor de producción
+
+import os
+import runpy
+from config import OUTPUT_DIR
+from utils.warmup import warm_worker
+
+
+def test_precalentamiento_hace_un_render_en_memoria():
+    """El render descartable no deja archivos en la carpeta de salida."""
+    antes = set(os.listdir(OUTPUT_DIR))
+    timings = warm_worker(render_pool=False)
+
+    assert set(timings) == {"imports", "render"}
+    assert set(os.listdir(OUTPUT_DIR)) == antes
+
+
+def test_configuracion_gunicorn():
+    conf = runpy.run_path("gunicorn.conf.py")
+    assert conf["worker_class"] == "gthread"
+    assert conf["workers"] >= 1 and conf["threads"] >= 1
+    assert conf["max_requests"] > 0 and conf["max_requests_jitter"] > 0
+    assert callable(conf["post_worker_init"]) and callable(conf["worker_exit"])
@@ -0,0 +1,67 @@
+# test_zip_stream.py
+# Test de la descarga ZIP en streaming
+
+import io
+import os
+import zipfile
+import pytest
+import app as app_module
+from app import app
+from config import OUTPUT_DIR
+from utils.zip_stream import iter_zip
+
+
+@pytest.fixture
+def client():
+    """Fixture: cliente de pruebas con sesión iniciada."""
+    app.testing = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["logged_in"] = True
+            sess["username"] = "tester"
+        yield client
+
+
+def test_iter_zip_genera_zip_valido_sin_comprimir(tmp_path):
+    """El ZIP emitido por trozos es válido y sus entradas van 'stored'."""
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"img_{i}.png"
+        p.write_bytes(os.urandom(150_000))
+        paths.append(str(p))
+
+    chunks = list(iter_zip(paths, chunk_size=32 * 1024))
+    zf = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+    assert len(chunks) > 3
+    assert zf.namelist() == ["img_0.png", "img_1.png", "img_2.png"]
+    assert all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+    assert zf.read("img_1.png") == open(paths[1], "rb").read()
+
+
+def test_descarga_solo_incluye_renders_de_la_sesion(client):
+    """/download_zip no incluye archivos ajenos a la sesión (users.json, otros PNG)."""
+    nombre = "test_zip_sesion.png"
+    suelto = "test_zip_suelto.png"
+    carpeta = app_module.OUTPUT_STORE.user_dir("tester")
+    os.makedirs(carpeta, exist_ok=True)
+    rutas = [os.path.join(carpeta, nombre), os.path.join(OUTPUT_DIR, suelto)]
+    for ruta in rutas:
+        with open(ruta, "wb") as f:
+            f.write(b"png")
+    try:
+        with client.session_transaction() as sess:
+            sess["renders"] = [nombre, suelto, "no_existe.png", "../users.json"]
+
+        resp = client.get("/download_zip")
+
+        assert resp.status_code == 200
+        assert resp.mimetype == "application/zip"
+        assert zipfile.ZipFile(io.BytesIO(resp.data)).namelist() == [nombre]
+    finally:
+        for ruta in rutas:
+            os.remove(ruta)
+
+
+def test_descarga_sin_renders(client):
+    assert client.get("/download_zip").status_code == 404
@@ -0,0 +1,67 @@
+import threading
+import weakref
+
+import pandas as pd
+
+from .column_types import get_column_types
+from .frame_cache import frame_memo
+
+# ============================================================
+# CUBO DE AGREGACIÓN COMPARTIDO (por dataset y métrica)
+# ============================================================
+# Todos los gráficos y la detección de anomalías por grupo leen de aquí:
+# la métrica se convierte a numérica UNA vez y cada combinación de claves
+# se agrupa UNA vez (count, sum, mean, sumsq, median).
+# El cubo se asocia a la identidad del DataFrame (ver utils/frame_cache) y las
+# conversiones a número salen de la inferencia de tipos compartida.
+
+STATS = ["count", "sum", "mean", "sumsq", "median"]
+
+
+class AggregationCube:
+    def __init__(self, df, metric_col):
+        self._df_ref = weakref.ref(df)
+        self.metric_col = metric_col
+        self.values = get_column_types(df).numeric(metric_col)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def stats(self, keys, numeric_keys=False):
+        """
+        Agregados de la métrica por `keys` (columna o lista de columnas).
+        Filas con clave o métrica nula se descartan (como .dropna()).
+        numeric_keys=True convierte también las claves a numéricas (eje X de líneas).
+        Devuelve un DataFrame indexado por las claves con las columnas STATS.
+        """
+        keys = tuple(keys) if isinstance(keys, (list, tuple)) else (keys,)
+        memo = (keys, bool(numeric_keys))
+        with self._lock:
+            if memo not in self._stats:
+                self._stats[memo] = self._compute(keys, numeric_keys)
+            return self._stats[memo]
+
+    def _compute(self, keys, numeric_keys):
+        df = self._df_ref()
+        if df is None:
+            raise RuntimeError("El DataFrame del cubo de agregación ya no existe.")
+        # Nombres posicionales: una clave puede llamarse igual que la métrica
+        types = get_column_types(df)
+        cols = {f"__k{i}__": (types.numeric(k) if numeric_keys else df[k])
+                for i, k in enumerate(keys)}
+        frame = pd.DataFrame(cols).assign(__v__=self.values).dropna()
+        frame["__v2__"] = frame["__v__"] * frame["__v__"]
+
+        grouped = frame.groupby(list(cols))
+        out = grouped["__v__"].agg(["count", "sum", "mean", "median"])
+        out["sumsq"] = grouped["__v2__"].sum()
+        out.index.names = list(keys)
+        return out[STATS]
+
+    def series(self, keys, stat="mean", numeric_keys=False):
+        """Una estadística como Serie con el nombre de la métrica (groupby(...)[metric].stat())."""
+        return self.stats(keys, numeric_keys=numeric_keys)[stat].rename(self.metric_col)
+
+
+def get_cube(df, metric_col):
+    """Devuelve (o crea) el cubo de agregación de `df` para `metric_col`."""
+    return frame_memo(df, ("cube", metric_col), lambda: AggregationCube(df, metric_col))
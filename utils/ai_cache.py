@@ -0,0 +1,143 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from config import AI_CACHE_PATH, AI_CACHE_TTL_SECONDS
+
+# ============================================================
+# CACHÉ DE RESPUESTAS DE LA IA (+ coalescencia de peticiones)
+# ============================================================
+# - Persistente en SQLite: sobrevive a reinicios y se comparte entre workers.
+# - Clave = sha256(modelo + prompt); caduca a los AI_CACHE_TTL_SECONDS.
+# - Peticiones idénticas simultáneas en el mismo proceso esperan una sola llamada.
+# - Los errores no se guardan.
+
+
+def ai_cache_key(model_id, prompt):
+    return hashlib.sha256(f"{model_id}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class AIResponseCache:
+    def __init__(self, db_path=AI_CACHE_PATH, ttl=AI_CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._inflight = {}  # clave -> Future
+        self._lock = threading.Lock()
+        self._ready = False
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure_db(self):
+        if self._ready:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        self._ready = True
+
+    def get(self, key):
+        """Respuesta guardada y vigente, o None."""
+        self._ensure_db()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, response):
+        self._ensure_db()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, time.time()),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+
+    def get_or_compute(self, key, compute):
+        """
+        Devuelve la respuesta en caché o ejecuta compute() una sola vez aunque
+        lleguen varias peticiones iguales a la vez (las demás esperan su resultado).
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            self.hits += 1
+            return future.result()
+
+        self.misses += 1
+        try:
+            response = compute()
+            self.put(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stream_or_compute(self, key, stream):
+        """
+        Como get_or_compute, pero para respuestas por trozos: stream() es un iterable
+        de textos que se reenvía a medida que llega y se guarda completo al final.
+        Una respuesta en caché (o en vuelo en otra petición) se entrega de una vez.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            yield cached
+            return
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            self.hits += 1
+            yield future.result()
+            return
+
+        self.misses += 1
+        parts = []
+        try:
+            for chunk in stream():
+                parts.append(chunk)
+                yield chunk
+            response = "".join(parts)
+            self.put(key, response)
+            future.set_result(response)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if not future.done():
+                # El cliente cortó el stream antes de terminar: quien espera no se queda colgado
+                future.set_exception(RuntimeError("Respuesta de IA interrumpida."))
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+AI_CACHE = AIResponseCache()
@@ -1,15 +1,20 @@
 import matplotlib
 matplotlib.use("Agg") # Importante para Flask
 import matplotlib.pyplot as plt
-from scipy.stats import gaussian_kde
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.artist import Artist
+from matplotlib.figure import Figure, SubplotParams
+from matplotlib.font_manager import FontProperties
 import pandas as pd
 import numpy as np
-import io
 import copy
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 
 # Importa THEMES y OUTPUT_DIR desde tu config
 from config import THEMES, OUTPUT_DIR
+from .aggregation import get_cube
+from .density import DensityEstimate, density_estimate, violin_stats
 
 # ===== Estilo global grande =====
 plt.rcParams.update({
@@ -22,15 +27,16 @@ plt.rcParams.update({
 })
 
 # --- CONFIGURACIÓN DE FUENTE DE PIL ---
-try:
-    PIL_FONT_TITLE = ImageFont.truetype("Arial.ttf", 60)
-    PIL_FONT_SUBTITLE = ImageFont.truetype("Arial.ttf", 30)
-    PIL_FONT_FOOTER = ImageFont.truetype("Arial.ttf", 22)
-except IOError:
-    # Aviso si no se encuentra la fuente
-    PIL_FONT_TITLE = ImageFont.load_default()
-    PIL_FONT_SUBTITLE = ImageFont.load_default()
-    PIL_FONT_FOOTER = ImageFont.load_default()
+# Se cargan en el primer render (no al importar el módulo)
+PIL_FONT_SIZES = {"title": 60, "subtitle": 30, "footer": 22}
+
+@lru_cache(maxsize=None)
+def _pil_font(role):
+    try:
+        return ImageFont.truetype("Arial.ttf", PIL_FONT_SIZES[role])
+    except IOError:
+        # Fuente por defecto de PIL si no se encuentra Arial
+        return ImageFont.load_default()
 
 # --------------------------------------------------------------------------------------------------
 # HELPERS DE GRAFICACIÓN (La versión simple original)
@@ -39,43 +45,109 @@ except IOError:
 def _to_rgb01(rgb_tuple): return tuple([c/255.0 for c in rgb_tuple])
 def _ensure_num(s): return pd.to_numeric(s, errors="coerce")
 
+# Los agregados salen del cubo compartido (utils/aggregation.py): una sola
+# conversión numérica y un solo groupby por dataset/métrica/claves.
 def _agg_topn(df, group_col, metric_col, top_n=8, normalize=False):
-    g = (df[[group_col, metric_col]]
-         .assign(**{metric_col: _ensure_num(df[metric_col])})
-         .dropna()
-         .groupby(group_col)[metric_col].mean().sort_values(ascending=False))
+    g = get_cube(df, metric_col).series(group_col).sort_values(ascending=False)
     if top_n and top_n > 0: g = g.head(int(top_n))
     if normalize and g.sum() > 0: g = g / g.sum()
     return g
 
+def _agg_line(df, x_col, y_col):
+    return get_cube(df, y_col).series(x_col, numeric_keys=True).reset_index()
+
+def _agg_cells(df, row_col, col_col, metric_col):
+    return get_cube(df, metric_col).series([row_col, col_col])
+
+# Maquetación fija por tipo de gráfico: tamaño y márgenes (fracciones del hueco
+# final de 1440x640) en lugar de fig.tight_layout, que repite una maquetación
+# iterativa en cada render. Cada render crea su propia Figure: no se reutilizan
+# figuras entre renders (vaciar ejes con cla() cuesta más que crearlos).
+FIGURE_LAYOUTS = {
+    "bar":     ((10, 6), dict(left=0.08, right=0.98, bottom=0.24, top=0.95)),
+    "pie":     ((10, 8), dict(left=0.02, right=0.70, bottom=0.03, top=0.97)),
+    "line":    ((10, 6), dict(left=0.08, right=0.98, bottom=0.15, top=0.95)),
+    "heatmap": ((12, 8), dict(left=0.10, right=0.95, bottom=0.22, top=0.97)),
+    "violin":  ((10, 6), dict(left=0.08, right=0.98, bottom=0.24, top=0.95)),
+    "montana": ((10, 6), dict(left=0.08, right=0.92, bottom=0.12, top=0.75)),
+}
+PLOT_ASPECT = 1440 / 640  # ancho/alto del hueco donde se pega el gráfico
+
+@lru_cache(maxsize=None)
+def _theme_rgb(theme):
+    """Colores del tema ya convertidos a RGB 0-1 (se calculan una vez por tema)."""
+    return {k: _to_rgb01(v) for k, v in THEMES.get(theme, THEMES["light"]).items()}
+
+def _new_figure(chart, theme="light"):
+    """
+    Figura nueva para `chart` con el fondo del tema y su maquetación fija.
+    Se crea fuera de pyplot (sin registro global de figuras), así que los
+    renders concurrentes no comparten estado. Devuelve (fig, ax, colores).
+    """
+    figsize, margins = FIGURE_LAYOUTS[chart]
+    c = _theme_rgb(theme)
+    fig = Figure(figsize=figsize, facecolor=c["bg"], subplotpars=SubplotParams(**margins))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.set_facecolor(c["bg"])
+    return fig, ax, c
+
+def _fit_tick_labels(fig, xlabels=(), ylabels=(), fontsize=9):
+    """
+    Amplía los márgenes fijos cuando las etiquetas de ticks son largas. Se estima
+    por número de caracteres (x rotadas 45°, y horizontales), sin maquetación.
+    """
+    h_pt = fig.get_figheight() * 72
+    w_pt = h_pt * PLOT_ASPECT
+    char = 0.6 * fontsize
+    params = fig.subplotpars
+    if len(xlabels):
+        longest = max(len(str(l)) for l in xlabels)
+        need = (longest * char + fontsize) * np.sin(np.pi / 4) + 14
+        fig.subplots_adjust(bottom=max(params.bottom, min(0.45, need / h_pt)))
+    if len(ylabels):
+        longest = max(len(str(l)) for l in ylabels)
+        need = longest * char + 14
+        fig.subplots_adjust(left=max(params.left, min(0.35, need / w_pt)))
+
 def _canvas(width=1600, height=900, theme="light"):
     colors = THEMES.get(theme, THEMES["light"])
     img = Image.new("RGB", (width, height), color=colors["bg"])
     draw = ImageDraw.Draw(img); return img, draw, colors
 
 def _draw_header(draw, colors, title, subtitle, width=1600, pad=32):
-    draw.text((pad, pad), title, fill=colors["fg"], font=PIL_FONT_TITLE)
-    draw.text((pad, pad + PIL_FONT_TITLE.getbbox(title)[3] + 10), subtitle, fill=colors["muted"], font=PIL_FONT_SUBTITLE)
+    draw.text((pad, pad), title, fill=colors["fg"], font=_pil_font("title"))
+    draw.text((pad, pad + _pil_font("title").getbbox(title)[3] + 10), subtitle, fill=colors["muted"], font=_pil_font("subtitle"))
 
 def _draw_footer(draw, colors, footer, width=1600, height=900, pad=28):
     try:
-        bbox = draw.textbbox((0, 0), footer, font=PIL_FONT_FOOTER)
+        bbox = draw.textbbox((0, 0), footer, font=_pil_font("footer"))
         tw = bbox[2] - bbox[0]
         th = bbox[3] - bbox[1]
     except AttributeError:
         # Fallback para versiones antiguas de PIL
-        tw, th = draw.textsize(footer, font=PIL_FONT_FOOTER)
-    draw.text((width - tw - pad, height - th - pad), footer, fill=colors["muted"], font=PIL_FONT_FOOTER)
+        tw, th = draw.textsize(footer, font=_pil_font("footer"))
+    draw.text((width - tw - pad, height - th - pad), footer, fill=colors["muted"], font=_pil_font("footer"))
 
-def _paste_plot_on_canvas(fig, canvas_img, bbox=(80, 180, 1520, 820), dpi=100): # DPI optimizado
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight", facecolor=fig.get_facecolor())
-    plt.close(fig); buf.seek(0)
-    plot_img = Image.open(buf).convert("RGBA")
+def _plot_image(fig, bbox=(80, 180, 1520, 820), dpi=100):
+    # Dibuja la figura con Agg directamente al tamaño final del hueco (sin PNG
+    # intermedio, sin decodificar y sin LANCZOS). Se conserva la altura en
+    # pulgadas de la figura para que los textos mantengan su escala.
     x1,y1,x2,y2 = bbox; w,h = x2-x1, y2-y1
-    plot_img = plot_img.resize((w,h), Image.LANCZOS)
-    frame = Image.new("RGBA",(w,h),(0,0,0,0)); frame.paste(plot_img,(0,0),plot_img)
-    canvas_img.paste(frame,(x1,y1),frame); return canvas_img
+    render_dpi = h / fig.get_figheight() if fig.get_figheight() > 0 else dpi
+    fig.set_dpi(render_dpi)
+    fig.set_size_inches(w / render_dpi, h / render_dpi)
+    agg = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    agg.draw()
+    plot_img = Image.frombuffer("RGBA", agg.get_width_height(), agg.buffer_rgba(), "raw", "RGBA", 0, 1)
+    if plot_img.size != (w, h):  # redondeo de pulgadas -> píxeles
+        plot_img = plot_img.resize((w, h), Image.BILINEAR)
+    plt.close(fig); return plot_img
+
+def _paste_plot_on_canvas(fig, canvas_img, bbox=(80, 180, 1520, 820), dpi=100): # DPI optimizado
+    plot_img = _plot_image(fig, bbox, dpi)
+    canvas_img.paste(plot_img, bbox[:2], plot_img)
+    return canvas_img
 
 def _bubble(ax, xy, text, xytext, color="#CDEEDC", textcoords="axes fraction", fontsize=10):
     ax.annotate(text, xy=xy, xytext=xytext,
@@ -85,35 +157,76 @@ def _bubble(ax, xy, text, xytext, color="#CDEEDC", textcoords="axes fraction", f
         fontsize=fontsize,
         fontweight='bold') 
 
+class _CellLabels(Artist):
+    """
+    Etiquetas numéricas de todas las celdas de un heatmap en un solo Artist:
+    posiciones transformadas de una vez y texto dibujado directo con el renderer,
+    sin crear (ni maquetar) un objeto Text por celda.
+    """
+
+    def __init__(self, ax, values, fontsize, fmt="{:.2f}"):
+        super().__init__()
+        self.set_transform(ax.transData)
+        self.set_in_layout(False)
+        rows, cols = np.nonzero(~np.isnan(values))
+        cells = values[rows, cols]
+        # Umbral de color calculado una sola vez para toda la matriz
+        self._dark = cells > np.nanmean(values)
+        self._xy = np.column_stack([cols, rows]).astype(float)
+        self._labels = [fmt.format(v) for v in cells]
+        self._prop = FontProperties(size=fontsize, weight="bold")
+
+    def draw(self, renderer):
+        if not self.get_visible() or not self._labels:
+            return
+        xy = self.get_transform().transform(self._xy)
+        gcs = {}
+        for dark, color in ((True, "black"), (False, "white")):
+            gc = renderer.new_gc()
+            gc.set_foreground(color)
+            gcs[dark] = gc
+        canvas_h = renderer.get_canvas_width_height()[1]
+        renderer.open_group("cell_labels", gid=self.get_gid())
+        for (x, y), label, dark in zip(xy, self._labels, self._dark):
+            w, h, d = renderer.get_text_width_height_descent(label, self._prop, ismath=False)
+            # ha="center", va="center" como ax.text: centro de la caja de texto en (x, y)
+            baseline = y - h / 2 + d
+            if renderer.flipy():
+                baseline = canvas_h - baseline
+            renderer.draw_text(gcs[dark], x - w / 2, baseline, label, self._prop, 0)
+        renderer.close_group("cell_labels")
+        for gc in gcs.values():
+            gc.restore()
+        self.stale = False
+
 # --------------------------------------------------------------------------------------------------
 # FUNCIONES DE GRÁFICOS (Actualizadas con lógica IA didáctica)
 # --------------------------------------------------------------------------------------------------
 
 def chart_bar(g_series, theme="light", ylabel="", simple=False):
-    colors = THEMES.get(theme, THEMES["light"])
-    fig = plt.figure(figsize=(10,6), facecolor=_to_rgb01(colors["bg"])); ax = fig.add_subplot(111)
-    ax.set_facecolor(_to_rgb01(colors["bg"]))
+    fig, ax, c = _new_figure("bar", theme)
     
     # Usar un color secundario para los bordes si es modo oscuro
-    edge_color = _to_rgb01(colors["fg"]) if theme == 'light' else _to_rgb01(colors["muted"])
+    edge_color = c["fg"] if theme == 'light' else c["muted"]
     
     bars = ax.bar(g_series.index.astype(str), g_series.values, 
-                  color=_to_rgb01(colors["accent"]),
+                  color=c["accent"],
                   edgecolor=edge_color, # Borde sutil
                   linewidth=1)
     
     # Estilos de ejes y ticks
-    ax.tick_params(axis='x', labelrotation=45, labelsize=9, colors=_to_rgb01(colors["fg"]))
+    ax.tick_params(axis='x', labelrotation=45, labelsize=9, colors=c["fg"])
     plt.setp(ax.get_xticklabels(), ha="right", rotation_mode="anchor") 
-    ax.tick_params(axis='y', colors=_to_rgb01(colors["fg"]), labelsize=10)
-    ax.spines['bottom'].set_color(_to_rgb01(colors["muted"])); ax.spines['left'].set_color(_to_rgb01(colors["muted"]))
-    ax.set_ylabel(ylabel, color=_to_rgb01(colors["fg"]))
+    _fit_tick_labels(fig, xlabels=g_series.index.astype(str))
+    ax.tick_params(axis='y', colors=c["fg"], labelsize=10)
+    ax.spines['bottom'].set_color(c["muted"]); ax.spines['left'].set_color(c["muted"])
+    ax.set_ylabel(ylabel, color=c["fg"])
     
     # Etiquetas de valor en las barras
     for b in bars:
         v = b.get_height()
         ax.text(b.get_x()+b.get_width()/2, v, f"{v:,.2f}", ha="center", va="bottom",
-                color=_to_rgb01(colors["fg"]), fontsize=12, fontweight="bold")
+                color=c["fg"], fontsize=12, fontweight="bold")
     
     # LÓGICA DE LA IA (Burbujas explicativas)
     if simple and len(bars)>0:
@@ -131,15 +244,12 @@ def chart_bar(g_series, theme="light", ylabel="", simple=False):
                     f"Más Bajo: {ylabel} (Revisar)", (0.6, 0.15), 
                     color="#FFC7C7", fontsize=12) # Color rojo claro/advertencia
             
-    fig.tight_layout(); return fig
+    return fig
 
 def chart_pie(g_series, theme="light", simple=False):
+    fig, ax, c = _new_figure("pie", theme)
     if g_series.empty:
-        fig, ax = plt.subplots(); return fig
-        
-    colors = THEMES.get(theme, THEMES["light"])
-    fig = plt.figure(figsize=(10,8), facecolor=_to_rgb01(colors["bg"])); ax = fig.add_subplot(111) 
-    ax.set_facecolor(_to_rgb01(colors["bg"]))
+        return fig
     
     # 1. Obtener colores del colormap 'Spectral' (o cualquier otro)
     color_map = plt.cm.get_cmap('Spectral')
@@ -155,7 +265,7 @@ def chart_pie(g_series, theme="light", simple=False):
             if not main_slices.empty:
                 g_series = pd.concat([main_slices, pd.Series([otros_sum], index=['Otros'])])
                 # Ajusta la lista de colores al nuevo tamaño de la serie agrupada
-                color_list = color_list[:len(main_slices)] + [_to_rgb01(colors["muted"])]
+                color_list = color_list[:len(main_slices)] + [c["muted"]]
 
 
     vals = g_series.values; labels = g_series.index.astype(str)
@@ -163,14 +273,14 @@ def chart_pie(g_series, theme="light", simple=False):
     # 2. Pasar la lista de colores a la función pie()
     wedges, texts, autotexts = ax.pie(vals, 
                                       autopct=lambda p: f"{p:.1f}%" if p > 3 else '', 
-                                      textprops={'color': _to_rgb01(colors["fg"])},
+                                      textprops={'color': c["fg"]},
                                       pctdistance=0.85, 
-                                      wedgeprops={'linewidth':1,'edgecolor':_to_rgb01(colors["bg"])},
+                                      wedgeprops={'linewidth':1,'edgecolor':c["bg"]},
                                       colors=color_list) # <-- CORREGIDO: Usa 'colors' en lugar de 'cmap'
     
     # Estilo de texto dentro de las rebanadas
     for t in autotexts: 
-        t.set_color(_to_rgb01(colors["bg"]) if theme == "light" else _to_rgb01(colors["fg"]))
+        t.set_color(c["bg"] if theme == "light" else c["fg"])
         t.set_fontsize(9); 
         t.set_fontweight("bold")
 
@@ -183,7 +293,7 @@ def chart_pie(g_series, theme="light", simple=False):
               bbox_to_anchor=(0.9, 0, 0.5, 1), 
               fontsize=10,
               # Estilo de leyenda para modo oscuro
-              labelcolor=_to_rgb01(colors["fg"]),
+              labelcolor=c["fg"],
               frameon=False, 
               title_fontsize=12)
     
@@ -199,29 +309,25 @@ def chart_pie(g_series, theme="light", simple=False):
                 "Pedazo Más Grande = Mayor Proporción", 
                 (0.5, 0.5), color="#DDEBFF", fontsize=12) # Color azul claro
         
-    fig.tight_layout(rect=[0, 0, 0.75, 1]);
     return fig
 
 def chart_line(df, x_col, y_col, theme="light", simple=False):
-    colors = THEMES.get(theme, THEMES["light"])
-    fig = plt.figure(figsize=(10,6), facecolor=_to_rgb01(colors["bg"])); ax = fig.add_subplot(111)
-    ax.set_facecolor(_to_rgb01(colors["bg"]))
+    fig, ax, c = _new_figure("line", theme)
     
     # 1. Agregación de datos (agrupando por X y promediando Y)
-    x = _ensure_num(df[x_col]); y = _ensure_num(df[y_col])
-    m = pd.DataFrame({x_col:x, y_col:y}).dropna().groupby(x_col)[y_col].mean().reset_index()
+    m = _agg_line(df, x_col, y_col)
     
     if m.empty: return fig
 
     # 2. Plotting
     ax.plot(m[x_col], m[y_col], marker="o", linewidth=3, 
-            color=_to_rgb01(colors["accent"]), 
-            markersize=8, markeredgecolor=_to_rgb01(colors["fg"]))
+            color=c["accent"], 
+            markersize=8, markeredgecolor=c["fg"])
     
     # 3. Estilos de ejes (Ya usa las variables de columna)
-    ax.set_xlabel(x_col, color=_to_rgb01(colors["fg"])); ax.set_ylabel(y_col, color=_to_rgb01(colors["fg"]))
-    ax.tick_params(colors=_to_rgb01(colors["fg"]), labelsize=10)
-    ax.spines['bottom'].set_color(_to_rgb01(colors["muted"])); ax.spines['left'].set_color(_to_rgb01(colors["muted"]))
+    ax.set_xlabel(x_col, color=c["fg"]); ax.set_ylabel(y_col, color=c["fg"])
+    ax.tick_params(colors=c["fg"], labelsize=10)
+    ax.spines['bottom'].set_color(c["muted"]); ax.spines['left'].set_color(c["muted"])
     
     # 4. LÓGICA DE LA IA (Burbujas explicativas)
     if simple and len(m)>1:
@@ -238,29 +344,22 @@ def chart_line(df, x_col, y_col, theme="light", simple=False):
                     f"Punto Bajo: {m.loc[i_min,x_col]}", (0.6, 0.2), 
                     color="#FFD7E6", fontsize=12)
             
-    fig.tight_layout(); return fig
+    return fig
 
 def chart_heatmap(df, row_col, col_col, metric_col, theme="light", simple=False):
-    colors = THEMES.get(theme, THEMES["light"])
+    fig, ax, c = _new_figure("heatmap", theme)
     try:
         # 1. Rellena con NaN (invisible) en lugar de 0.0 (morado)
-        pivot = (df[[row_col, col_col, metric_col]]
-                 .assign(**{metric_col: _ensure_num(df[metric_col])})
-                 .dropna()
-                 .groupby([row_col, col_col])[metric_col].mean()
-                 .unstack(col_col).fillna(np.nan))
+        pivot = _agg_cells(df, row_col, col_col, metric_col).unstack(col_col).fillna(np.nan)
     except Exception:
-        fig, ax = plt.subplots(); return fig
+        return fig
 
     if pivot.empty: 
-        fig, ax = plt.subplots(); return fig
-        
-    fig = plt.figure(figsize=(12,8), facecolor=_to_rgb01(colors["bg"])); ax = fig.add_subplot(111)
-    ax.set_facecolor(_to_rgb01(colors["bg"]))
+        return fig
     
     # 2. Copia el colormap y le dice que pinte los NaN (vacíos)
     my_cmap = copy.copy(plt.get_cmap('viridis'))
-    my_cmap.set_bad(color=_to_rgb01(colors["bg"]))
+    my_cmap.set_bad(color=c["bg"])
     
     im = ax.imshow(pivot.values, aspect="auto", cmap=my_cmap)
     
@@ -269,32 +368,29 @@ def chart_heatmap(df, row_col, col_col, metric_col, theme="light", simple=False)
     
     if n_cols <= LABEL_LIMIT:
         ax.set_xticks(range(n_cols))
-        ax.set_xticklabels(pivot.columns.astype(str), rotation=45, ha="right", color=_to_rgb01(colors["fg"]), fontsize=9)
+        ax.set_xticklabels(pivot.columns.astype(str), rotation=45, ha="right", color=c["fg"], fontsize=9)
+        _fit_tick_labels(fig, xlabels=pivot.columns.astype(str))
     else:
         ax.set_xticks([])
         ax.set_xticklabels([])
         fig.text(0.5, 0.02, f"Etiquetas del Eje X ocultas ({n_cols} > {LABEL_LIMIT})", 
-                 ha='center', fontsize=9, style='italic', color=_to_rgb01(colors["muted"]))
+                 ha='center', fontsize=9, style='italic', color=c["muted"])
 
     if n_rows <= LABEL_LIMIT:
         ax.set_yticks(range(n_rows))
-        ax.set_yticklabels(pivot.index.astype(str), color=_to_rgb01(colors["fg"]), fontsize=9)
+        ax.set_yticklabels(pivot.index.astype(str), color=c["fg"], fontsize=9)
+        _fit_tick_labels(fig, ylabels=pivot.index.astype(str))
     else:
         ax.set_yticks([])
         ax.set_yticklabels([])
         fig.text(0.02, 0.5, f"Etiquetas Eje Y ocultas ({n_rows} > {LABEL_LIMIT})", 
-                 va='center', rotation='vertical', fontsize=9, style='italic', color=_to_rgb01(colors["muted"]))
+                 va='center', rotation='vertical', fontsize=9, style='italic', color=c["muted"])
     
     ax.spines[:].set_visible(False)
     
     font_size = max(4, 10 - max(0, n_rows - 10) // 2)
     if n_rows < 30 and n_cols < 30:
-        for i in range(n_rows):
-            for j in range(n_cols):
-                val = pivot.values[i,j]
-                if pd.notna(val):
-                    text_color = "black" if val > np.nanmean(pivot.values) else "white"
-                    ax.text(j, i, f"{val:.2f}", ha="center", va="center", color=text_color, fontsize=font_size, fontweight="bold")
+        ax.add_artist(_CellLabels(ax, pivot.to_numpy(dtype=float, na_value=np.nan), font_size))
     
     # --- 3. LÓGICA DE LA IA (Burbujas explicativas) ---
     if simple:
@@ -321,47 +417,68 @@ def chart_heatmap(df, row_col, col_col, metric_col, theme="light", simple=False)
             
     cbar = fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04); cbar.set_label("Valor medio", rotation=90)
     
-    fig.tight_layout(rect=[0.05, 0.05, 1, 1]); 
+    
     return fig
 
-def chart_violin(df, group_col, metric_col, theme="light", simple=False, top_n=8):
-    colors = THEMES.get(theme, THEMES["light"])
-    fig = plt.figure(figsize=(10,6), facecolor=_to_rgb01(colors["bg"])); ax = fig.add_subplot(111)
-    ax.set_facecolor(_to_rgb01(colors["bg"]))
-    
-    top_n_int = int(top_n)
-    means = _agg_topn(df, group_col, metric_col, top_n=top_n_int) 
-    
-    df_plot = df[df[group_col].isin(means.index)].copy()
-    df_plot[metric_col] = _ensure_num(df_plot[metric_col]).dropna()
+def violin_data(df, group_col, metric_col, top_n=8):
+    """
+    Entradas del violín para los top_n grupos (por media), en una sola pasada:
+    un argsort estable por código de grupo y una vista (sin copia) por grupo.
+    Devuelve {"labels", "stats" (formato Axes.violin), "std"}; es lo que viaja al worker.
+    """
+    means = _agg_topn(df, group_col, metric_col, top_n=int(top_n))
+    values = get_cube(df, metric_col).values.to_numpy(dtype=np.float64, na_value=np.nan)
+    codes = means.index.get_indexer(df[group_col])
+    valid = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
 
-    if df_plot.empty or len(means.index) == 0:
-        fig, ax = plt.subplots(); return fig
+    order = np.argsort(codes, kind="stable")
+    values = values[order]
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(means)))])
 
-    data_to_plot = [df_plot[df_plot[group_col] == g][metric_col].values for g in means.index]
+    labels, stats, stds = [], [], []
+    for i, g in enumerate(means.index):
+        group_vals = values[bounds[i]:bounds[i + 1]]
+        if len(group_vals) == 0:
+            continue
+        labels.append(g)
+        stats.append(violin_stats(group_vals))
+        stds.append(float(np.std(group_vals)) if len(group_vals) > 1 else None)
+    return {"labels": labels, "stats": stats, "std": stds}
 
-    vp = ax.violinplot(data_to_plot, showmeans=False, showmedians=True, showextrema=False)
+def chart_violin(df, group_col, metric_col, theme="light", simple=False, top_n=8):
+    """`df` puede ser un DataFrame o las entradas ya calculadas por violin_data."""
+    fig, ax, c = _new_figure("violin", theme)
+    data = df if isinstance(df, dict) else violin_data(df, group_col, metric_col, top_n)
+    if not data["stats"]:
+        return fig
+
+    labels, vpstats = data["labels"], data["stats"]
+    positions = range(1, len(vpstats)+1)
+    # Densidades ya calculadas (resolución acotada): sin KDE por grupo dentro de matplotlib
+    vp = ax.violin(vpstats, positions=positions, showmeans=False, showmedians=True, showextrema=False)
     
     # Estilo de violín
     for i, b in enumerate(vp['bodies']): 
-        b.set_facecolor(_to_rgb01(colors["accent"])); b.set_alpha(0.85)
+        b.set_facecolor(c["accent"]); b.set_alpha(0.85)
     vp['cmedians'].set_color('k') # Línea de la mediana en negro
 
-    ax.set_xticks(range(1, len(means.index)+1)); 
-    ax.set_xticklabels(means.index.astype(str), rotation=45, ha="right", color=_to_rgb01(colors["fg"]), fontsize=9)
+    ax.set_xticks(positions); 
+    ax.set_xticklabels(pd.Index(labels).astype(str), rotation=45, ha="right", color=c["fg"], fontsize=9)
+    _fit_tick_labels(fig, xlabels=pd.Index(labels).astype(str))
     
-    ax.set_ylabel(metric_col, color=_to_rgb01(colors["fg"])) # Ya usa la métrica
-    ax.tick_params(axis='y', colors=_to_rgb01(colors["fg"]))
-    ax.spines['bottom'].set_color(_to_rgb01(colors["muted"])); ax.spines['left'].set_color(_to_rgb01(colors["muted"]))
+    ax.set_ylabel(metric_col, color=c["fg"]) # Ya usa la métrica
+    ax.tick_params(axis='y', colors=c["fg"])
+    ax.spines['bottom'].set_color(c["muted"]); ax.spines['left'].set_color(c["muted"])
     
     # LÓGICA DE LA IA (Burbujas explicativas)
-    if simple and len(data_to_plot)>0 and len(data_to_plot[0]) > 0:
+    if simple:
         
         # Encontrar el grupo con mayor dispersión (más "gordito")
-        stds = [np.std(data) for data in data_to_plot if len(data) > 1]
+        stds = [(sd, i) for i, sd in enumerate(data["std"]) if sd is not None]
         if stds:
-            max_std_idx = np.argmax(stds)
-            max_std_median = np.median(data_to_plot[max_std_idx])
+            max_std_idx = max(stds)[1]
+            max_std_median = vpstats[max_std_idx]["median"]
             
             # Mayor dispersión (Bolita gordita arriba)
             _bubble(ax, (max_std_idx + 1, float(max_std_median)), 
@@ -369,46 +486,46 @@ def chart_violin(df, group_col, metric_col, theme="light", simple=False, top_n=8
                     color="#DFFFE2", fontsize=12)
             
         # Encontrar el grupo con menor mediana (Punta abajo: más bajitos)
-        medians = [np.median(data) for data in data_to_plot if len(data) > 0]
-        if medians:
-            min_median_idx = np.argmin(medians)
-            min_median_val = medians[min_median_idx]
-            
-            # El peor rendimiento (Punta abajo: más bajitos) - TEXTO MODIFICADO
-            _bubble(ax, (min_median_idx + 1, float(min_median_val)), 
-                    f"Peor Mediana de {metric_col} (Revisar)", (0.7, 0.1), 
-                    color="#FFEBD1", fontsize=12)
+        medians = [st["median"] for st in vpstats]
+        min_median_idx = int(np.argmin(medians))
+        min_median_val = medians[min_median_idx]
+        
+        # El peor rendimiento (Punta abajo: más bajitos) - TEXTO MODIFICADO
+        _bubble(ax, (min_median_idx + 1, float(min_median_val)), 
+                f"Peor Mediana de {metric_col} (Revisar)", (0.7, 0.1), 
+                color="#FFEBD1", fontsize=12)
     
-    fig.tight_layout(); return fig
+    return fig
+
+def montana_density(df, metric_col):
+    """Resumen de densidad de la columna completa (lo que se envía al worker de render)."""
+    return density_estimate(get_cube(df, metric_col).values.to_numpy(dtype=np.float64, na_value=np.nan))
 
 def chart_montana(df, metric_col, theme="light", simple=False):
-    colors = THEMES.get(theme, THEMES["light"])
-    vals = _ensure_num(df[metric_col]).dropna().values
-    
-    fig, ax1 = plt.subplots(figsize=(10,6), facecolor=_to_rgb01(colors["bg"]))
-    ax1.set_facecolor(_to_rgb01(colors["bg"]))
+    """`df` puede ser un DataFrame o un DensityEstimate ya calculado (montana_density)."""
+    fig, ax1, c = _new_figure("montana", theme)
+    dens = df if isinstance(df, DensityEstimate) else montana_density(df, metric_col)
     
-    if len(vals) < 10:
-        ax1.text(0.5,0.5,"Muy pocos datos para Montaña", ha="center", color=_to_rgb01(colors["fg"]));
+    if dens is None or dens.n < 10:
+        ax1.text(0.5,0.5,"Muy pocos datos para Montaña", ha="center", color=c["fg"]);
         return fig
         
-    try:
-        xs = np.linspace(vals.min(), vals.max(), 200)
-        kde = gaussian_kde(vals); ys = kde(xs)
-    except Exception:
-        ax1.text(0.5,0.5,"Datos insuficientes para curva (valor único)", ha="center", color=_to_rgb01(colors["fg"]))
+    if dens.degenerate:
+        ax1.text(0.5,0.5,"Datos insuficientes para curva (valor único)", ha="center", color=c["fg"])
         return fig
-        
-    ecdf_x = np.sort(vals); ecdf_y = np.arange(1, len(vals)+1)/len(vals)
+
+    # KDE por FFT sobre el histograma; la ECDF sale del mismo histograma
+    xs = dens.centers; ys = dens.density()
+    ecdf_x = dens.edges; ecdf_y = np.concatenate([[0.0], dens.cdf])
     
-    ax1.fill_between(xs, ys, alpha=0.35, step='pre', color=_to_rgb01(colors["accent"]))
+    ax1.fill_between(xs, ys, alpha=0.35, step='pre', color=c["accent"])
     # TEXTO MODIFICADO
-    ax1.plot(xs, ys, linewidth=3, label=f"Distribución de valores de {metric_col}", color=_to_rgb01(colors["accent"]))
+    ax1.plot(xs, ys, linewidth=3, label=f"Distribución de valores de {metric_col}", color=c["accent"])
     # TEXTO MODIFICADO
-    ax1.set_ylabel(f"Densidad de {metric_col}", color=_to_rgb01(colors["fg"]))
-    ax1.tick_params(axis='y', colors=_to_rgb01(colors["accent"]))
-    ax1.tick_params(axis='x', colors=_to_rgb01(colors["fg"]))
-    ax1.spines['bottom'].set_color(_to_rgb01(colors["muted"])); ax1.spines['left'].set_color(_to_rgb01(colors["muted"]))
+    ax1.set_ylabel(f"Densidad de {metric_col}", color=c["fg"])
+    ax1.tick_params(axis='y', colors=c["accent"])
+    ax1.tick_params(axis='x', colors=c["fg"])
+    ax1.spines['bottom'].set_color(c["muted"]); ax1.spines['left'].set_color(c["muted"])
 
     ax2 = ax1.twinx()
     ax2.plot(ecdf_x, ecdf_y, color="orange", linewidth=3, label="% acumulado")
@@ -420,17 +537,17 @@ def chart_montana(df, metric_col, theme="light", simple=False):
     ax2.spines['bottom'].set_visible(False)
     
     ax1.legend(loc="upper left"); ax2.legend(loc="lower right")
-    med = np.median(vals)
+    med = dens.median()
     ax1.axvline(med, linestyle="--", color="k"); 
-    ax1.text(med, ax1.get_ylim()[1]*0.9, f"Mediana ≈ {med:.2f}", rotation=90, color=_to_rgb01(colors["fg"]))
+    ax1.text(med, ax1.get_ylim()[1]*0.9, f"Mediana ≈ {med:.2f}", rotation=90, color=c["fg"])
     
     if simple:
         _bubble(ax1, (med, max(ys)*0.8), "Esta línea es la mitad (50%)", (0.1, 0.9), color="#E6F4FF")
-        p90 = np.percentile(vals,90)
+        p90 = dens.quantile(0.9)
         # TEXTO MODIFICADO
         _bubble(ax2, (p90, 0.9), f"El 10% más alto de {metric_col}", (0.7, 0.4), color="#EAFBEA")
     
-    fig.tight_layout(); return fig
+    return fig
 
 def make_infographic_from_chart(fig, title, subtitle, footer, theme="light",
                                 out_path="./output_images/templ_01.png"):
@@ -439,4 +556,14 @@ def make_infographic_from_chart(fig, title, subtitle, footer, theme="light",
     _draw_footer(draw, colors, footer)
     _paste_plot_on_canvas(fig, canvas, bbox=(80, 180, 1520, 820), dpi=100) # dpi=100 para velocidad
     canvas.save(out_path, format="PNG")
+    return out_path
+
+def make_infographic_from_plot(plot_img, title, subtitle, footer, theme="light",
+                               out_path="./output_images/templ_01.png"):
+    """Igual que make_infographic_from_chart con el gráfico ya rasterizado (RGBA 1440x640)."""
+    canvas, draw, colors = _canvas(theme=theme)
+    _draw_header(draw, colors, title, subtitle)
+    _draw_footer(draw, colors, footer)
+    canvas.paste(plot_img, (80, 180), plot_img)
+    canvas.save(out_path, format="PNG")
     return out_path
\ No newline at end of file
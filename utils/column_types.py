@@ -0,0 +1,86 @@
+import threading
+import weakref
+
+import pandas as pd
+
+from .frame_cache import frame_memo
+
+# ============================================================
+# INFERENCIA DE TIPOS DE COLUMNA (una vez por dataset)
+# ============================================================
+# Qué columnas son numéricas, sus versiones convertidas (pd.to_numeric) y la
+# cardinalidad de cada columna se calculan una sola vez y se reutilizan en
+# data_processing, aggregation y charts.
+
+NUMERIC_DTYPES = ["number", "float", "int"]
+# Numéricas con hasta este nº de valores distintos también sirven como grupo
+GROUP_MAX_UNIQUE = 20
+
+
+class ColumnTypes:
+    def __init__(self, df):
+        self._df_ref = weakref.ref(df)
+        self._numeric = {}    # columna -> Serie convertida (errors="coerce")
+        self._parsable = {}   # columna -> bool (to_numeric sin errores)
+        self._nunique = {}
+        self._lock = threading.Lock()
+        self._numeric_cols = None
+        self._group_candidates = None
+
+    def _df(self):
+        df = self._df_ref()
+        if df is None:
+            raise RuntimeError("El DataFrame de la inferencia de tipos ya no existe.")
+        return df
+
+    def numeric(self, col):
+        """pd.to_numeric(df[col], errors="coerce"), calculado una vez. NO mutar."""
+        with self._lock:
+            if col not in self._numeric:
+                self._numeric[col] = pd.to_numeric(self._df()[col], errors="coerce")
+            return self._numeric[col]
+
+    def _is_parsable(self, col):
+        # Como to_numeric(errors="raise"): la conversión se guarda para reutilizarla
+        with self._lock:
+            if col not in self._parsable:
+                try:
+                    converted = pd.to_numeric(self._df()[col], errors="raise")
+                except Exception:
+                    self._parsable[col] = False
+                else:
+                    self._parsable[col] = True
+                    self._numeric.setdefault(col, converted)
+            return self._parsable[col]
+
+    def nunique(self, col):
+        with self._lock:
+            if col not in self._nunique:
+                self._nunique[col] = int(self._df()[col].nunique(dropna=True))
+            return self._nunique[col]
+
+    def numeric_cols(self):
+        """Columnas numéricas o convertibles sin errores a número (ordenadas)."""
+        if self._numeric_cols is None:
+            df = self._df()
+            num = set(df.select_dtypes(include=NUMERIC_DTYPES).columns.tolist())
+            num.update(c for c in df.columns if c not in num and self._is_parsable(c))
+            self._numeric_cols = sorted(num)
+        return list(self._numeric_cols)
+
+    def group_candidates(self):
+        """Categóricas + numéricas de baja cardinalidad."""
+        if self._group_candidates is None:
+            df = self._df()
+            cats = df.select_dtypes(exclude=NUMERIC_DTYPES).columns.tolist()
+            low_card_nums = [
+                c for c in df.select_dtypes(include=NUMERIC_DTYPES).columns
+                if self.nunique(c) <= GROUP_MAX_UNIQUE
+            ]
+            self._group_candidates = list(dict.fromkeys(cats + low_card_nums))
+        return list(self._group_candidates)
+
+
+def get_column_types(df):
+    """Devuelve (o crea) la inferencia de tipos compartida de `df`."""
+    return frame_memo(df, "column_types", lambda: ColumnTypes(df))
@@ -0,0 +1,116 @@
+import os
+import threading
+
+import pandas as pd
+
+from config import DATASET_CACHE_DIR, DATASET_CACHE_MAX_BYTES
+
+# Feather (Arrow IPC sin comprimir) se abre con memory-map: Arrow no copia el
+# archivo a su heap y to_pandas(self_destruct=True) libera cada columna al
+# convertirla, así el pico de memoria es una sola copia (la de pandas).
+# Si pyarrow no está instalado, o Arrow no admite alguna columna (object con
+# tipos mixtos), se usa pickle (mantiene dtypes, sin mmap): el dataset siempre
+# queda en disco para los demás workers.
+# En disco se guarda como mucho DATASET_CACHE_MAX_BYTES: al guardar se borran
+# los datasets usados hace más tiempo (mtime, que se renueva en cada lectura).
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+_write_lock = threading.Lock()
+
+
+def _dataset_paths(dataset_id):
+    base = os.path.join(DATASET_CACHE_DIR, str(dataset_id))
+    return f"{base}.feather", f"{base}.pkl"
+
+
+def _existing_path(dataset_id):
+    if not dataset_id:
+        return None
+    return next((p for p in _dataset_paths(dataset_id) if os.path.exists(p)), None)
+
+
+def has_dataset(dataset_id):
+    return _existing_path(dataset_id) is not None
+
+
+def _write(out, tmp_path, as_feather):
+    if as_feather:
+        feather.write_feather(out, tmp_path, compression="uncompressed")
+    else:
+        out.to_pickle(tmp_path)
+
+
+def save_dataset(dataset_id, df):
+    """
+    Persiste el dataset una sola vez en formato columnar tipado (tal como se
+    parseó: las columnas derivadas como __tasa__ se calculan al usarlas).
+    Escritura atómica.
+    """
+    path = _existing_path(dataset_id)
+    if path:
+        os.utime(path)
+        return path
+
+    out = df.reset_index(drop=True)
+    feather_path, pickle_path = _dataset_paths(dataset_id)
+    os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+    with _write_lock:
+        for path, as_feather in ((feather_path, True), (pickle_path, False)):
+            if as_feather and feather is None:
+                continue
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                _write(out, tmp_path, as_feather)
+            except Exception as e:
+                # Columnas con tipos mixtos que Arrow no soporta: se prueba con pickle
+                print(f"No se pudo guardar el dataset {dataset_id} como {os.path.splitext(path)[1]}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                continue
+            os.replace(tmp_path, path)
+            _evict(keep=path)
+            return path
+    return None
+
+
+def _evict(keep=None, max_bytes=None):
+    """Borra los datasets menos usados hasta quedar bajo el tope de bytes."""
+    max_bytes = DATASET_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    found = []
+    for entry in os.scandir(DATASET_CACHE_DIR):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            st = entry.stat()
+            found.append((st.st_mtime, entry.path, st.st_size))
+    total = sum(size for _, _, size in found)
+    for _, path, size in sorted(found):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def load_dataset(dataset_id):
+    """
+    Carga el dataset cacheado (memory-map, sin parsear texto) y lo marca como usado.
+    Devuelve None si no está en disco.
+    """
+    path = _existing_path(dataset_id)
+    if path is None:
+        return None
+    try:
+        os.utime(path)
+        if path.endswith(".feather"):
+            table = feather.read_table(path, memory_map=True)
+            return table.to_pandas(self_destruct=True, split_blocks=True)
+        return pd.read_pickle(path)
+    except Exception as e:
+        print(f"Error leyendo dataset cacheado {dataset_id}: {e}")
+        return None
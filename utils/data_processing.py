@@ -1,84 +1,162 @@
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
+
+from .aggregation import get_cube
+from .column_types import get_column_types
+from .sketches import approx_distinct
+
+# Bytes iniciales que se inspeccionan para detectar la codificación
+SNIFF_BYTES = 64 * 1024
+# Caracteres (líneas completas) que recibe csv.Sniffer para el separador: su
+# coste crece ~cuadrático con el texto (≈6 ms en 8 KB, >300 ms en 64 KB)
+DELIMITER_SNIFF_CHARS = 8 * 1024
+# Filas por trozo en la detección de anomalías en streaming
+STREAM_CHUNK_ROWS = 200_000
+# IsolationForest: filas para el ajuste y tamaño de trozo al puntuar
+ROW_FIT_SAMPLE = 100_000
+ROW_SCORE_CHUNK = 65_536
+# summary_table: distintos exactos hasta este nº de filas (HyperLogLog por encima)
+SUMMARY_EXACT_ROWS = 1_000_000
+SUMMARY_SCAN_ROWS = 64
+CSV_DELIMITERS = ",;\t|"
+
+def _isolation_forest(**params):
+    # sklearn se importa en el primer uso (detect_row_anomalies), no al cargar el módulo
+    from sklearn.ensemble import IsolationForest
+    return IsolationForest(**params)
+
+def sniff_csv(sample):
+    """
+    Detecta (encoding, separador) a partir de los primeros KB del archivo.
+    - UTF-8 (con o sin BOM) si el bloque decodifica limpio; si no, latin1.
+    - Separador con csv.Sniffer entre , ; tab |  (por defecto ','), solo sobre
+      las líneas completas de los primeros DELIMITER_SNIFF_CHARS caracteres.
+    """
+    if sample.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    else:
+        encoding = "utf-8"
+    try:
+        text = sample.decode(encoding)
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final del bloque sigue siendo UTF-8
+        if e.reason == "unexpected end of data" and e.start >= len(sample) - 3:
+            text = sample[:e.start].decode(encoding)
+        else:
+            encoding = "latin1"
+            text = sample.decode(encoding)
+
+    # Solo líneas completas (y pocas) para el sniffer
+    truncated = len(sample) >= SNIFF_BYTES
+    if len(text) > DELIMITER_SNIFF_CHARS:
+        text, truncated = text[:DELIMITER_SNIFF_CHARS], True
+    if truncated and "\n" in text:
+        text = text[:text.rindex("\n")]
+    try:
+        sep = csv.Sniffer().sniff(text, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        sep = ","
+    return encoding, sep
 
 def read_csv_smart(file_obj, nrows=None):
     """
     Lee un objeto de archivo (stream) en lugar de un 'path'.
-    Esto soluciona el error [Errno 2] No such file or directory.
+    Detecta codificación y separador con los primeros KB y parsea UNA sola vez;
+    solo si el resto del archivo no es UTF-8 válido se reintenta con latin1.
     """
-    for enc in ["utf-8", "latin1", "ISO-8859-1"]:
-        try:
-            file_obj.seek(0) 
-            return pd.read_csv(file_obj, nrows=nrows, encoding=enc)
-        except Exception:
-            pass
-    
     file_obj.seek(0)
-    return pd.read_csv(file_obj, nrows=nrows)
+    sample = file_obj.read(SNIFF_BYTES)
+    if isinstance(sample, str):
+        sample = sample.encode("utf-8")
+    encoding, sep = sniff_csv(sample)
+
+    file_obj.seek(0)
+    try:
+        return pd.read_csv(file_obj, nrows=nrows, encoding=encoding, sep=sep)
+    except UnicodeDecodeError:
+        file_obj.seek(0)
+        return pd.read_csv(file_obj, nrows=nrows, encoding="latin1", sep=sep)
 
-def summary_table(df: pd.DataFrame):
+def summary_table(df: pd.DataFrame, exact=None):
+    """
+    Perfil de columnas: dtype, nulos, distintos y 3 valores de muestra.
+    - Nulos de todas las columnas en una sola pasada vectorizada.
+    - Distintos exactos hasta SUMMARY_EXACT_ROWS filas; por encima, HyperLogLog
+      (exact=True/False fuerza el modo).
+    - La muestra sale de las primeras posiciones no nulas: solo esos valores se pasan a texto.
+    """
+    if exact is None:
+        exact = len(df) <= SUMMARY_EXACT_ROWS
+    n_miss = df.isna().sum().to_numpy()
+    types = get_column_types(df) if df.columns.is_unique else None
     rows = []
-    for c in df.columns:
-        s = df[c]
+    for i, c in enumerate(df.columns):
+        s = df.iloc[:, i]
+        if not exact:
+            n_unique = approx_distinct(s)
+        elif types is not None:
+            n_unique = types.nunique(c)
+        else:
+            n_unique = int(s.nunique(dropna=True))
         rows.append([
             c, str(s.dtype),
-            int(s.isna().sum()),
-            int(s.nunique(dropna=True)),
-            ", ".join(s.dropna().astype(str).head(3).tolist())
+            int(n_miss[i]),
+            n_unique,
+            ", ".join(_first_values(s, 3).astype(str).tolist())
         ])
     return pd.DataFrame(rows, columns=["columna","dtype","n_miss","n_unique","muestra_valores"])
 
+def _first_values(s, k):
+    """Primeros k valores no nulos sin recorrer (ni copiar) la columna entera si no hace falta."""
+    head = s.iloc[:SUMMARY_SCAN_ROWS].dropna()
+    if len(head) >= k or len(s) <= SUMMARY_SCAN_ROWS:
+        return head.iloc[:k]
+    positions = np.flatnonzero(s.notna().to_numpy())[:k]
+    return s.iloc[positions]
+
 def infer_rate(df: pd.DataFrame):
     if {"cursosaprobados","cursosmatriculados"}.issubset(df.columns):
-        a = pd.to_numeric(df["cursosaprobados"], errors="coerce")
-        b = pd.to_numeric(df["cursosmatriculados"], errors="coerce")
+        types = get_column_types(df)
+        a = types.numeric("cursosaprobados")
+        b = types.numeric("cursosmatriculados")
         with np.errstate(divide="ignore", invalid="ignore"):
             tasa = np.where(b>0, a/b, np.nan)
         return pd.Series(tasa, index=df.index, name="__tasa__")
     return None
 
 def valid_numeric_cols(df: pd.DataFrame):
-    num = set(df.select_dtypes(include=["number","float","int"]).columns.tolist())
-    for c in df.columns:
-        if c not in num:
-            try:
-                pd.to_numeric(df[c], errors="raise")
-                num.add(c)
-            except Exception:
-                pass
-    return sorted(num)
+    # Inferencia compartida por dataset: las columnas convertidas se reutilizan
+    return get_column_types(df).numeric_cols()
 
 def group_candidates(df: pd.DataFrame):
-    cats = df.select_dtypes(exclude=["number","float","int"]).columns.tolist()
-    low_card_nums = [
-        c for c in df.select_dtypes(include=["number","float","int"]).columns
-        if df[c].nunique(dropna=True) <= 20
-    ]
-    return list(dict.fromkeys(cats + low_card_nums))
+    return get_column_types(df).group_candidates()
 
 def detect_group_anomalies(df, group_col, metric_col, method="iqr",
                            k_iqr=1.5, z_thr=2.5, mad_thr=3.5, min_n=30):
-    g = df.copy()
-    if group_col not in g.columns:
+    if group_col not in df.columns:
         return pd.DataFrame(columns=[group_col,"n","mean","anomalia"])
-    
-    g = g.dropna(subset=[group_col]).copy()
 
     if metric_col == "__tasa__":
-        tasa = infer_rate(g)
+        tasa = infer_rate(df)
         if tasa is None:
             return pd.DataFrame(columns=[group_col,"n","mean","anomalia"])
-        g = g.assign(__tasa__=tasa)
-        metric_col = "__tasa__"
+        if "__tasa__" not in df.columns:
+            df = df.assign(__tasa__=tasa)
 
-    g[metric_col] = pd.to_numeric(g[metric_col], errors="coerce")
-    g = g.dropna(subset=[metric_col])
-    if g.empty:
+    # n y media por grupo desde el cubo compartido (mismo groupby que usan los gráficos)
+    stats = get_cube(df, metric_col).stats(group_col)
+    if stats.empty:
         return pd.DataFrame(columns=[group_col,"n","mean","anomalia"])
 
-    agg = g.groupby(group_col).agg(n=(metric_col,"count"),
-                                  mean=(metric_col,"mean")).reset_index()
+    agg = stats[["count","mean"]].rename(columns={"count":"n"}).reset_index()
+    return _flag_group_anomalies(agg, method, k_iqr, z_thr, mad_thr, min_n)
+
+def _flag_group_anomalies(agg, method, k_iqr, z_thr, mad_thr, min_n):
+    """Aplica la regla IQR / z / MAD sobre las medias por grupo (agg: grupo, n, mean)."""
     agg["anomalia"] = ""
     mask = agg["n"] >= int(min_n)
     s = agg.loc[mask, "mean"].dropna()
@@ -105,30 +183,148 @@ def detect_group_anomalies(df, group_col, metric_col, method="iqr",
     agg.loc[mask & flags, "anomalia"] = "⚠"
     return agg.sort_values("mean", ascending=False).reset_index(drop=True)
 
+def detect_group_anomalies_stream(file_obj, group_col, metric_col, method="iqr",
+                                  k_iqr=1.5, z_thr=2.5, mad_thr=3.5, min_n=30,
+                                  chunksize=STREAM_CHUNK_ROWS):
+    """
+    Variante por trozos de detect_group_anomalies para CSV que no caben en memoria.
+    Lee solo las columnas necesarias, `chunksize` filas a la vez, y acumula por
+    grupo n y suma de la métrica; las reglas se aplican al final sobre las medias
+    por grupo (mismo resultado que la versión en memoria).
+    Memoria: un trozo + una fila por grupo.
+    """
+    empty = pd.DataFrame(columns=[group_col,"n","mean","anomalia"])
+
+    file_obj.seek(0)
+    sample = file_obj.read(SNIFF_BYTES)
+    if isinstance(sample, str):
+        sample = sample.encode("utf-8")
+    encoding, sep = sniff_csv(sample)
+
+    try:
+        totals = _stream_group_totals(file_obj, group_col, metric_col, encoding, sep, chunksize)
+    except UnicodeDecodeError:
+        totals = _stream_group_totals(file_obj, group_col, metric_col, "latin1", sep, chunksize)
+    if totals is None or totals.empty:
+        return empty
+
+    agg = pd.DataFrame({"n": totals["n"], "mean": totals["sum"] / totals["n"]})
+    agg.index.name = group_col
+    agg = agg.reset_index()
+    return _flag_group_anomalies(agg, method, k_iqr, z_thr, mad_thr, min_n)
+
+def _stream_group_totals(file_obj, group_col, metric_col, encoding, sep, chunksize):
+    """Suma y conteo por grupo recorriendo el CSV por trozos (None si faltan columnas)."""
+    file_obj.seek(0)
+    header = pd.read_csv(file_obj, nrows=0, encoding=encoding, sep=sep).columns
+    # __tasa__ exige las columnas de cursos (igual que infer_rate en la versión en memoria)
+    rate_cols = ["cursosaprobados", "cursosmatriculados"]
+    if metric_col == "__tasa__" and "__tasa__" not in header:
+        value_cols = rate_cols
+    else:
+        value_cols = [metric_col]
+    required = value_cols + (rate_cols if metric_col == "__tasa__" else [])
+    if group_col not in header or not set(required).issubset(header):
+        return None
+
+    file_obj.seek(0)
+    # El grupo se lee como texto: si cada trozo infiriera su tipo, la misma clave
+    # saldría como 1 en un trozo y "1" en otro (trozo numérico vs. con texto)
+    reader = pd.read_csv(file_obj, encoding=encoding, sep=sep, chunksize=chunksize,
+                         usecols=list(dict.fromkeys([group_col] + value_cols)),
+                         dtype={group_col: str})
+    totals = None
+    for chunk in reader:
+        if value_cols == [metric_col]:
+            values = pd.to_numeric(chunk[metric_col], errors="coerce")
+        else:
+            values = infer_rate(chunk)
+        frame = pd.DataFrame({"g": chunk[group_col], "v": values}).dropna()
+        part = frame.groupby("g")["v"].agg(n="count", sum="sum")
+        # Se combina con lo acumulado: el tamaño queda acotado por la cardinalidad del grupo
+        totals = part if totals is None else totals.add(part, fill_value=0)
+    if totals is None:
+        return None
+    totals["n"] = totals["n"].astype("int64")
+    # Tipo final del grupo como lo inferiría read_csv con el archivo completo
+    try:
+        totals.index = pd.to_numeric(totals.index)
+    except (ValueError, TypeError):
+        pass
+    return totals.sort_index()
+
+def _numeric_matrix(df, num_cols):
+    """
+    Matriz float32 de las columnas numéricas (la que usa IsolationForest internamente).
+    NaN -> mediana de la columna; si la columna entera es NaN -> 0.
+    """
+    types = get_column_types(df)
+    X = np.empty((len(df), len(num_cols)), dtype=np.float32)
+    for j, c in enumerate(num_cols):
+        col = types.numeric(c).to_numpy(dtype=np.float64, na_value=np.nan)
+        nan = np.isnan(col)
+        if nan.any():
+            med = np.median(col[~nan]) if (~nan).any() else 0.0
+            col = np.where(nan, med, col)
+        X[:, j] = col
+    return X
+
+def _lowest_scores(iso, X, k):
+    """
+    decision_function por trozos en paralelo; conserva solo los k puntajes más bajos.
+    Devuelve (índices de fila, puntajes) sin ordenar.
+    """
+    starts = range(0, len(X), ROW_SCORE_CHUNK)
+
+    def score(start):
+        dec = iso.decision_function(X[start:start + ROW_SCORE_CHUNK])
+        keep = np.argpartition(dec, k - 1)[:k] if len(dec) > k else np.arange(len(dec))
+        return keep + start, dec[keep]
+
+    # El recorrido de los árboles libera el GIL: los hilos escalan con los núcleos
+    workers = min(len(starts), os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(score, starts))
+    else:
+        parts = [score(start) for start in starts]
+
+    idx = np.concatenate([p[0] for p in parts])
+    dec = np.concatenate([p[1] for p in parts])
+    if len(dec) > k:
+        keep = np.argpartition(dec, k - 1)[:k]
+        idx, dec = idx[keep], dec[keep]
+    return idx, dec
+
 def detect_row_anomalies(df, frac=0.02, random_state=42):
+    """
+    Filas atípicas con IsolationForest.
+    - Ajuste sobre una muestra de hasta ROW_FIT_SAMPLE filas (todas si el archivo es menor).
+    - Puntaje (decision_function) una sola vez, por trozos y en paralelo; outlier = puntaje < 0.
+    - Solo se materializan las k filas con menor puntaje, k = max(10, len(df)*frac).
+    """
     num_cols = valid_numeric_cols(df)
     if not num_cols:
         return pd.DataFrame(columns=["_score","_is_outlier"])
 
-    # --- INICIO DE LA CORRECCIÓN PARA EL ERROR DE NaN ---
-    X = df[num_cols].apply(pd.to_numeric, errors="coerce")
-    
-    # Rellena NaN con la mediana de cada columna
-    # Esto es más robusto que ffill/bfill
-    X = X.fillna(X.median())
-    
-    # Si alguna columna entera era NaN, su mediana también será NaN.
-    # Rellenamos esos NaN restantes con 0 para asegurar que no haya ninguno.
-    X = X.fillna(0)
-    # --- FIN DE LA CORRECCIÓN ---
-
-    if X.empty:
+    X = _numeric_matrix(df, num_cols)
+    if X.size == 0:
         return pd.DataFrame(columns=["_score","_is_outlier"])
-        
-    iso = IsolationForest(contamination=float(frac), random_state=random_state)
-    scores = iso.fit_predict(X)
-    dec = iso.decision_function(X)
-    out = df.copy()
+
+    if len(X) > ROW_FIT_SAMPLE:
+        rng = np.random.default_rng(random_state)
+        X_fit = X[np.sort(rng.choice(len(X), ROW_FIT_SAMPLE, replace=False))]
+    else:
+        X_fit = X
+    iso = _isolation_forest(contamination=float(frac), random_state=random_state)
+    iso.fit(X_fit)
+
+    k = min(len(X), max(10, int(len(df)*frac)))
+    idx, dec = _lowest_scores(iso, X, k)
+
+    order = np.lexsort((idx, dec))
+    idx, dec = idx[order], dec[order]
+    out = df.iloc[idx].copy()
     out["_score"] = dec
-    out["_is_outlier"] = (scores == -1).astype(int)
-    return out.sort_values("_score").head(max(10, int(len(df)*frac))).reset_index(drop=True)
\ No newline at end of file
+    out["_is_outlier"] = (dec < 0).astype(int)
+    return out.reset_index(drop=True)
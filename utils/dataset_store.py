@@ -0,0 +1,93 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from config import DATASET_STORE_MAX_BYTES
+
+
+def dataset_id_for(raw_bytes):
+    """ID de dataset = hash del contenido (mismos bytes -> mismo ID)."""
+    return hashlib.sha256(raw_bytes).hexdigest()
+
+
+def _df_nbytes(df):
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+class DatasetStore:
+    """
+    Registro en memoria (por proceso) de DataFrames ya parseados.
+    - Clave: ID de contenido (sha256 de los bytes del CSV).
+    - Acotado por tamaño: cuando se supera max_bytes se expulsan
+      los datasets menos usados recientemente (LRU).
+    Los DataFrames se comparten entre peticiones: quien los use NO debe mutarlos
+    (hacer .copy() / .assign() antes de modificarlos).
+    """
+
+    def __init__(self, max_bytes=DATASET_STORE_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._items = OrderedDict()  # dataset_id -> (df, nbytes)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, dataset_id):
+        with self._lock:
+            return dataset_id in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def get(self, dataset_id):
+        if not dataset_id:
+            return None
+        with self._lock:
+            item = self._items.get(dataset_id)
+            if item is None:
+                return None
+            self._items.move_to_end(dataset_id)
+            return item[0]
+
+    def put(self, dataset_id, df):
+        nbytes = _df_nbytes(df)
+        with self._lock:
+            if dataset_id in self._items:
+                self._total -= self._items.pop(dataset_id)[1]
+            # Un dataset más grande que todo el presupuesto no se guarda
+            if nbytes > self.max_bytes:
+                return df
+            self._items[dataset_id] = (df, nbytes)
+            self._total += nbytes
+            while self._total > self.max_bytes and self._items:
+                _, (_, old_bytes) = self._items.popitem(last=False)
+                self._total -= old_bytes
+        return df
+
+    def get_or_parse(self, raw_bytes, parse):
+        """
+        Devuelve (dataset_id, df). Si los bytes ya fueron subidos antes,
+        se reutiliza el DataFrame sin volver a parsear.
+        `parse` recibe un stream binario y devuelve un DataFrame.
+        """
+        dataset_id = dataset_id_for(raw_bytes)
+        df = self.get(dataset_id)
+        if df is None:
+            df = self.put(dataset_id, parse(io.BytesIO(raw_bytes)))
+        return dataset_id, df
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._total = 0
+
+
+# Instancia única del proceso (compartida por todos los endpoints)
+DATASET_STORE = DatasetStore()
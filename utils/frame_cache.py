@@ -0,0 +1,34 @@
+import threading
+import weakref
+
+# ============================================================
+# ESTADO DERIVADO POR DATAFRAME (cubos, tipos de columna, ...)
+# ============================================================
+# Se asocia a la identidad del DataFrame y se libera junto con él.
+# Los DataFrames compartidos no deben mutarse en sitio (usar .assign()/.copy(),
+# que crean otro objeto y por tanto otro estado).
+
+_frames = {}  # id(df) -> (weakref(df), {clave: valor})
+_lock = threading.RLock()
+
+
+def frame_memo(df, key, factory):
+    """Devuelve el valor `key` asociado a `df`, creándolo con factory() la primera vez."""
+    frame_id = id(df)
+    with _lock:
+        entry = _frames.get(frame_id)
+        if entry is None or entry[0]() is not df:
+            ref = weakref.ref(df, lambda _, frame_id=frame_id: _forget(frame_id))
+            entry = (ref, {})
+            _frames[frame_id] = entry
+        state = entry[1]
+        if key not in state:
+            state[key] = factory()
+        return state[key]
+
+
+def _forget(frame_id):
+    with _lock:
+        entry = _frames.get(frame_id)
+        if entry is not None and entry[0]() is None:
+            del _frames[frame_id]
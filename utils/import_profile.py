@@ -0,0 +1,80 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from config import COLD_START_BUDGET_MS
+
+# ============================================================
+# INFORME DE TIEMPOS DE IMPORTACIÓN (arranque en frío)
+# ============================================================
+# Importa el módulo objetivo en un intérprete nuevo con `python -X importtime`
+# y resume el coste por módulo en ms. Pensado para CI:
+#
+#   python -m utils.import_profile app --budget-ms 1000
+#
+# Sale con código 1 si el import supera el presupuesto o si carga alguno de los
+# módulos que deben quedar para el primer uso (stack científico y Gemini).
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("pandas", "numpy", "matplotlib", "sklearn", "scipy", "PIL", "google.generativeai")
+
+
+def import_times(target="app"):
+    """
+    Lista [(módulo, self_ms, acumulado_ms)] en el orden en que terminó cada import.
+    Se ejecuta en un proceso aparte para medir un arranque limpio.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows
+
+
+def check(rows, target="app", budget_ms=COLD_START_BUDGET_MS, lazy=LAZY_MODULES):
+    """Devuelve (total_ms, lista de problemas) para el presupuesto y los módulos perezosos."""
+    total = next((cum for name, _, cum in rows if name == target), sum(s for _, s, _ in rows))
+    loaded = {name for name, _, _ in rows}
+    problems = []
+    if total > budget_ms:
+        problems.append(f"import {target}: {total:.0f} ms > presupuesto {budget_ms} ms")
+    for mod in lazy:
+        if mod in loaded:
+            problems.append(f"import {target} carga '{mod}' (debe importarse en el primer uso)")
+    return total, problems
+
+
+def format_report(rows, top=15):
+    lines = [f"{'módulo':<50} {'propio ms':>10} {'acum. ms':>10}"]
+    for name, self_ms, cum_ms in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        lines.append(f"{name:<50} {self_ms:>10.1f} {cum_ms:>10.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempos de importación por módulo (arranque en frío).")
+    parser.add_argument("target", nargs="?", default="app")
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--allow", nargs="*", default=[], help="módulos perezosos que sí pueden cargarse")
+    args = parser.parse_args(argv)
+
+    rows = import_times(args.target)
+    total, problems = check(rows, args.target, args.budget_ms,
+                            [m for m in LAZY_MODULES if m not in args.allow])
+    print(format_report(rows, args.top))
+    print(f"\nTotal import {args.target}: {total:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    for problem in problems:
+        print(f"FALLO: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config import JOBS_DB_PATH, JOB_WORKERS, JOB_TTL_SECONDS
+
+# ============================================================
+# COLA DE TRABAJOS ASÍNCRONOS (sin broker externo)
+# ============================================================
+# - Los trabajos se ejecutan en un pool local de hilos (el render pesado
+#   ya va al pool de procesos de utils/render_engine).
+# - El estado vive en SQLite: cualquier worker del servidor puede responder
+#   al polling de progreso, aunque el trabajo corra en otro proceso.
+
+JOB_STATUSES = ("queued", "running", "done", "error")
+JOB_INTERRUPTED = "El servidor se reinició antes de terminar el trabajo; vuelve a intentarlo."
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class Job:
+    """Handle que recibe la función del trabajo para reportar progreso."""
+
+    def __init__(self, queue, job_id, owner=None):
+        self.queue = queue
+        self.id = job_id
+        self.owner = owner
+
+    def set_total(self, total):
+        self.queue._update(self.id, total=int(total))
+
+    def add_image(self, url, caption, index=None):
+        """Publica una imagen terminada (el cliente la ve en el siguiente polling)."""
+        def change(data):
+            data.setdefault("images", []).append({"index": index, "url": url, "caption": caption})
+        self.queue._update(self.id, change=change, increment=True)
+
+    def log(self, message):
+        self.queue._update(self.id, change=lambda data: data.setdefault("log", []).append(message))
+
+
+class JobQueue:
+    def __init__(self, db_path=JOBS_DB_PATH, max_workers=JOB_WORKERS, ttl=JOB_TTL_SECONDS):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._executor = None
+        self._futures = {}  # job_id -> Future de los trabajos de este proceso
+        self._lock = threading.Lock()
+        self._ready = False
+
+    # --- almacenamiento ---
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_db(self):
+        if self._ready:
+            return
+        with self._lock:
+            if not self._ready:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                with self._connect() as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(_SCHEMA)
+                self._ready = True
+
+    def _update(self, job_id, status=None, total=None, change=None, increment=False):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            data = json.loads(row["data"])
+            if change:
+                change(data)
+            conn.execute(
+                "UPDATE jobs SET status = COALESCE(?, status), total = COALESCE(?, total), "
+                "done = done + ?, data = ?, updated_at = ? WHERE id = ?",
+                (status, total, 1 if increment else 0, json.dumps(data), time.time(), job_id),
+            )
+
+    def _purge(self):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'error') AND updated_at < ?",
+                (time.time() - self.ttl,),
+            )
+
+    # --- API ---
+    def submit(self, kind, owner, fn, *args, **kwargs):
+        """
+        Encola fn(job, *args, **kwargs) y devuelve el job_id de inmediato.
+        El valor de retorno de fn (serializable a JSON) queda en 'result'.
+        """
+        self._ensure_db()
+        self._purge()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, owner, kind, status, data, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', '{}', ?, ?)",
+                (job_id, owner, kind, now, now),
+            )
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="job")
+            executor = self._executor
+            future = executor.submit(self._run, job_id, owner, fn, args, kwargs)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._futures.pop(job_id, None))
+        return job_id
+
+    def shutdown(self, timeout=None):
+        """
+        Apagado ordenado (reciclaje del worker): no arranca los trabajos en cola,
+        espera hasta `timeout` s a los que están corriendo y marca como error los
+        que no terminaron, para que el polling no quede esperando para siempre.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures, self._futures = self._futures, {}
+        if executor is None:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        wait(list(futures.values()), timeout=timeout)
+        for job_id, future in futures.items():
+            if not future.done() or future.cancelled():
+                self._update(job_id, status="error",
+                             change=lambda data: data.update(error=JOB_INTERRUPTED))
+
+    def _run(self, job_id, owner, fn, args, kwargs):
+        self._update(job_id, status="running")
+        try:
+            result = fn(Job(self, job_id, owner), *args, **kwargs)
+        except Exception as e:
+            print(f"Error en trabajo {job_id}: {e}\n{traceback.format_exc()}")
+            self._update(job_id, status="error", change=lambda data: data.update(error=str(e)))
+        else:
+            self._update(job_id, status="done", change=lambda data: data.update(result=result))
+
+    def get(self, job_id):
+        """Estado del trabajo como dict (None si no existe o ya expiró)."""
+        self._ensure_db()
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row["data"])
+        return {
+            "job_id": row["id"],
+            "owner": row["owner"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "progress": {"done": row["done"], "total": row["total"]},
+            "images": data.get("images", []),
+            "log": data.get("log", []),
+            "result": data.get("result"),
+            "error": data.get("error"),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def wait(self, job_id, timeout=60, interval=0.05):
+        """Espera a que el trabajo termine (útil en tests y scripts)."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.get(job_id)
+            if job is None or job["status"] in ("done", "error"):
+                return job
+            time.sleep(interval)
+        return self.get(job_id)
+
+
+JOB_QUEUE = JobQueue()
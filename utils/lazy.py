@@ -0,0 +1,26 @@
+import importlib
+import sys
+import types
+
+# ============================================================
+# IMPORTACIÓN PEREZOSA
+# ============================================================
+# pandas, sklearn, matplotlib y google.generativeai tardan segundos en
+# importarse. Un LazyModule ocupa su lugar y hace el import real en el primer
+# acceso a un atributo (importlib ya serializa imports concurrentes).
+
+
+class LazyModule(types.ModuleType):
+    """Representante de un módulo que se importa en el primer uso."""
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self.__name__), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'>"
+
+
+def lazy_import(name):
+    """Devuelve el módulo si ya está cargado; si no, un LazyModule."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
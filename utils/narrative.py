@@ -2,8 +2,8 @@ import pandas as pd
 import numpy as np
 import time
 import os
+import threading
 from PIL import Image
-import google.generativeai as genai
 import json # Importado para el manejo de la estructura JSON de gráficos recomendados
 
 # Importaciones internas
@@ -11,50 +11,114 @@ from .data_processing import read_csv_smart, infer_rate
 from .charts import (
     chart_bar, chart_pie, chart_line, chart_heatmap,
     chart_violin, chart_montana, make_infographic_from_chart,
-    _agg_topn
+    _agg_topn, _agg_line, _agg_cells, montana_density, violin_data
 )
-from config import OUTPUT_DIR, GEMINI_API_KEY
+from .render_engine import render_all
+from .render_cache import RENDER_CACHE, render_key
+from .ai_cache import AI_CACHE, ai_cache_key
+from .lazy import lazy_import
+from config import RENDER_DIR, GEMINI_API_KEY, AI_MODEL_NAME
 
+# El SDK de Gemini (grpc/protobuf) se importa en la primera llamada a la IA
+genai = lazy_import("google.generativeai")
 
-# ============================================================
-# 1) AGENTE DE IA – INSIGHTS CON GEMINI
-# ============================================================
 
-def get_ai_insights(schema_df, anom_df, bar_data_df):
+def _load_df(file):
     """
-    Usa Gemini para generar una historia/insights a partir de:
-    - schema_df: resumen de columnas
-    - anom_df: tabla de anomalías por grupo
-    - bar_data_df: top N grupos (para barras)
-    
-    Ahora incluye lógica para inyectar defaults dinámicos en el prompt
-    y solicita un bloque JSON para la recomendación de gráficos.
+    Acepta un stream CSV o un DataFrame ya parseado (registro de datasets).
+    El DataFrame del registro se devuelve tal cual (sin copia: los memos por
+    id(df) se reutilizan entre peticiones); el código de abajo no lo muta.
     """
+    if isinstance(file, pd.DataFrame):
+        return file
+    return read_csv_smart(file)
 
-    if not GEMINI_API_KEY or GEMINI_API_KEY.strip() == "":
-        return (
-            "**Error: Falta la GEMINI_API_KEY en `config.py`.**\n"
-            "No se pudo contactar al agente de IA."
-        )
 
-    try:
-        # Configurar API con tu clave
-        genai.configure(api_key=GEMINI_API_KEY)
-
-        # 🔥 Modelo que tu clave SÍ tiene habilitado (según listar_modelos.py)
-        # En list_models aparece como: models/gemini-2.5-pro
-        model = genai.GenerativeModel("gemini-2.5-pro")
+def make_render_spec(chart, args, kwargs, *, title, subtitle, footer, theme, simple_mode,
+                     name, timestamp, dataset_id=None, key_params=None, plot_params=None):
+    """
+    Spec para utils.render_engine.render_all.
+    Con dataset_id el PNG es direccionado por contenido (caché de render):
+    mismo dataset + mismo gráfico/columnas/tema/modo/top_n/títulos -> mismo archivo.
+    Con plot_params (lo que determina los datos del gráfico) se guarda además el
+    gráfico sin títulos (plot_key), reutilizable por otra spec con los mismos datos
+    y distinto título/subtítulo.
+    Sin dataset_id se usa el nombre con timestamp de siempre.
+    """
+    kwargs = dict(kwargs, theme=theme, simple=simple_mode)
+    spec = {
+        "chart": chart, "args": args, "kwargs": kwargs,
+        "title": title, "subtitle": subtitle, "footer": footer, "theme": theme,
+    }
+    if dataset_id:
+        spec["cache_key"] = render_key(
+            dataset=dataset_id, chart=chart, kwargs=kwargs, params=key_params or {},
+            title=title, subtitle=subtitle, footer=footer, theme=theme,
+        )
+        spec["out_path"] = RENDER_CACHE.path_for(name, spec["cache_key"])
+        if plot_params is not None:
+            spec["plot_key"] = render_key(
+                layer="plot", dataset=dataset_id, chart=chart, kwargs=kwargs, params=plot_params,
+            )
+            spec["plot_path"] = RENDER_CACHE.path_for(f"plot_{chart}", spec["plot_key"])
+    else:
+        spec["out_path"] = os.path.abspath(f"{RENDER_DIR}/{name}_{timestamp}.png")
+    return spec
 
-        # Pasar dataframes a Markdown
-        schema_md = schema_df.to_markdown(index=False)
-        anom_md = anom_df.to_markdown(index=False)
-        bar_md = bar_data_df.reset_index().to_markdown(index=False)
 
-        # Obtener valores por defecto para el prompt (dinámico)
-        group_col_default = bar_data_df.index.name or "estructuraalumno" 
-        metric_col_default = bar_data_df.name or "__tasa__"
+# ============================================================
+# 1) AGENTE DE IA – INSIGHTS CON GEMINI
+# ============================================================
 
-        prompt = f"""
+# Cliente del modelo: se crea una sola vez (en el primer uso) y se reutiliza.
+# set_ai_model() permite inyectar un modelo local/falso (tests, modo offline).
+_ai_model = None
+_ai_model_factory = None
+_ai_model_lock = threading.Lock()
+_INJECTED = object()
+
+
+def set_ai_model(model):
+    """Inyecta un modelo con .generate_content(prompt).text; None vuelve a Gemini."""
+    global _ai_model, _ai_model_factory
+    with _ai_model_lock:
+        _ai_model = model
+        _ai_model_factory = _INJECTED if model is not None else None
+
+
+def _get_ai_model():
+    global _ai_model, _ai_model_factory
+    with _ai_model_lock:
+        if _ai_model_factory is _INJECTED:
+            return _ai_model
+        if _ai_model is None or _ai_model_factory is not genai.GenerativeModel:
+            # Configurar API con tu clave
+            genai.configure(api_key=GEMINI_API_KEY)
+            # 🔥 Modelo que tu clave SÍ tiene habilitado (según listar_modelos.py)
+            # En list_models aparece como: models/gemini-2.5-pro
+            _ai_model = genai.GenerativeModel(AI_MODEL_NAME)
+            _ai_model_factory = genai.GenerativeModel
+        return _ai_model
+
+
+def _ai_model_id(model):
+    """Identidad del modelo para la clave de caché (un modelo falso nunca comparte respuestas con Gemini)."""
+    name = getattr(model, "model_name", None) or getattr(model, "name", None) or AI_MODEL_NAME
+    return f"{type(model).__module__}.{type(model).__qualname__}:{name}"
+
+
+def _build_insights_prompt(schema_df, anom_df, bar_data_df):
+    """Prompt determinista (misma entrada -> mismo texto, base de la clave de caché)."""
+    # Pasar dataframes a Markdown
+    schema_md = schema_df.to_markdown(index=False)
+    anom_md = anom_df.to_markdown(index=False)
+    bar_md = bar_data_df.reset_index().to_markdown(index=False)
+
+    # Obtener valores por defecto para el prompt (dinámico)
+    group_col_default = bar_data_df.index.name or "estructuraalumno" 
+    metric_col_default = getattr(bar_data_df, "name", None) or "__tasa__"
+
+    prompt = f"""
         Eres un analista de datos senior.
 
         A continuación tienes el resultado de analizar un dataset:
@@ -105,14 +169,146 @@ def get_ai_insights(schema_df, anom_df, bar_data_df):
         ]
         ```
         """
+    return prompt
+
+
+def get_ai_insights(schema_df, anom_df, bar_data_df):
+    """
+    Usa Gemini para generar una historia/insights a partir de:
+    - schema_df: resumen de columnas
+    - anom_df: tabla de anomalías por grupo
+    - bar_data_df: top N grupos (para barras)
+    
+    Ahora incluye lógica para inyectar defaults dinámicos en el prompt
+    y solicita un bloque JSON para la recomendación de gráficos.
+    Las respuestas se guardan en caché por (modelo, prompt) con TTL.
+    """
 
-        response = model.generate_content(prompt)
-        return response.text
+    if not GEMINI_API_KEY or GEMINI_API_KEY.strip() == "":
+        return (
+            "**Error: Falta la GEMINI_API_KEY en `config.py`.**\n"
+            "No se pudo contactar al agente de IA."
+        )
+
+    try:
+        model = _get_ai_model()
+
+        prompt = _build_insights_prompt(schema_df, anom_df, bar_data_df)
+
+
+        # Mismo prompt + mismo modelo -> misma respuesta (caché con TTL, una sola llamada en vuelo)
+        return AI_CACHE.get_or_compute(
+            ai_cache_key(_ai_model_id(model), prompt),
+            lambda: model.generate_content(prompt).text,
+        )
 
     except Exception as e:
         return f"**Error contactando a Gemini:** `{e}`"
 
 
+def stream_ai_insights(schema_df, anom_df, bar_data_df):
+    """
+    Igual que get_ai_insights pero entrega el texto por trozos a medida que
+    el modelo lo genera (mismo prompt, misma caché). Los errores se entregan
+    como un último trozo de texto, igual que en la versión completa.
+    """
+    if not GEMINI_API_KEY or GEMINI_API_KEY.strip() == "":
+        yield (
+            "**Error: Falta la GEMINI_API_KEY en `config.py`.**\n"
+            "No se pudo contactar al agente de IA."
+        )
+        return
+
+    try:
+        model = _get_ai_model()
+        prompt = _build_insights_prompt(schema_df, anom_df, bar_data_df)
+
+        def stream():
+            for chunk in model.generate_content(prompt, stream=True):
+                yield chunk.text
+
+        yield from AI_CACHE.stream_or_compute(ai_cache_key(_ai_model_id(model), prompt), stream)
+    except Exception as e:
+        yield f"**Error contactando a Gemini:** `{e}`"
+
+
+CHARTS_RECO_OPEN = "```charts_reco"
+CHARTS_RECO_CLOSE = "```"
+
+
+class ChartsRecoStreamParser:
+    """
+    Separa, sobre la marcha, la historia del bloque ```charts_reco [...] ```.
+    feed(texto) devuelve eventos ("story", texto) / ("charts", lista); el bloque
+    JSON se interpreta en cuanto se cierra, aunque la historia siga llegando.
+    close() vacía lo pendiente al terminar el stream.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_block = False
+        self.charts = None  # lista de recomendaciones (None hasta cerrar el bloque)
+        self.story = []     # trozos de historia ya emitidos
+
+    def _story(self, text):
+        if text:
+            self.story.append(text)
+            return [("story", text)]
+        return []
+
+    def feed(self, text):
+        self._buffer += text
+        events = []
+        while True:
+            if not self._in_block:
+                start = self._buffer.find(CHARTS_RECO_OPEN) if self.charts is None else -1
+                if start < 0:
+                    # Se retiene un posible inicio parcial del marcador (p. ej. "```cha")
+                    keep = 0
+                    if self.charts is None:
+                        for k in range(min(len(CHARTS_RECO_OPEN) - 1, len(self._buffer)), 0, -1):
+                            if CHARTS_RECO_OPEN.startswith(self._buffer[-k:]):
+                                keep = k
+                                break
+                    cut = len(self._buffer) - keep
+                    events += self._story(self._buffer[:cut])
+                    self._buffer = self._buffer[cut:]
+                    return events
+                events += self._story(self._buffer[:start])
+                self._buffer = self._buffer[start + len(CHARTS_RECO_OPEN):]
+                self._in_block = True
+            else:
+                end = self._buffer.find(CHARTS_RECO_CLOSE)
+                if end < 0:
+                    return events
+                events.append(("charts", self._parse(self._buffer[:end])))
+                self._buffer = self._buffer[end + len(CHARTS_RECO_CLOSE):]
+                self._in_block = False
+
+    def close(self):
+        events = []
+        if self._in_block:
+            # Bloque sin cerrar: se intenta igual
+            events.append(("charts", self._parse(self._buffer)))
+        else:
+            events += self._story(self._buffer)
+        self._buffer = ""
+        self._in_block = False
+        return events
+
+    def _parse(self, json_str):
+        json_str = json_str.strip()
+        try:
+            charts = json.loads(json_str)
+            if not isinstance(charts, list):
+                raise json.JSONDecodeError("no es una lista", json_str, 0)
+        except json.JSONDecodeError:
+            print(f"Error parsing AI chart recommendation JSON: {json_str}")
+            charts = []
+        self.charts = charts
+        return charts
+
+
 # ============================================================
 # 2) GENERADOR DE PLANTILLAS
 # ============================================================
@@ -132,7 +328,7 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
     if not chart_types:
         return [], "Selecciona al menos 1 tipo de gráfico.", []
 
-    df = read_csv_smart(file).copy()
+    df = _load_df(file)
 
     # Procesar métrica __tasa__ si aplica
     if metric_col == "__tasa__":
@@ -142,12 +338,6 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
         df = df.assign(__tasa__=tasa)
         metric_col = "__tasa__"
 
-    SAMPLE_LIMIT = 30000
-    if len(df) > SAMPLE_LIMIT:
-        df_sampled = df.sample(SAMPLE_LIMIT, random_state=42)
-    else:
-        df_sampled = df
-
     saved, gallery, msgs = [], [], []
     # FIX/ENHANCEMENT: Use dynamic titles based on metric/group, not fixed defaults
     title = custom_title or f"Infografía: Análisis de {metric_col}" 
@@ -166,7 +356,7 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
         if "Barras" in chart_types:
             agg_bar = agg / agg.sum() if normalize and agg.sum() > 0 else agg
             fig = chart_bar(agg_bar, theme=theme, ylabel=metric_col, simple=simple_mode)
-            pth = f"{OUTPUT_DIR}/templ_bar_{timestamp}.png"
+            pth = f"{RENDER_DIR}/templ_bar_{timestamp}.png"
             make_infographic_from_chart(
                 fig, title,
                 f"Distribución Top {len(agg)} por {group_col}",
@@ -179,7 +369,7 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
         if "Pastel" in chart_types:
             agg_pie = _agg_topn(df, group_col, metric_col, top_n=int(top_n), normalize=True)
             fig = chart_pie(agg_pie, theme=theme, simple=simple_mode)
-            pth = f"{OUTPUT_DIR}/templ_pie_{timestamp}.png"
+            pth = f"{RENDER_DIR}/templ_pie_{timestamp}.png"
             make_infographic_from_chart(
                 fig, title,
                 f"Distribución proporcional de {group_col}",
@@ -197,7 +387,7 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
             msgs.append("⚠ No se pudo crear Líneas: revisa 'Eje X' y 'Eje Y'.")
         else:
             fig = chart_line(df, x_col=line_x, y_col=line_y, theme=theme, simple=simple_mode)
-            pth = f"{OUTPUT_DIR}/templ_line_{timestamp}.png"
+            pth = f"{RENDER_DIR}/templ_line_{timestamp}.png"
             make_infographic_from_chart(
                 fig, title,
                 f"Tendencia de {line_y} a lo largo de {line_x}",
@@ -222,7 +412,7 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
                 theme=theme,
                 simple=simple_mode
             )
-            pth = f"{OUTPUT_DIR}/templ_heat_{timestamp}.png"
+            pth = f"{RENDER_DIR}/templ_heat_{timestamp}.png"
             make_infographic_from_chart(
                 fig, title,
                 f"Concentración media de {metric_col} por {heatmap_row} y {heatmap_col}",
@@ -240,14 +430,14 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
             msgs.append("⚠ No se pudo crear Violín: revisa 'Agrupar por' y 'Métrica'.")
         else:
             fig = chart_violin(
-                df_sampled,
+                df,
                 group_col=group_col,
                 metric_col=metric_col,
                 theme=theme,
                 simple=simple_mode,
                 top_n=int(top_n)
             )
-            pth = f"{OUTPUT_DIR}/templ_violin_{timestamp}.png"
+            pth = f"{RENDER_DIR}/templ_violin_{timestamp}.png"
             make_infographic_from_chart(
                 fig, title,
                 f"Distribución de {metric_col} en los grupos Top {int(top_n)}",
@@ -264,8 +454,8 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
         if metric_col not in df.columns:
             msgs.append("⚠ No se pudo crear Montaña: revisa 'Métrica'.")
         else:
-            fig = chart_montana(df_sampled, metric_col=metric_col, theme=theme, simple=simple_mode)
-            pth = f"{OUTPUT_DIR}/templ_montana_{timestamp}.png"
+            fig = chart_montana(df, metric_col=metric_col, theme=theme, simple=simple_mode)
+            pth = f"{RENDER_DIR}/templ_montana_{timestamp}.png"
             make_infographic_from_chart(
                 fig, title,
                 f"Distribución de densidad de {metric_col}",
@@ -282,23 +472,96 @@ def generate_templates_from_csv(file, chart_types, theme, group_col, metric_col,
     return gallery, log, saved
 
 
+# ============================================================
+# 2b) GRÁFICOS DE SOPORTE RECOMENDADOS POR LA IA
+# ============================================================
+
+AI_CHART_FOOTER = "Fuente: dataset cargado · © Tu Proyecto"
+
+
+def build_ai_chart_spec(df, chart_type, *, group_col, metric_col, line_x, line_y,
+                        heatmap_row, heatmap_col, theme, simple_mode, top_n, title, subtitle,
+                        name, timestamp, dataset_id=None):
+    """
+    Prepara la spec de render de un gráfico recomendado por la IA
+    ("Barras", "Pastel", "Líneas", "Heatmap", "Violín" o "Montaña").
+    Devuelve None si faltan columnas o no hay datos suficientes.
+    """
+    cols = df.columns
+    chart, args, kwargs = None, None, {}
+    plot_params = None  # parámetros que, junto con kwargs, determinan los datos del gráfico
+
+    if chart_type == "Barras":
+        if group_col in cols and metric_col in cols:
+            agg = _agg_topn(df, group_col, metric_col, top_n=top_n)
+            if not agg.empty:
+                chart, args, kwargs = "bar", (agg,), {"ylabel": metric_col}
+                plot_params = {"group_col": group_col, "top_n": top_n}
+    elif chart_type == "Pastel":
+        if group_col in cols and metric_col in cols:
+            agg = _agg_topn(df, group_col, metric_col, top_n=top_n, normalize=True)
+            if not agg.empty:
+                chart, args = "pie", (agg,)
+                plot_params = {"group_col": group_col, "metric_col": metric_col, "top_n": top_n}
+    elif chart_type == "Líneas":
+        # For lines, ensure line_y (metric) is available
+        line_y = line_y if line_y in cols else metric_col
+        if line_x in cols and line_y in cols:
+            chart, args, kwargs = "line", (_agg_line(df, line_x, line_y),), {"x_col": line_x, "y_col": line_y}
+            plot_params = {}
+    elif chart_type == "Heatmap":
+        if heatmap_row in cols and heatmap_col in cols and metric_col in cols:
+            try:
+                heat_data = _agg_cells(df, heatmap_row, heatmap_col, metric_col).reset_index()
+            except Exception:
+                heat_data = pd.DataFrame(columns=[heatmap_row, heatmap_col, metric_col])
+            chart, args = "heatmap", (heat_data,)
+            kwargs = {"row_col": heatmap_row, "col_col": heatmap_col, "metric_col": metric_col}
+            plot_params = {}
+    elif chart_type == "Violín":
+        if group_col in cols and metric_col in cols:
+            chart, args = "violin", (violin_data(df, group_col, metric_col, top_n),)
+            kwargs = {"group_col": group_col, "metric_col": metric_col, "top_n": top_n}
+            plot_params = {}
+    elif chart_type == "Montaña":
+        if metric_col in cols:
+            chart, args, kwargs = "montana", (montana_density(df, metric_col),), {"metric_col": metric_col}
+            plot_params = {}
+
+    if chart is None:
+        return None
+
+    return make_render_spec(
+        chart, args, kwargs, title=title, subtitle=subtitle, footer=AI_CHART_FOOTER,
+        theme=theme, simple_mode=simple_mode, name=name, timestamp=timestamp,
+        dataset_id=dataset_id, plot_params=plot_params,
+        key_params={"group_col": group_col, "metric_col": metric_col, "line_x": line_x,
+                    "line_y": line_y, "heatmap_row": heatmap_row, "heatmap_col": heatmap_col,
+                    "top_n": top_n},
+    )
+
+
 # ============================================================
 # 3) SECUENCIA NATIVA DE 6 PASOS
 # ============================================================
 
 def generate_native_sequence_6steps(file, theme, group_col, metric_col,
                                     heatmap_row, heatmap_col, line_x, line_y,
-                                    top_n, normalize, title, subtitle, simple_mode):
+                                    top_n, normalize, title, subtitle, simple_mode,
+                                    dataset_id=None, on_step=None):
     """
     Genera la secuencia de 6 pasos (barras, pastel, líneas, heatmap, violín, montaña).
     Se ha actualizado la lógica de títulos para ser más dinámica.
+    `file` puede ser un stream CSV o un DataFrame ya parseado; con `dataset_id`
+    los pasos ya renderizados antes se sirven desde el caché de render.
+    on_step(i, ruta, caption) se llama a medida que termina cada paso.
     Devuelve:
         - gallery_items: lista de (PIL.Image, texto)
         - log: mensaje breve
         - saved_paths: rutas absolutas de los PNG generados
         - captions: textos para mostrar en frontend
     """
-    df = read_csv_smart(file).copy()
+    df = _load_df(file)
 
     # Procesar __tasa__ si corresponde
     if metric_col == "__tasa__":
@@ -308,13 +571,6 @@ def generate_native_sequence_6steps(file, theme, group_col, metric_col,
         df = df.assign(__tasa__=tasa)
         metric_col = "__tasa__"
 
-    SAMPLE_LIMIT = 30000
-    if len(df) > SAMPLE_LIMIT:
-        df_sampled = df.sample(SAMPLE_LIMIT, random_state=42)
-    else:
-        df_sampled = df
-
-    saved_paths, gallery_items, captions = [], [], []
     footer = "Fuente: dataset cargado · © Tu Proyecto"
     
     # FIX/ENHANCEMENT: Dynamic Titles
@@ -324,49 +580,54 @@ def generate_native_sequence_6steps(file, theme, group_col, metric_col,
     
     timestamp = int(time.time() * 1000)
 
-    # Paso 1: Barras
+    # Datos compartidos: se agregan una sola vez y cada paso recibe solo lo que
+    # necesita (series agregadas o resúmenes de densidad), listo para enviar al pool.
     agg = _agg_topn(df, group_col, metric_col, top_n=int(top_n), normalize=False)
-    fig = chart_bar(agg, theme=theme, ylabel=metric_col, simple=simple_mode)
-    p1 = f"{OUTPUT_DIR}/seq_01_barras_{timestamp}.png"
-    make_infographic_from_chart(fig, dynamic_title, f"Paso 1 · Top {len(agg)} por {group_col}", footer, theme, p1)
-    gallery_items.append((Image.open(p1).convert("RGB"), "Paso 1: Barras"))
-    saved_paths.append(os.path.abspath(p1)); captions.append("Paso 1: Barras")
-
-    # Paso 2: Pastel
-    agg_pie = _agg_topn(df, group_col, metric_col, top_n=int(top_n), normalize=True)
-    fig = chart_pie(agg_pie, theme=theme, simple=simple_mode)
-    p2 = f"{OUTPUT_DIR}/seq_02_pastel_{timestamp}.png"
-    make_infographic_from_chart(fig, dynamic_title, f"Paso 2 · Distribución {group_col}", footer, theme, p2)
-    gallery_items.append((Image.open(p2).convert("RGB"), "Paso 2: Pastel"))
-    saved_paths.append(os.path.abspath(p2)); captions.append("Paso 2: Pastel")
-
-    # Paso 3: Líneas
-    fig = chart_line(df, x_col=line_x, y_col=line_y, theme=theme, simple=simple_mode)
-    p3 = f"{OUTPUT_DIR}/seq_03_lineas_{timestamp}.png"
-    make_infographic_from_chart(fig, dynamic_title, f"Paso 3 · {line_x} vs {line_y}", footer, theme, p3)
-    gallery_items.append((Image.open(p3).convert("RGB"), "Paso 3: Líneas"))
-    saved_paths.append(os.path.abspath(p3)); captions.append("Paso 3: Líneas")
-
-    # Paso 4: Heatmap
-    fig = chart_heatmap(df, row_col=heatmap_row, col_col=heatmap_col, metric_col=metric_col, theme=theme, simple=simple_mode)
-    p4 = f"{OUTPUT_DIR}/seq_04_heatmap_{timestamp}.png"
-    make_infographic_from_chart(fig, dynamic_title, f"Paso 4 · {heatmap_row} × {heatmap_col}", footer, theme, p4)
-    gallery_items.append((Image.open(p4).convert("RGB"), "Paso 4: Heatmap"))
-    saved_paths.append(os.path.abspath(p4)); captions.append("Paso 4: Heatmap")
-
-    # Paso 5: Violín
-    fig = chart_violin(df_sampled, group_col=group_col, metric_col=metric_col, theme=theme, simple=simple_mode, top_n=int(top_n))
-    p5 = f"{OUTPUT_DIR}/seq_05_violin_{timestamp}.png"
-    make_infographic_from_chart(fig, dynamic_title, f"Paso 5 · Distribución por {group_col}", footer, theme, p5)
-    gallery_items.append((Image.open(p5).convert("RGB"), "Paso 5: Violín"))
-    saved_paths.append(os.path.abspath(p5)); captions.append("Paso 5: Violín")
-
-    # Paso 6: Montaña
-    fig = chart_montana(df_sampled, metric_col=metric_col, theme=theme, simple=simple_mode)
-    p6 = f"{OUTPUT_DIR}/seq_06_montana_{timestamp}.png"
-    make_infographic_from_chart(fig, dynamic_title, f"Paso 6 · Distribución de {metric_col}", footer, theme, p6)
-    gallery_items.append((Image.open(p6).convert("RGB"), "Paso 6: Montaña"))
-    saved_paths.append(os.path.abspath(p6)); captions.append("Paso 6: Montaña")
+    agg_pie = agg / agg.sum() if agg.sum() > 0 else agg
+    line_data = _agg_line(df, line_x, line_y)
+    try:
+        heat_data = _agg_cells(df, heatmap_row, heatmap_col, metric_col).reset_index()
+    except Exception:
+        heat_data = pd.DataFrame(columns=[heatmap_row, heatmap_col, metric_col])
+    # Violín y Montaña: densidades sobre la columna completa (solo el resumen viaja al worker)
+    violin_inputs = violin_data(df, group_col, metric_col, top_n=int(top_n))
+    montana_data = montana_density(df, metric_col)
+
+    key_params = {
+        "group_col": group_col, "metric_col": metric_col, "line_x": line_x, "line_y": line_y,
+        "heatmap_row": heatmap_row, "heatmap_col": heatmap_col, "top_n": int(top_n),
+    }
+
+    def spec(chart, args, kwargs, subt, name):
+        return make_render_spec(
+            chart, args, kwargs, title=dynamic_title, subtitle=subt, footer=footer,
+            theme=theme, simple_mode=simple_mode, name=name, timestamp=timestamp,
+            dataset_id=dataset_id, key_params=key_params,
+        )
+
+    specs = [
+        # Paso 1: Barras
+        spec("bar", (agg,), {"ylabel": metric_col}, f"Paso 1 · Top {len(agg)} por {group_col}", "seq_01_barras"),
+        # Paso 2: Pastel
+        spec("pie", (agg_pie,), {}, f"Paso 2 · Distribución {group_col}", "seq_02_pastel"),
+        # Paso 3: Líneas
+        spec("line", (line_data,), {"x_col": line_x, "y_col": line_y}, f"Paso 3 · {line_x} vs {line_y}", "seq_03_lineas"),
+        # Paso 4: Heatmap
+        spec("heatmap", (heat_data,), {"row_col": heatmap_row, "col_col": heatmap_col, "metric_col": metric_col},
+             f"Paso 4 · {heatmap_row} × {heatmap_col}", "seq_04_heatmap"),
+        # Paso 5: Violín
+        spec("violin", (violin_inputs,), {"group_col": group_col, "metric_col": metric_col, "top_n": int(top_n)},
+             f"Paso 5 · Distribución por {group_col}", "seq_05_violin"),
+        # Paso 6: Montaña
+        spec("montana", (montana_data,), {"metric_col": metric_col}, f"Paso 6 · Distribución de {metric_col}", "seq_06_montana"),
+    ]
+    captions = ["Paso 1: Barras", "Paso 2: Pastel", "Paso 3: Líneas",
+                "Paso 4: Heatmap", "Paso 5: Violín", "Paso 6: Montaña"]
+
+    # Render en paralelo (pool de procesos); las rutas vuelven en orden de paso
+    on_done = (lambda i, path: on_step(i, path, captions[i])) if on_step else None
+    saved_paths = render_all(specs, on_done=on_done)
+    gallery_items = [(Image.open(p).convert("RGB"), c) for p, c in zip(saved_paths, captions)]
 
     log = "Secuencia nativa generada (6 pasos)."
-    return gallery_items, log, saved_paths, captions
\ No newline at end of file
+    return gallery_items, log, saved_paths, captions
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from config import (
+    USER_OUTPUT_DIR, OUTPUT_MAX_AGE_SECONDS, OUTPUT_USER_MAX_BYTES,
+    OUTPUT_TOTAL_MAX_BYTES, OUTPUT_SWEEP_INTERVAL_SECONDS,
+)
+from .render_cache import RENDER_CACHE
+
+# ============================================================
+# IMÁGENES PUBLICADAS POR USUARIO (+ RETENCIÓN)
+# ============================================================
+# - Cada usuario tiene su carpeta OUTPUT_DIR/users/<id>/ (id = hash del nombre)
+#   con un manifest.json {nombre: {created_at, bytes}}. /output_images y
+#   /download_zip solo leen de la carpeta del usuario de la sesión.
+# - Publicar = enlace duro al PNG del caché de render (sin copiar bytes; copia
+#   si el sistema de archivos no admite enlaces). Si el caché expulsa el PNG,
+#   la copia del usuario sigue disponible hasta que la retira el barrido.
+# - El barrido (sweep, en un hilo de fondo) aplica: antigüedad máxima, bytes
+#   máximos por usuario y bytes máximos en total (borra primero lo más antiguo).
+#   También caduca por antigüedad el caché de render (a través de RENDER_CACHE,
+#   para que su índice y sus bytes sigan al día). Los PNG planos antiguos de
+#   OUTPUT_DIR no se tocan.
+# - El directorio manda: si otro proceso publicó sin llegar a escribir el
+#   manifest, el archivo se incorpora con su mtime en el siguiente barrido.
+
+MANIFEST_NAME = "manifest.json"
+
+
+def namespace_id(username):
+    """Nombre de la carpeta del usuario (no expone el nombre en la ruta)."""
+    return hashlib.sha256(str(username).encode("utf-8")).hexdigest()[:16]
+
+
+class OutputStore:
+    def __init__(self, root=USER_OUTPUT_DIR, max_age=OUTPUT_MAX_AGE_SECONDS,
+                 user_max_bytes=OUTPUT_USER_MAX_BYTES, total_max_bytes=OUTPUT_TOTAL_MAX_BYTES,
+                 render_cache=RENDER_CACHE):
+        self.root = root
+        self.max_age = max_age
+        self.user_max_bytes = int(user_max_bytes)
+        self.total_max_bytes = int(total_max_bytes)
+        self.render_cache = render_cache
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def user_dir(self, username):
+        return os.path.abspath(os.path.join(self.root, namespace_id(username)))
+
+    # --- Manifest ---
+    def _read_manifest(self, ns_dir):
+        try:
+            with open(os.path.join(ns_dir, MANIFEST_NAME), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"files": {}}
+
+    def _write_manifest(self, ns_dir, manifest):
+        path = os.path.join(ns_dir, MANIFEST_NAME)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _reconcile(self, ns_dir):
+        """Manifest alineado con el directorio (altas de otros procesos, borrados externos)."""
+        manifest = self._read_manifest(ns_dir)
+        files = {}
+        for entry in os.scandir(ns_dir):
+            if not entry.name.lower().endswith(".png") or not entry.is_file():
+                continue
+            st = entry.stat()
+            known = manifest["files"].get(entry.name) or {}
+            files[entry.name] = {"created_at": known.get("created_at", st.st_mtime), "bytes": st.st_size}
+        manifest["files"] = files
+        return manifest
+
+    # --- API ---
+    def publish(self, username, path):
+        """Pone el PNG en la carpeta del usuario y devuelve su nombre (para /output_images/<nombre>)."""
+        ns_dir = self.user_dir(username)
+        name = os.path.basename(path)
+        dest = os.path.join(ns_dir, name)
+        os.makedirs(ns_dir, exist_ok=True)
+        if not os.path.exists(dest):
+            try:
+                os.link(path, dest)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copyfile(path, dest)
+        # El enlace comparte el mtime del original: se renueva para el barrido
+        os.utime(dest)
+        with self._lock:
+            manifest = self._read_manifest(ns_dir)
+            manifest["owner"] = username
+            manifest["files"][name] = {"created_at": time.time(), "bytes": os.path.getsize(dest)}
+            self._write_manifest(ns_dir, manifest)
+        return name
+
+    def resolve(self, username, filename):
+        """Ruta del PNG si pertenece al usuario; None si no existe o es una ruta ajena."""
+        name = os.path.basename(filename or "")
+        if not name or name != filename or not name.lower().endswith(".png"):
+            return None
+        path = os.path.join(self.user_dir(username), name)
+        return path if os.path.isfile(path) else None
+
+    def paths(self, username, names):
+        """Rutas de los PNG existentes del usuario, en el orden dado."""
+        resolved = (self.resolve(username, name) for name in names)
+        return [p for p in resolved if p is not None]
+
+    def files(self, username):
+        """Entradas del manifest del usuario {nombre: {created_at, bytes}}."""
+        ns_dir = self.user_dir(username)
+        if not os.path.isdir(ns_dir):
+            return {}
+        with self._lock:
+            return self._reconcile(ns_dir)["files"]
+
+    # --- Retención ---
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def sweep(self, now=None):
+        """Aplica antigüedad, cuota por usuario y cuota total. Devuelve contadores."""
+        now = time.time() if now is None else now
+        stats = {"removed": 0, "freed_bytes": 0, "namespaces": 0, "bytes": 0}
+
+        def drop(ns_dir, manifest, name):
+            stats["freed_bytes"] += self._remove(os.path.join(ns_dir, name))
+            stats["removed"] += 1
+            manifest["files"].pop(name)
+
+        with self._lock:
+            namespaces = {}
+            if os.path.isdir(self.root):
+                for entry in os.scandir(self.root):
+                    if entry.is_dir():
+                        namespaces[entry.path] = self._reconcile(entry.path)
+
+            survivors = []  # (created_at, ns_dir, nombre, bytes)
+            for ns_dir, manifest in namespaces.items():
+                by_age = sorted(manifest["files"].items(), key=lambda kv: kv[1]["created_at"])
+                used = sum(meta["bytes"] for _, meta in by_age)
+                for name, meta in by_age:
+                    if now - meta["created_at"] > self.max_age or used > self.user_max_bytes:
+                        used -= meta["bytes"]
+                        drop(ns_dir, manifest, name)
+                    else:
+                        survivors.append((meta["created_at"], ns_dir, name, meta["bytes"]))
+
+            total = sum(item[3] for item in survivors)
+            for _, ns_dir, name, size in sorted(survivors):
+                if total <= self.total_max_bytes:
+                    break
+                total -= size
+                drop(ns_dir, namespaces[ns_dir], name)
+
+            for ns_dir, manifest in namespaces.items():
+                if manifest["files"]:
+                    self._write_manifest(ns_dir, manifest)
+                    stats["namespaces"] += 1
+                else:
+                    self._remove(os.path.join(ns_dir, MANIFEST_NAME))
+                    try:
+                        os.rmdir(ns_dir)
+                    except OSError:
+                        pass
+            stats["bytes"] = total
+
+        # Caché de render (se repuebla solo). La copia publicada de un usuario es
+        # otro enlace al mismo archivo y no se toca.
+        if self.render_cache is not None:
+            removed, freed = self.render_cache.expire(self.max_age, now=now)
+            stats["removed"] += removed
+            stats["freed_bytes"] += freed
+        return stats
+
+    def start_sweeper(self, interval=OUTPUT_SWEEP_INTERVAL_SECONDS):
+        """Barrido periódico en un hilo de fondo (uno por proceso)."""
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return self._sweeper
+            self._stop.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, args=(interval,),
+                                             name="output-sweeper", daemon=True)
+            self._sweeper.start()
+            return self._sweeper
+
+    def stop_sweeper(self, timeout=None):
+        self._stop.set()
+        sweeper, self._sweeper = self._sweeper, None
+        if sweeper is not None:
+            sweeper.join(timeout)
+
+    def _sweep_loop(self, interval):
+        while not self._stop.is_set():
+            try:
+                stats = self.sweep()
+                if stats["removed"]:
+                    print(f"Barrido de imágenes: {stats['removed']} archivos, "
+                          f"{stats['freed_bytes'] / 1024 / 1024:.1f} MB liberados")
+            except Exception as e:
+                print(f"Error en el barrido de imágenes: {e}")
+            self._stop.wait(interval)
+
+
+OUTPUT_STORE = OutputStore()
@@ -0,0 +1,173 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import sys
+import time
+
+from config import PASSWORD_HASHER, SCRYPT_N, SCRYPT_R, SCRYPT_P, PBKDF2_ITERATIONS
+
+# ============================================================
+# HASH DE CONTRASEÑAS (KDF con sal y coste configurable)
+# ============================================================
+# Formato almacenado:  <algoritmo>$<parámetros>$<sal b64>$<hash b64>
+#   scrypt$16384,8,1$...$...      (memoria: 128·r·N bytes por login)
+#   pbkdf2_sha256$600000$...$...
+# Los hashes antiguos (SHA-256 hex sin sal) se siguen aceptando y se rehashean
+# en el siguiente login correcto (needs_rehash). La comparación es siempre en
+# tiempo constante (hmac.compare_digest).
+#
+# Calibración del coste en el hardware de producción:
+#   python -m utils.passwords --target-ms 250
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+class ScryptHasher:
+    algorithm = "scrypt"
+
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        self.n, self.r, self.p = int(n), int(r), int(p)
+
+    @property
+    def params(self):
+        return f"{self.n},{self.r},{self.p}"
+
+    def derive(self, password, salt, params=None):
+        n, r, p = (int(x) for x in (params or self.params).split(","))
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * r * n + 1024 * 1024, dklen=HASH_BYTES)
+
+
+class Pbkdf2Hasher:
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations=PBKDF2_ITERATIONS):
+        self.iterations = int(iterations)
+
+    @property
+    def params(self):
+        return str(self.iterations)
+
+    def derive(self, password, salt, params=None):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt,
+                                   int(params or self.params), dklen=HASH_BYTES)
+
+
+HASHERS = {h.algorithm: h for h in (ScryptHasher, Pbkdf2Hasher)}
+
+
+def get_hasher(algorithm=None, **params):
+    """Hasher configurado (config.PASSWORD_HASHER por defecto)."""
+    return HASHERS[algorithm or PASSWORD_HASHER](**params)
+
+
+def hash_password(password, hasher=None):
+    hasher = hasher or get_hasher()
+    salt = os.urandom(SALT_BYTES)
+    return "$".join([hasher.algorithm, hasher.params, _b64(salt), _b64(hasher.derive(password, salt))])
+
+
+def _is_legacy(stored):
+    return "$" not in stored
+
+
+# Para usuarios inexistentes se verifica contra este hash: mismo coste que un
+# usuario real, así el tiempo de respuesta no revela qué nombres existen.
+_DUMMY_HASH = None
+
+
+def verify_password(password, stored):
+    """True si `password` corresponde a `stored` (None = usuario inexistente)."""
+    global _DUMMY_HASH
+    if password is None:
+        password = ""
+    if not stored:
+        if _DUMMY_HASH is None:
+            _DUMMY_HASH = hash_password("")
+        verify_password(password, _DUMMY_HASH)
+        return False
+    if _is_legacy(stored):
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(candidate.encode(), stored.encode())
+    try:
+        algorithm, params, salt, expected = stored.split("$")
+        derived = HASHERS[algorithm]().derive(password, _unb64(salt), params)
+    except (KeyError, ValueError):
+        return False
+    return hmac.compare_digest(derived, _unb64(expected))
+
+
+def needs_rehash(stored, hasher=None):
+    """True si el hash es antiguo o no usa el algoritmo/coste configurado."""
+    if _is_legacy(stored):
+        return True
+    hasher = hasher or get_hasher()
+    algorithm, params = stored.split("$")[:2]
+    return algorithm != hasher.algorithm or params != hasher.params
+
+
+# --- Benchmark / calibración del coste ---
+def time_hash(hasher, rounds=3):
+    """Milisegundos por verificación (mejor de `rounds`)."""
+    salt = os.urandom(SALT_BYTES)
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hasher.derive("benchmark-password", salt)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def calibrate(algorithm=None, target_ms=250, rounds=3):
+    """
+    Mayor coste cuyo tiempo por login no supera target_ms.
+    scrypt: se duplica N (r y p fijos); pbkdf2: iteraciones proporcionales al tiempo.
+    Devuelve (hasher, ms medidos).
+    """
+    algorithm = algorithm or PASSWORD_HASHER
+    if algorithm == "scrypt":
+        best = ScryptHasher(n=2 ** 10)
+        best_ms = time_hash(best, rounds)
+        while True:
+            candidate = ScryptHasher(n=best.n * 2, r=best.r, p=best.p)
+            ms = time_hash(candidate, rounds)
+            if ms > target_ms or candidate.n > 2 ** 20:
+                return best, best_ms
+            best, best_ms = candidate, ms
+    probe = Pbkdf2Hasher(iterations=100_000)
+    per_iteration = time_hash(probe, rounds) / probe.iterations
+    hasher = Pbkdf2Hasher(iterations=max(10_000, int(target_ms / per_iteration) // 1000 * 1000))
+    return hasher, time_hash(hasher, rounds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibra el coste del hash de contraseñas.")
+    parser.add_argument("--algorithm", choices=sorted(HASHERS), default=PASSWORD_HASHER)
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    current = get_hasher(args.algorithm)
+    print(f"Actual  {current.algorithm} ({current.params}): {time_hash(current, args.rounds):.1f} ms/login")
+    hasher, ms = calibrate(args.algorithm, args.target_ms, args.rounds)
+    print(f"Sugerido {hasher.algorithm} ({hasher.params}): {ms:.1f} ms/login (objetivo {args.target_ms:.0f} ms)")
+    if hasher.algorithm == "scrypt":
+        print(f"  PASSWORD_HASHER=scrypt SCRYPT_N={hasher.n} SCRYPT_R={hasher.r} SCRYPT_P={hasher.p}")
+    else:
+        print(f"  PASSWORD_HASHER=pbkdf2_sha256 PBKDF2_ITERATIONS={hasher.iterations}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
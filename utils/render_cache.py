@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import RENDER_DIR, RENDER_CACHE_MAX_BYTES, RENDER_CACHE_RESCAN_SECONDS
+
+# Subir este número cuando cambie el aspecto de los gráficos: invalida el caché
+RENDER_VERSION = 5
+
+# Los PNG cacheados se nombran <nombre>_<clave>.png dentro de RENDER_DIR
+_KEY_LEN = 24
+_CACHED_NAME = re.compile(r"_([0-9a-f]{%d})\.png$" % _KEY_LEN)
+
+
+def render_key(**params):
+    """Clave de contenido: hash de todos los parámetros que afectan al PNG."""
+    payload = json.dumps(dict(params, _v=RENDER_VERSION), sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:_KEY_LEN]
+
+
+class RenderCache:
+    """
+    Caché de infografías direccionado por contenido.
+    - Acierto: devuelve la ruta del PNG existente (no se toca matplotlib).
+    - Expulsión LRU cuando el total de bytes supera max_bytes.
+    - Contadores de aciertos/fallos/expulsiones en stats().
+    El índice vive en cada proceso, pero el directorio se comparte entre
+    workers: add() vuelve a leer el directorio al llegar al tope o cada
+    rescan_seconds (orden por mtime, que get() renueva en cada acierto), así el
+    tope se aplica al directorio y no a cada worker (el exceso queda acotado a
+    lo que escriban los demás en ese intervalo). Un PNG que otro worker ya
+    borró cuenta como fallo.
+    """
+
+    def __init__(self, directory=RENDER_DIR, max_bytes=RENDER_CACHE_MAX_BYTES,
+                 rescan_seconds=RENDER_CACHE_RESCAN_SECONDS):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.rescan_seconds = rescan_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = None  # OrderedDict clave -> (ruta, bytes), del menos al más reciente
+        self._total = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        # Reconstruye el índice desde disco (sobrevive a reinicios, ve lo que
+        # escribieron o borraron otros workers), orden por mtime. A igual mtime
+        # (resolución gruesa del sistema de archivos) manda el índice anterior.
+        rank = {key: i for i, key in enumerate(self._index or ())}
+        found = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                m = _CACHED_NAME.search(entry.name)
+                if m and entry.is_file():
+                    st = entry.stat()
+                    key = m.group(1)
+                    found.append((st.st_mtime, rank.get(key, -1), key, entry.path, st.st_size))
+        self._index = OrderedDict()
+        self._total = 0
+        self._scanned_at = time.monotonic()
+        for _, _, key, path, size in sorted(found):
+            self._index[key] = (path, size)
+            self._total += size
+
+    def path_for(self, name, key):
+        return os.path.abspath(os.path.join(self.directory, f"{name}_{key}.png"))
+
+    def get(self, key):
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            item = self._index.get(key)
+            if item is not None and os.path.exists(item[0]):
+                self._index.move_to_end(key)
+                self.hits += 1
+                try:
+                    os.utime(item[0])
+                except OSError:
+                    pass
+                return item[0]
+            if item is not None:
+                self._total -= self._index.pop(key)[1]
+            self.misses += 1
+            return None
+
+    def add(self, key, path):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            if key in self._index:
+                self._total -= self._index.pop(key)[1]
+            self._index[key] = (path, size)
+            self._total += size
+            if self._total > self.max_bytes or time.monotonic() - self._scanned_at >= self.rescan_seconds:
+                # El directorio manda (altas y bajas de otros workers)
+                self._load_index()
+            for old_key in list(self._index):
+                if self._total <= self.max_bytes:
+                    break
+                if old_key == key:
+                    continue
+                old_path, old_size = self._index.pop(old_key)
+                self._total -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    def expire(self, max_age, now=None):
+        """
+        Borra los PNG del directorio sin usar hace más de max_age segundos
+        (barrido de retención), manteniendo al día el índice y los bytes.
+        Incluye los renders con timestamp, que no pasan por el índice.
+        Devuelve (archivos borrados, bytes liberados).
+        """
+        now = time.time() if now is None else now
+        removed = freed = 0
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            if not os.path.isdir(self.directory):
+                return removed, freed
+            for entry in os.scandir(self.directory):
+                if not entry.name.lower().endswith(".png") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                if now - st.st_mtime <= max_age:
+                    continue
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                m = _CACHED_NAME.search(entry.name)
+                if m and m.group(1) in self._index:
+                    self._total -= self._index.pop(m.group(1))[1]
+                    self.evictions += 1
+                removed += 1
+                freed += st.st_size
+        return removed, freed
+
+    def stats(self):
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._index),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+            }
+
+
+RENDER_CACHE = RenderCache()
@@ -0,0 +1,201 @@
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from config import RENDER_WORKERS
+from . import charts
+from .render_cache import RENDER_CACHE
+
+# ============================================================
+# MOTOR DE RENDER EN PARALELO (pool de procesos)
+# ============================================================
+# Cada "spec" describe una infografía completa y solo lleva datos ya
+# agregados (o una muestra acotada), así que enviarla al worker es barato:
+#   {"chart": "bar", "args": (...), "kwargs": {...},
+#    "title": ..., "subtitle": ..., "footer": ..., "theme": ..., "out_path": ...}
+# Si la spec trae "cache_key", el PNG se busca primero en el caché de render.
+# Con "plot_key"/"plot_path" también se guarda el gráfico sin títulos: otra spec
+# con los mismos datos y distinto título/subtítulo solo recompone la infografía.
+# Las specs iguales que ya se están renderizando (otra petición, pre-render
+# especulativo) se esperan en lugar de repetirse.
+
+RENDER_WAIT_SECONDS = 120
+
+_pool = None
+_pool_lock = threading.Lock()
+_inflight = {}  # cache_key / plot_key -> threading.Event
+_inflight_lock = threading.Lock()
+
+
+def _tmp_path(path):
+    # Escritura atómica: dos peticiones iguales pueden renderizar el mismo PNG a la vez
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def render_spec(spec):
+    """Renderiza una spec (figura + infografía PNG). Se ejecuta en el worker."""
+    if spec.get("plot_png"):
+        # Gráfico ya rasterizado: solo se recompone cabecera/pie
+        with Image.open(spec["plot_png"]) as img:
+            plot_img = img.convert("RGBA")
+    else:
+        chart_fn = getattr(charts, f"chart_{spec['chart']}")
+        fig = chart_fn(*spec.get("args", ()), **spec.get("kwargs", {}))
+        plot_img = charts._plot_image(fig)
+        if spec.get("plot_path"):
+            tmp_plot = _tmp_path(spec["plot_path"])
+            plot_img.save(tmp_plot, format="PNG", compress_level=1)
+            os.replace(tmp_plot, spec["plot_path"])
+    out_path = spec["out_path"]
+    tmp_path = _tmp_path(out_path)
+    charts.make_infographic_from_plot(
+        plot_img, spec["title"], spec["subtitle"], spec["footer"], spec["theme"], tmp_path
+    )
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: workers limpios (sin hilos de Flask) que ya traen
+            # matplotlib/PIL importados; spawn donde no exista.
+            if "forkserver" in mp.get_all_start_methods():
+                ctx = mp.get_context("forkserver")
+                ctx.set_forkserver_preload(["utils.render_engine"])
+            else:
+                ctx = mp.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=ctx)
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _spec_keys(spec):
+    return [k for k in (spec.get("cache_key"), spec.get("plot_key")) if k]
+
+
+def _resolve_cached(spec):
+    """(ruta final en caché o None, spec a renderizar con el gráfico reutilizado si existe)."""
+    key = spec.get("cache_key")
+    hit = RENDER_CACHE.get(key) if key else None
+    if hit:
+        return hit, spec
+    plot_key = spec.get("plot_key")
+    plot_hit = RENDER_CACHE.get(plot_key) if plot_key else None
+    if plot_hit:
+        spec = dict(spec, plot_png=plot_hit)
+        spec.pop("plot_path", None)
+    return None, spec
+
+
+def render_all(specs, on_done=None):
+    """
+    Renderiza las specs en paralelo y devuelve las rutas en el MISMO orden.
+    Las specs con "cache_key" ya renderizadas se resuelven desde el caché
+    (o desde el gráfico sin títulos de "plot_key"); si otra petición las está
+    renderizando en este momento, se espera a que termine.
+    on_done(i, ruta) se llama a medida que cada spec termina (progreso de jobs).
+    """
+    specs = list(specs)
+    paths = [None] * len(specs)
+
+    def resolve(indices):
+        pending = []
+        for i in indices:
+            hit, specs[i] = _resolve_cached(specs[i])
+            if hit:
+                paths[i] = hit
+                if on_done:
+                    on_done(i, hit)
+            else:
+                pending.append(i)
+        return pending
+
+    pending = resolve(range(len(specs)))
+
+    # Comprobar y reservar en la misma sección crítica: de cada clave solo la
+    # renderiza quien instala su Event; el resto espera a que termine.
+    events = {}
+
+    def claim(indices, force=False):
+        mine, waits = [], set()
+        with _inflight_lock:
+            for i in indices:
+                keys = _spec_keys(specs[i])
+                busy = {ev for k in keys for ev in [_inflight.get(k)]
+                        if ev is not None and events.get(k) is not ev}
+                if busy and not force:
+                    waits |= busy
+                    continue
+                for k in keys:
+                    if k not in _inflight:
+                        _inflight[k] = events[k] = threading.Event()
+                mine.append(i)
+        return mine, waits
+
+    def render(indices):
+        def finished(j, path):
+            i = indices[j]
+            paths[i] = path
+            spec = specs[i]
+            if spec.get("cache_key"):
+                RENDER_CACHE.add(spec["cache_key"], path)
+            if spec.get("plot_path") and os.path.exists(spec["plot_path"]):
+                RENDER_CACHE.add(spec["plot_key"], spec["plot_path"])
+            _release(_spec_keys(spec), events)
+            if on_done:
+                on_done(i, path)
+        _render_many([specs[i] for i in indices], finished)
+
+    mine, waits = claim(pending)
+    try:
+        render(mine)
+        if waits:
+            # Renders iguales en curso (p. ej. pre-render especulativo): se esperan
+            # después de liberar las claves propias (dos peticiones cruzadas no se bloquean)
+            for ev in waits:
+                ev.wait(RENDER_WAIT_SECONDS)
+            rest = resolve([i for i in pending if i not in mine])
+            render(claim(rest, force=True)[0])
+    finally:
+        _release(list(events), events)
+    return paths
+
+
+def _release(keys, events):
+    with _inflight_lock:
+        for k in keys:
+            ev = events.get(k)
+            if ev is not None and _inflight.get(k) is ev:
+                del _inflight[k]
+                ev.set()
+
+
+def _render_many(specs, finished):
+    """Con RENDER_WORKERS <= 1 (o si el pool no está disponible) renderiza en serie."""
+    done = set()
+    if RENDER_WORKERS > 1 and len(specs) > 1:
+        try:
+            futures = {_get_pool().submit(render_spec, s): j for j, s in enumerate(specs)}
+            for future in as_completed(futures):
+                j = futures[future]
+                finished(j, future.result())
+                done.add(j)
+            return
+        except (BrokenProcessPool, OSError):
+            _reset_pool()
+    for j, s in enumerate(specs):
+        if j not in done:
+            finished(j, render_spec(s))
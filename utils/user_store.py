@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import USERS_DB_PATH, LEGACY_USERS_JSON
+from .passwords import hash_password
+
+# ============================================================
+# REGISTRO DE USUARIOS (SQLite)
+# ============================================================
+# - Búsqueda por clave primaria: el login no lee ni parsea a todos los usuarios.
+# - Alta atómica (INSERT ... ON CONFLICT DO NOTHING): dos registros simultáneos
+#   del mismo nombre no se pisan, aunque vengan de workers distintos.
+# - WAL: lecturas concurrentes mientras otro proceso escribe.
+# - Al crear la base se migra users.json (si existe); si no, se crea el usuario
+#   por defecto que antes sembraba load_users().
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+DEFAULT_USERS = {"admin": "password123"}
+
+
+class UserStore:
+    def __init__(self, db_path=USERS_DB_PATH, legacy_json=LEGACY_USERS_JSON):
+        self.db_path = db_path
+        self.legacy_json = legacy_json
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_db(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(_SCHEMA)
+                # BEGIN IMMEDIATE: un solo proceso migra/siembra aunque arranquen varios a la vez
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                        self._initial_rows(),
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+            self._ready = True
+
+    def _initial_rows(self):
+        if self.legacy_json and os.path.exists(self.legacy_json):
+            try:
+                with open(self.legacy_json, "r") as f:
+                    users = json.load(f)
+                return [(name, u["password_hash"], u.get("created_at", time.time()))
+                        for name, u in users.items() if u.get("password_hash")]
+            except Exception as e:
+                print(f"Error migrando {self.legacy_json}: {e}")
+        return [(name, hash_password(pw), time.time()) for name, pw in DEFAULT_USERS.items()]
+
+    # --- API ---
+    def get(self, username):
+        """Usuario como dict (password_hash, created_at) o None."""
+        self._ensure_db()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT password_hash, created_at FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def create(self, username, password_hash):
+        """Alta atómica. Devuelve False si el usuario ya existía."""
+        self._ensure_db()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO NOTHING",
+                (username, password_hash, time.time()),
+            )
+        return cur.rowcount == 1
+
+    def set_password_hash(self, username, password_hash):
+        """Reemplaza el hash (rehash transparente tras un login correcto)."""
+        self._ensure_db()
+        with self._connect() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username))
+
+    def count(self):
+        self._ensure_db()
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+USER_STORE = UserStore()
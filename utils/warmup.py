@@ -0,0 +1,59 @@
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# CICLO DE VIDA DEL WORKER (servidor de producción)
+# ============================================================
+# gunicorn.conf.py llama a warm_worker() cuando cada worker termina de cargar
+# la app, y a drain_worker() al salir (apagado o reciclaje por max_requests).
+# Así la primera petición de cada worker no paga la importación de sklearn,
+# la caché de fuentes de matplotlib ni el primer render.
+
+
+def warm_worker(render_pool=None):
+    """
+    Importa las librerías pesadas y hace un render descartable (en memoria).
+    Devuelve los segundos de cada etapa para el log del worker.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    from matplotlib import font_manager
+    from sklearn.ensemble import IsolationForest  # noqa: F401 (detect_row_anomalies)
+    font_manager.findfont("DejaVu Sans")
+    timings["imports"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from . import charts
+    serie = pd.Series(np.arange(3, 0, -1, dtype=float), index=["A", "B", "C"])
+    plot_img = charts._plot_image(charts.chart_bar(serie, ylabel="warmup", simple=True))
+    charts.make_infographic_from_plot(plot_img, "warmup", "warmup", "warmup", out_path=io.BytesIO())
+    timings["render"] = time.perf_counter() - start
+
+    if render_pool is None:
+        from config import RENDER_WORKERS
+        render_pool = RENDER_WORKERS > 1
+    if render_pool:
+        # Levanta el pool de procesos de render (forkserver) antes de la primera secuencia
+        start = time.perf_counter()
+        from .render_engine import _get_pool
+        _get_pool().submit(int).result()
+        timings["render_pool"] = time.perf_counter() - start
+
+    return timings
+
+
+def drain_worker(timeout=None):
+    """
+    Apagado ordenado: termina (o marca como interrumpidos) los trabajos, cierra
+    el pool de render y detiene el barrido de imágenes.
+    """
+    from .jobs import JOB_QUEUE
+    from .output_store import OUTPUT_STORE
+    from .render_engine import _reset_pool
+    JOB_QUEUE.shutdown(timeout=timeout)
+    _reset_pool()
+    OUTPUT_STORE.stop_sweeper(timeout=5)
@@ -0,0 +1,53 @@
+import io
+import os
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Destino no 'seekable' para ZipFile: acumula lo escrito hasta que se drena."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(paths, arcname=os.path.basename, chunk_size=CHUNK_SIZE):
+    """
+    Genera un ZIP al vuelo (para una respuesta en streaming).
+    - Entradas 'stored' (sin deflate): los PNG ya están comprimidos.
+    - Memoria constante: se lee y emite de a `chunk_size` bytes por archivo.
+    """
+    buf = _StreamBuffer()
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        for path in paths:
+            info = zipfile.ZipInfo.from_file(path, arcname(path))
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, "rb") as src, zf.open(info, mode="w") as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = buf.drain()
+                    if data:
+                        yield data
+            data = buf.drain()
+            if data:
+                yield data
+    # Directorio central al cerrar el ZIP
+    data = buf.drain()
+    if data:
+        yield data
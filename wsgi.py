@@ -0,0 +1,5 @@
+# Punto de entrada WSGI para producción (ver gunicorn.conf.py).
+# En desarrollo sigue sirviendo `python app.py`.
+from app import app
+
+application = app